@@ -0,0 +1,23 @@
+"""Dependencias reutilizables para rutas de la API."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi import Header, HTTPException
+
+from app.core.security import TokenError, get_jwt_verifier, parse_bearer
+
+
+async def jwt_claims(authorization: str | None = Header(default=None)) -> dict[str, Any]:
+    """Claims verificados del JWT de Supabase; 401 si falta, es inválido o expiró."""
+    token = parse_bearer(authorization)
+    if not token:
+        raise HTTPException(status_code=401, detail="auth_required")
+    try:
+        claims = get_jwt_verifier().verify(token)
+    except TokenError as exc:
+        raise HTTPException(status_code=401, detail="auth_required") from exc
+    if not claims.get("sub"):
+        raise HTTPException(status_code=401, detail="auth_required")
+    return claims
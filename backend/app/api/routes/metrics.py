@@ -0,0 +1,24 @@
+"""Contadores internos del proceso (cachés, colas y gateway) para observabilidad."""
+
+from typing import Any
+
+from fastapi import APIRouter
+
+from app.api.routes import panel
+from app.services import background, geo_assets, geolocation, inbox_events, kpi_rollups, postgrest
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("", summary="Métricas del proceso")
+def metrics() -> dict[str, Any]:
+    """Snapshot de contadores en memoria; cada worker reporta sólo los suyos."""
+    return {
+        "panel_kpi_cache": panel.kpi_cache_stats(),
+        "postgrest": postgrest.stats(),
+        "background": background.stats(),
+        "geo_assets": geo_assets.stats(),
+        "geolocation": geolocation.stats(),
+        "inbox_events": inbox_events.stats(),
+        "kpi_rollups": kpi_rollups.stats(),
+    }
@@ -2,28 +2,39 @@
 
 Nota: Para resultados sujetos a RLS, se reenvía el JWT del usuario en la
 cabecera Authorization hacia Supabase REST. Para resolver permisos/roles, se
-usa service_role en el backend y se extrae el `sub` del JWT (sin verificar).
+usa service_role en el backend y el `sub` del JWT verificado (`app.core.security`).
 """
 
 from __future__ import annotations
 
+import asyncio
+import base64
 import json
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
 from datetime import datetime, timedelta, timezone
-from typing import Any, Literal
+from typing import Any, Literal, TypeVar
 from uuid import UUID
 
 import httpx
-from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, ConfigDict, Field
 
+from app.api.deps import jwt_claims
+from app.core.cache import StaleWhileRevalidateCache, TTLCache
 from app.core.config import settings
 from app.core.logging import get_logger
-from app.services import leads_geo, storage
+from app.core.security import TokenError, get_jwt_verifier
+from app.core.security import parse_bearer as _parse_bearer
+from app.services import geo_assets, inbox_events, leads_geo, postgrest, storage
 
 router = APIRouter(prefix="", tags=["panel"])
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
 
 class ManualOverridePayload(BaseModel):
     """Payload para activar/desactivar modo manual."""
@@ -222,10 +233,25 @@ class LeadUpdatePayload(BaseModel):
     model_config = ConfigDict(extra="ignore")
 
 
-def _supabase_base_url() -> str:
-    if not settings.supabase_url:
-        raise HTTPException(status_code=500, detail="Supabase no está configurado")
-    return settings.supabase_url.rstrip("/")
+async def _sb_request(
+    method: str,
+    path: str,
+    *,
+    params: dict[str, str] | None = None,
+    json: dict[str, Any] | None = None,
+    token: str | None = None,
+    prefer: str | None = None,
+) -> httpx.Response:
+    """Llama a PostgREST vía gateway y traduce fallas de config/red a HTTPException."""
+    try:
+        return await postgrest.request(
+            method, path, params=params, json=json, token=token, prefer=prefer
+        )
+    except postgrest.PostgrestConfigError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    except postgrest.PostgrestNetworkError as exc:
+        logger.exception("Error al conectar a Supabase (%s)", method)
+        raise HTTPException(status_code=502, detail="Error al conectar a Supabase") from exc
 
 
 async def _sb_get(
@@ -235,28 +261,7 @@ async def _sb_get(
     token: str | None = None,
     prefer: str | None = None,
 ) -> httpx.Response:
-    base_url = _supabase_base_url()
-    url = f"{base_url}{path}"
-    headers: dict[str, str] = {"Accept": "application/json"}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-        # Añade apikey pública si está disponible para pasar por el gateway de Supabase
-        anon = getattr(settings, "supabase_anon", None)
-        if anon:
-            headers["apikey"] = anon  # type: ignore[assignment]
-    elif settings.supabase_service_role:
-        headers["apikey"] = settings.supabase_service_role
-        headers["Authorization"] = f"Bearer {settings.supabase_service_role}"
-    else:
-        raise HTTPException(status_code=500, detail="Falta SUPABASE_SERVICE_ROLE")
-    if prefer:
-        headers["Prefer"] = prefer
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            return await client.get(url, headers=headers, params=params)
-    except httpx.RequestError:
-        logger.exception("Error al conectar a Supabase")
-        raise HTTPException(status_code=502, detail="Error al conectar a Supabase")
+    return await _sb_request("GET", path, params=params, token=token, prefer=prefer)
 
 
 async def _sb_post(
@@ -266,30 +271,7 @@ async def _sb_post(
     token: str | None = None,
     prefer: str | None = None,
 ) -> httpx.Response:
-    base_url = _supabase_base_url()
-    url = f"{base_url}{path}"
-    headers: dict[str, str] = {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-    }
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-        anon = getattr(settings, "supabase_anon", None)
-        if anon:
-            headers["apikey"] = anon  # type: ignore[assignment]
-    elif settings.supabase_service_role:
-        headers["apikey"] = settings.supabase_service_role
-        headers["Authorization"] = f"Bearer {settings.supabase_service_role}"
-    else:
-        raise HTTPException(status_code=500, detail="Falta SUPABASE_SERVICE_ROLE")
-    if prefer:
-        headers["Prefer"] = prefer
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            return await client.post(url, headers=headers, json=json or {})
-    except httpx.RequestError:
-        logger.exception("Error al conectar a Supabase (POST)")
-        raise HTTPException(status_code=502, detail="Error al conectar a Supabase")
+    return await _sb_request("POST", path, json=json or {}, token=token, prefer=prefer)
 
 
 async def _sb_patch(
@@ -300,30 +282,9 @@ async def _sb_patch(
     token: str | None = None,
     prefer: str | None = None,
 ) -> httpx.Response:
-    base_url = _supabase_base_url()
-    url = f"{base_url}{path}"
-    headers: dict[str, str] = {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-    }
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-        anon = getattr(settings, "supabase_anon", None)
-        if anon:
-            headers["apikey"] = anon  # type: ignore[assignment]
-    elif settings.supabase_service_role:
-        headers["apikey"] = settings.supabase_service_role
-        headers["Authorization"] = f"Bearer {settings.supabase_service_role}"
-    else:
-        raise HTTPException(status_code=500, detail="Falta SUPABASE_SERVICE_ROLE")
-    if prefer:
-        headers["Prefer"] = prefer
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            return await client.patch(url, headers=headers, params=params, json=json or {})
-    except httpx.RequestError:
-        logger.exception("Error al conectar a Supabase (PATCH)")
-        raise HTTPException(status_code=502, detail="Error al conectar a Supabase")
+    return await _sb_request(
+        "PATCH", path, params=params, json=json or {}, token=token, prefer=prefer
+    )
 
 
 async def _sb_delete(
@@ -333,50 +294,12 @@ async def _sb_delete(
     token: str | None = None,
     prefer: str | None = None,
 ) -> httpx.Response:
-    base_url = _supabase_base_url()
-    url = f"{base_url}{path}"
-    headers: dict[str, str] = {
-        "Accept": "application/json",
-    }
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-        anon = getattr(settings, "supabase_anon", None)
-        if anon:
-            headers["apikey"] = anon  # type: ignore[assignment]
-    elif settings.supabase_service_role:
-        headers["apikey"] = settings.supabase_service_role
-        headers["Authorization"] = f"Bearer {settings.supabase_service_role}"
-    else:
-        raise HTTPException(status_code=500, detail="Falta SUPABASE_SERVICE_ROLE")
-    if prefer:
-        headers["Prefer"] = prefer
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            return await client.delete(url, headers=headers, params=params)
-    except httpx.RequestError:
-        logger.exception("Error al conectar a Supabase (DELETE)")
-        raise HTTPException(status_code=502, detail="Error al conectar a Supabase")
+    return await _sb_request("DELETE", path, params=params, token=token, prefer=prefer)
 
 
 def _supabase_error(resp: httpx.Response, fallback: str) -> HTTPException:
-    detail: str | None = None
-    try:
-        payload = resp.json()
-    except ValueError:
-        payload = None
-    if isinstance(payload, dict):
-        detail = (
-            payload.get("message")
-            or payload.get("error_description")
-            or payload.get("error")
-            or payload.get("hint")
-        )
-    elif isinstance(payload, str):
-        detail = payload
-    if not detail:
-        detail = resp.text.strip() or fallback
-    status = resp.status_code if resp.status_code >= 400 else 502
-    return HTTPException(status_code=status, detail=detail)
+    err = postgrest.PostgrestResponseError.from_response(resp, fallback)
+    return HTTPException(status_code=err.http_status, detail=err.message)
 
 
 def _first_row(data: Any) -> Any:
@@ -385,99 +308,56 @@ def _first_row(data: Any) -> Any:
     return data
 
 
-def _content_range_total(header: str | None) -> int | None:
-    if not header:
-        return None
-    try:
-        _range, total = header.split("/")
-    except ValueError:
-        return None
-    total = total.strip()
-    if not total or total == "*":
-        return None
-    try:
-        return int(total)
-    except ValueError:
-        return None
-
-
 def _single_related(value: Any) -> Any:
     if isinstance(value, list):
         return value[0] if value else None
     return value
 
 
-def _parse_bearer(authorization: str | None) -> str | None:
-    if not authorization:
-        return None
-    if authorization.lower().startswith("bearer "):
-        return authorization.split(" ", 1)[1].strip() or None
-    return None
+async def _timed(timings: dict[str, float], name: str, awaitable: Awaitable[T]) -> T:
+    """Espera `awaitable` y registra su duración (ms) en `timings[name]`."""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def _first_error(group: BaseExceptionGroup) -> BaseException:
+    """Primer error real de un `TaskGroup` (prioriza HTTPException) para propagarlo tal cual."""
+    leaves: list[BaseException] = []
+    pending: list[BaseException] = [group]
+    while pending:
+        exc = pending.pop(0)
+        if isinstance(exc, BaseExceptionGroup):
+            pending.extend(exc.exceptions)
+        else:
+            leaves.append(exc)
+    for exc in leaves:
+        if isinstance(exc, HTTPException):
+            return exc
+    return leaves[0] if leaves else group
+
 
+def _server_timing(timings: dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={value}" for name, value in timings.items())
 
-def _jwt_sub(jwt_token: str | None) -> str | None:
-    """Extrae el `sub` del JWT (sin verificar firma; TODO: verificar HS256)."""
+
+def _jwt_verify_and_claims(jwt_token: str | None) -> dict[str, Any] | None:
+    """Claims del JWT verificados por el verificador compartido; `None` si no es válido."""
     if not jwt_token:
         return None
     try:
-        import base64
-        import json
-
-        parts = jwt_token.split(".")
-        if len(parts) != 3:
-            return None
-
-        def b64url_decode(segment: str) -> bytes:
-            rem = len(segment) % 4
-            if rem:
-                segment += "=" * (4 - rem)
-            return base64.urlsafe_b64decode(segment.encode())
-
-        payload = json.loads(b64url_decode(parts[1]).decode("utf-8"))
-        sub = payload.get("sub")
-        return str(sub) if sub else None
-    except Exception:  # pragma: no cover - best effort
+        return get_jwt_verifier().verify(jwt_token)
+    except TokenError:
         return None
 
 
 def _jwt_verify_and_sub(jwt_token: str | None) -> str | None:
-    """Verifica HS256 con el secret de Supabase (si está configurado) y retorna `sub`.
-
-    Si no hay secret disponible, cae en la extracción sin verificación.
-    """
-    secret: str | None = (
-        getattr(settings, "supabase_jwt_secret", None)  # type: ignore[attr-defined]
-        or getattr(settings, "supabase_legacy_jwt_secret", None)  # type: ignore[attr-defined]
-    )
-    if not jwt_token:
-        return None
-    if not secret:
-        return _jwt_sub(jwt_token)
-    try:
-        import base64
-        import hashlib
-        import hmac
-        import json
-
-        header_b64, payload_b64, signature_b64 = jwt_token.split(".")
-
-        def b64url_decode(s: str) -> bytes:
-            rem = len(s) % 4
-            if rem:
-                s += "=" * (4 - rem)
-            return base64.urlsafe_b64decode(s.encode())
-
-        signing_input = f"{header_b64}.{payload_b64}".encode()
-        expected = hmac.new(secret.encode(), signing_input, hashlib.sha256).digest()
-        provided = b64url_decode(signature_b64)
-        if not hmac.compare_digest(expected, provided):
-            return None
-
-        payload = json.loads(b64url_decode(payload_b64).decode("utf-8"))
-        sub = payload.get("sub")
-        return str(sub) if sub else None
-    except Exception:  # pragma: no cover - best effort
-        return None
+    """Verifica el JWT (ver `_jwt_verify_and_claims`) y retorna `sub`."""
+    claims = _jwt_verify_and_claims(jwt_token)
+    sub = claims.get("sub") if claims else None
+    return str(sub) if sub else None
 
 
 def _looks_like_uuid(value: str | None) -> bool:
@@ -572,84 +452,125 @@ def _format_utc(dt: datetime) -> str:
     return _ensure_utc(dt).isoformat()
 
 
-@router.get("/auth/permisos")
-async def get_permissions(authorization: str | None = Header(default=None)) -> dict[str, Any]:
-    token = _parse_bearer(authorization)
-    user_id = _jwt_verify_and_sub(token)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="auth_required")
+_ROLE_CACHE: TTLCache[str, list[str]] = TTLCache(
+    ttl=settings.panel_roles_cache_ttl_seconds, maxsize=1024
+)
 
-    # Consulta roles del usuario via service_role
+
+async def _user_roles(user_id: str, claims: dict[str, Any], error_detail: str) -> list[str]:
+    """Códigos de rol del usuario (service_role), cacheados por `sub`.
+
+    La entrada vive como máximo el TTL configurado y nunca más allá del `exp` del token.
+    """
+    cached = _ROLE_CACHE.get(user_id)
+    if cached is not None:
+        return cached
     params = {
-        "select": "rol:roles(codigo,nombre)",
+        "select": "rol:roles(codigo)",
         "usuario_id": f"eq.{user_id}",
     }
-    resp = await _sb_get("/rest/v1/usuarios_roles", params=params, token=None)
+    resp = await _sb_get("/rest/v1/usuarios_roles", params=params)
     if resp.status_code >= 400:
-        raise HTTPException(status_code=502, detail="Error consultando permisos")
+        raise HTTPException(status_code=502, detail=error_detail)
     data = resp.json() or []
-    roles = [row.get("rol", {}).get("codigo") for row in data if isinstance(row, dict)]
-    return {"ok": True, "roles": [r for r in roles if r]}
+    roles = [(row.get("rol") or {}).get("codigo") for row in data if isinstance(row, dict)]
+    roles = [r for r in roles if r]
+
+    ttl = float(settings.panel_roles_cache_ttl_seconds)
+    exp = claims.get("exp")
+    if isinstance(exp, (int, float)):
+        ttl = min(ttl, exp - time.time())
+    _ROLE_CACHE.set(user_id, roles, ttl=ttl)
+    return roles
+
+
+def _invalidate_user_roles(user_id: str | UUID | None = None) -> None:
+    """Descarta roles cacheados de un usuario (o de todos si no se indica)."""
+    if user_id is None:
+        _ROLE_CACHE.clear()
+    else:
+        _ROLE_CACHE.pop(str(user_id))
+
+
+@router.get("/auth/permisos")
+async def get_permissions(claims: dict[str, Any] = Depends(jwt_claims)) -> dict[str, Any]:
+    roles = await _user_roles(str(claims["sub"]), claims, "Error consultando permisos")
+    return {"ok": True, "roles": roles}
 
 
 async def _require_admin(authorization: str | None) -> str:
     token = _parse_bearer(authorization)
-    user_id = _jwt_verify_and_sub(token)
-    if not user_id:
+    claims = _jwt_verify_and_claims(token)
+    user_id = str(claims.get("sub") or "") if claims else ""
+    if not claims or not user_id:
         raise HTTPException(status_code=401, detail="auth_required")
-    # Consulta roles del usuario via service_role
-    params = {
-        "select": "rol:roles(codigo)",
-        "usuario_id": f"eq.{user_id}",
-    }
-    resp = await _sb_get("/rest/v1/usuarios_roles", params=params)
-    if resp.status_code >= 400:
-        raise HTTPException(status_code=502, detail="Error validando roles")
-    data = resp.json() or []
-    is_admin = any((row.get("rol") or {}).get("codigo") == "admin" for row in data)
-    if not is_admin:
+    roles = await _user_roles(user_id, claims, "Error validando roles")
+    if "admin" not in roles:
         raise HTTPException(status_code=403, detail="forbidden")
     return user_id
 
 
-@router.get("/config/personal")
-async def cfg_personal(authorization: str | None = Header(default=None)) -> dict[str, Any]:
-    await _require_admin(authorization)
+_CATALOG_QUERIES: dict[str, dict[str, str]] = {
+    "roles": {"select": "id,codigo,nombre,descripcion,creado_en", "order": "codigo.asc"},
+    "departamentos": {
+        "select": "id,nombre,departamento_padre_id,creado_en",
+        "order": "nombre.asc",
+    },
+    "puestos": {
+        "select": "id,nombre,descripcion,departamento_id,creado_en",
+        "order": "nombre.asc",
+    },
+}
+_CATALOG_CACHE: TTLCache[str, list[dict[str, Any]]] = TTLCache(
+    ttl=settings.panel_catalog_cache_ttl_seconds, maxsize=len(_CATALOG_QUERIES)
+)
+
+
+async def _load_catalog(name: str) -> list[dict[str, Any]]:
+    """Lee un catálogo de configuración (service_role) con caché de TTL corto."""
+    cached = _CATALOG_CACHE.get(name)
+    if cached is not None:
+        return cached
+    resp = await _sb_get(f"/rest/v1/{name}", params=dict(_CATALOG_QUERIES[name]))
+    if resp.status_code >= 400:
+        raise _supabase_error(resp, f"Error consultando {name}")
+    rows = resp.json() or []
+    _CATALOG_CACHE.set(name, rows)
+    return rows
+
+
+def _invalidate_catalogs(*names: str) -> None:
+    for name in names:
+        _CATALOG_CACHE.pop(name)
 
-    resp_personal = await _sb_get(
+
+async def _load_personal() -> list[dict[str, Any]]:
+    resp = await _sb_get(
         "/rest/v1/v_configuracion_personal",
         params={"select": "*", "order": "correo.asc"},
     )
-    if resp_personal.status_code >= 400:
-        raise _supabase_error(resp_personal, "Error consultando personal")
+    if resp.status_code >= 400:
+        raise _supabase_error(resp, "Error consultando personal")
+    return resp.json() or []
 
-    resp_roles = await _sb_get(
-        "/rest/v1/roles",
-        params={"select": "id,codigo,nombre,descripcion,creado_en", "order": "codigo.asc"},
-    )
-    if resp_roles.status_code >= 400:
-        raise _supabase_error(resp_roles, "Error consultando roles")
 
-    resp_departamentos = await _sb_get(
-        "/rest/v1/departamentos",
-        params={"select": "id,nombre,departamento_padre_id,creado_en", "order": "nombre.asc"},
-    )
-    if resp_departamentos.status_code >= 400:
-        raise _supabase_error(resp_departamentos, "Error consultando departamentos")
-
-    resp_puestos = await _sb_get(
-        "/rest/v1/puestos",
-        params={"select": "id,nombre,descripcion,departamento_id,creado_en", "order": "nombre.asc"},
-    )
-    if resp_puestos.status_code >= 400:
-        raise _supabase_error(resp_puestos, "Error consultando puestos")
+@router.get("/config/personal")
+async def cfg_personal(authorization: str | None = Header(default=None)) -> dict[str, Any]:
+    # Las lecturas usan service_role: sólo salen una vez confirmado el rol admin.
+    await _require_admin(authorization)
+    try:
+        async with asyncio.TaskGroup() as tg:
+            personal = tg.create_task(_load_personal())
+            catalogs = {name: tg.create_task(_load_catalog(name)) for name in _CATALOG_QUERIES}
+    except BaseExceptionGroup as group:
+        raise _first_error(group) from None
 
     return {
         "ok": True,
-        "personal": resp_personal.json() or [],
-        "roles": resp_roles.json() or [],
-        "departamentos": resp_departamentos.json() or [],
-        "puestos": resp_puestos.json() or [],
+        "personal": personal.result(),
+        "roles": catalogs["roles"].result(),
+        "departamentos": catalogs["departamentos"].result(),
+        "puestos": catalogs["puestos"].result(),
     }
 
 
@@ -662,6 +583,7 @@ async def cfg_crear_departamento(
     resp = await _sb_post("/rest/v1/departamentos", json=body, prefer="return=representation")
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error creando departamento")
+    _invalidate_catalogs("departamentos")
     data = resp.json() or []
     return {"ok": True, "item": _first_row(data)}
 
@@ -684,6 +606,7 @@ async def cfg_actualizar_departamento(
     )
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error actualizando departamento")
+    _invalidate_catalogs("departamentos")
     data = resp.json() or []
     return {"ok": True, "item": _first_row(data)}
 
@@ -700,6 +623,7 @@ async def cfg_eliminar_departamento(
     )
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error eliminando departamento")
+    _invalidate_catalogs("departamentos", "puestos")
     deleted: Any | None = None
     if resp.content:
         try:
@@ -718,6 +642,7 @@ async def cfg_crear_puesto(
     resp = await _sb_post("/rest/v1/puestos", json=body, prefer="return=representation")
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error creando puesto")
+    _invalidate_catalogs("puestos")
     data = resp.json() or []
     return {"ok": True, "item": _first_row(data)}
 
@@ -740,6 +665,7 @@ async def cfg_actualizar_puesto(
     )
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error actualizando puesto")
+    _invalidate_catalogs("puestos")
     data = resp.json() or []
     return {"ok": True, "item": _first_row(data)}
 
@@ -754,6 +680,7 @@ async def cfg_eliminar_puesto(
     )
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error eliminando puesto")
+    _invalidate_catalogs("puestos")
     deleted: Any | None = None
     if resp.content:
         try:
@@ -812,6 +739,7 @@ async def cfg_eliminar_usuario(
     )
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error eliminando usuario")
+    _invalidate_user_roles(usuario_id)
     deleted: Any | None = None
     if resp.content:
         try:
@@ -842,23 +770,28 @@ async def cfg_actualizar_roles_usuario(
     to_add = sorted(desired_ids - current_ids)
     to_remove = sorted(current_ids - desired_ids)
 
-    if to_add:
-        payload_rows = [{"usuario_id": str(usuario_id), "rol_id": rol_id} for rol_id in to_add]
-        resp_insert = await _sb_post(
-            "/rest/v1/usuarios_roles",
-            json=payload_rows,  # type: ignore[arg-type]
-            prefer="return=representation",
-        )
-        if resp_insert.status_code >= 400:
-            raise _supabase_error(resp_insert, "Error asignando roles")
+    # Se invalida aun si una escritura falla a medias: el estado real ya pudo cambiar.
+    try:
+        if to_add:
+            payload_rows = [{"usuario_id": str(usuario_id), "rol_id": rol_id} for rol_id in to_add]
+            resp_insert = await _sb_post(
+                "/rest/v1/usuarios_roles",
+                json=payload_rows,  # type: ignore[arg-type]
+                prefer="return=representation",
+            )
+            if resp_insert.status_code >= 400:
+                raise _supabase_error(resp_insert, "Error asignando roles")
 
-    for rol_id in to_remove:
-        resp_del = await _sb_delete(
-            "/rest/v1/usuarios_roles",
-            params={"usuario_id": f"eq.{usuario_id}", "rol_id": f"eq.{rol_id}"},
-        )
-        if resp_del.status_code >= 400:
-            raise _supabase_error(resp_del, "Error removiendo roles")
+        for rol_id in to_remove:
+            resp_del = await _sb_delete(
+                "/rest/v1/usuarios_roles",
+                params={"usuario_id": f"eq.{usuario_id}", "rol_id": f"eq.{rol_id}"},
+            )
+            if resp_del.status_code >= 400:
+                raise _supabase_error(resp_del, "Error removiendo roles")
+    finally:
+        if to_add or to_remove:
+            _invalidate_user_roles(usuario_id)
 
     resp_updated = await _sb_get(
         "/rest/v1/usuarios_roles",
@@ -940,6 +873,7 @@ async def cfg_crear_rol(
     resp = await _sb_post("/rest/v1/roles", json=body, prefer="return=representation")
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error creando rol")
+    _invalidate_catalogs("roles")
     data = resp.json() or []
     return {"ok": True, "item": _first_row(data)}
 
@@ -962,6 +896,7 @@ async def cfg_actualizar_rol(
     )
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error actualizando rol")
+    _invalidate_catalogs("roles")
     data = resp.json() or []
     return {"ok": True, "item": _first_row(data)}
 
@@ -976,6 +911,8 @@ async def cfg_eliminar_rol(
     )
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error eliminando rol")
+    _invalidate_catalogs("roles")
+    _invalidate_user_roles()
     deleted: Any | None = None
     if resp.content:
         try:
@@ -1017,6 +954,103 @@ async def cfg_canales(authorization: str | None = Header(default=None)) -> dict[
     return {"ok": True, "activos": activos, "conteo": counts}
 
 
+CountMode = Literal["exact", "planned", "estimated", "none"]
+_LEADS_SORT_COLUMNS = {"creado_en", "actualizado_en", "lead_score"}
+_LEADS_NULLABLE_SORT_COLUMNS = {"lead_score"}
+_LEADS_RANK_SORT = "relevancia"
+
+
+def _encode_cursor(payload: dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _encode_leads_cursor(row: dict[str, Any], sort_column: str, direction: str) -> str:
+    """Cursor opaco con la posición de la última fila entregada."""
+    return _encode_cursor(
+        {"s": sort_column, "d": direction, "v": row.get(sort_column), "id": row.get("id")}
+    )
+
+
+def _decode_leads_cursor(cursor: str, sort_column: str, direction: str) -> dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="cursor_invalido") from exc
+    if (
+        not isinstance(payload, dict)
+        or payload.get("s") != sort_column
+        or payload.get("d") != direction
+        or not (payload.get("id") or sort_column == _LEADS_RANK_SORT)
+    ):
+        raise HTTPException(status_code=400, detail="cursor_invalido")
+    return payload
+
+
+def _cursor_offset(position: dict[str, Any]) -> int:
+    offset = position.get("o")
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="cursor_invalido")
+    return offset
+
+
+def _normalize_search_term(q: str | None) -> str | None:
+    """Colapsa espacios y descarta caracteres que no aportan a la búsqueda."""
+    if not q:
+        return None
+    cleaned = " ".join(q.strip().split())
+    sanitized = "".join(ch for ch in cleaned if ch.isalnum() or ch in "@._+- ")
+    return sanitized.strip() or None
+
+
+def _leads_order(sort_column: str, direction: str) -> str:
+    """Orden `(columna, id)` tal como lo declaran los índices de keyset.
+
+    Sólo `lead_score` admite nulos; en las columnas NOT NULL no se pide `nullslast`
+    porque el planner no lo da por cubierto con el índice y volvería a ordenar.
+    """
+    nulls = ".nullslast" if sort_column in _LEADS_NULLABLE_SORT_COLUMNS else ""
+    return f"{sort_column}.{direction}{nulls},id.{direction}"
+
+
+def _leads_keyset_params(
+    position: dict[str, Any], sort_column: str, direction: str
+) -> dict[str, str]:
+    """Filtros PostgREST para las filas posteriores a `position`.
+
+    La cota `columna <= v` (`>=` en ascendente) es un rango sobre el índice
+    `(columna, id)` y el `or=` sólo desempata dentro de él. Los nulos, que van al
+    final, no entran en el rango: se piden aparte con `_leads_null_tail_params`.
+    """
+    op, bound = ("lt", "lte") if direction == "desc" else ("gt", "gte")
+    row_id = str(position["id"])
+    value = position.get("v")
+    if value is None:
+        return {sort_column: "is.null", "id": f"{op}.{row_id}"}
+    quoted = _quote_filter_value(str(value))
+    return {
+        sort_column: f"{bound}.{value}",
+        "or": (
+            f"({sort_column}.{op}.{quoted},"
+            f"and({sort_column}.eq.{quoted},id.{op}.{_quote_filter_value(row_id)}))"
+        ),
+    }
+
+
+def _leads_null_tail_params(params: dict[str, str], sort_column: str, limit: int) -> dict[str, str]:
+    """Consulta de los nulos que siguen a la última fila con valor de la página."""
+    tail = {key: value for key, value in params.items() if key not in {sort_column, "or"}}
+    tail[sort_column] = "is.null"
+    tail["limit"] = str(limit)
+    return tail
+
+
+def _quote_filter_value(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
 @router.get("/leads")
 async def listar_leads(
     q: str | None = Query(default=None),
@@ -1029,8 +1063,21 @@ async def listar_leads(
     direction: Literal["asc", "desc"] | None = Query(default=None),
     limit: int = Query(default=50, ge=1, le=500),
     offset: int = Query(default=0, ge=0),
+    cursor: str | None = Query(default=None, description="`next_cursor` de la página previa."),
+    count: CountMode = Query(default="exact", description="Modo de conteo del total."),
     authorization: str | None = Header(default=None),
 ) -> dict[str, Any]:
+    """Lista tarjetas de leads.
+
+    Admite paginación por `offset` o por `cursor` (keyset sobre la columna de
+    orden más `id`, latencia constante sin importar la profundidad). `count`
+    elige cómo se calcula `total`: `exact`, `planned`/`estimated` (aproximados por
+    el planner) o `none` (sin total); las páginas por `cursor` sin `q` no se cuentan
+    (los filtros del keyset sólo ven las filas restantes) y traen `total` nulo. Con
+    `q` se usa la RPC `panel_buscar_leads` (sin acentos, dígitos de teléfono
+    normalizados) y el orden es por relevancia, por lo que `sort`/`direction` se
+    rechazan. La respuesta informa el orden aplicado.
+    """
     token = _parse_bearer(authorization)
     if not token:
         raise HTTPException(status_code=401, detail="auth_required")
@@ -1050,16 +1097,43 @@ async def listar_leads(
         "propietario:usuarios!lead_tarjetas_propietario_usuario_id_fkey(id,nombre_completo,correo)"
     )
 
+    # Se pide una fila extra para saber si hay más sin depender del conteo.
     params: dict[str, str] = {
         "select": select_clause,
-        "limit": str(limit),
-        "offset": str(offset),
+        "limit": str(limit + 1),
     }
 
-    sort_columns = {"creado_en", "actualizado_en", "lead_score"}
     direction_value = direction if direction in {"asc", "desc"} else "desc"
-    sort_column = sort if sort in sort_columns else "creado_en"
-    params["order"] = f"{sort_column}.{direction_value}"
+    sort_column = sort if sort in _LEADS_SORT_COLUMNS else "creado_en"
+    search_term = _normalize_search_term(q)
+    path = "/rest/v1/lead_tarjetas"
+    null_tail = False
+    keyset_page = False
+
+    if search_term:
+        # Búsqueda indexada (trigramas + tsvector) ordenada por relevancia; pagina por posición.
+        if sort is not None or direction is not None:
+            raise HTTPException(status_code=400, detail="orden_no_aplica_con_q")
+        path = "/rest/v1/rpc/panel_buscar_leads"
+        params["p_q"] = search_term
+        sort_column, direction_value = _LEADS_RANK_SORT, "desc"
+        if cursor:
+            position = _decode_leads_cursor(cursor, sort_column, direction_value)
+            offset = _cursor_offset(position)
+        if offset:
+            params["offset"] = str(offset)
+    else:
+        params["order"] = _leads_order(sort_column, direction_value)
+        if cursor:
+            position = _decode_leads_cursor(cursor, sort_column, direction_value)
+            params.update(_leads_keyset_params(position, sort_column, direction_value))
+            null_tail = (
+                sort_column in _LEADS_NULLABLE_SORT_COLUMNS and position.get("v") is not None
+            )
+            keyset_page = True
+            offset = 0
+        elif offset:
+            params["offset"] = str(offset)
 
     if canal:
         params["canal"] = f"eq.{canal.lower()}"
@@ -1072,21 +1146,12 @@ async def listar_leads(
     if propietario:
         params["propietario_usuario_id"] = f"eq.{propietario}"
 
-    if q:
-        cleaned = " ".join(q.strip().split())
-        sanitized = "".join(ch for ch in cleaned if ch.isalnum() or ch in "@._+- ")
-        if sanitized:
-            like = sanitized
-            params["or"] = (
-                f"(contacto_nombre.ilike.*{like}*,contacto_correo.ilike.*{like}*,"
-                f"contacto_telefono.ilike.*{like}*)"
-            )
-
+    counted = count != "none" and not keyset_page
     resp = await _sb_get(
-        "/rest/v1/lead_tarjetas",
+        path,
         params=params,
         token=token,
-        prefer="count=exact",
+        prefer=f"count={count}" if counted else None,
     )
     if resp.status_code >= 400:
         raise _supabase_error(resp, "Error consultando leads")
@@ -1094,6 +1159,20 @@ async def listar_leads(
     raw = resp.json() or []
     if not isinstance(raw, list):
         raw = []
+    total = postgrest.content_range_total(resp.headers.get("content-range")) if counted else None
+    if null_tail and len(raw) <= limit:
+        tail_resp = await _sb_get(
+            path,
+            params=_leads_null_tail_params(params, sort_column, limit + 1 - len(raw)),
+            token=token,
+        )
+        if tail_resp.status_code >= 400:
+            raise _supabase_error(tail_resp, "Error consultando leads")
+        tail_rows = tail_resp.json() or []
+        if isinstance(tail_rows, list):
+            raw.extend(tail_rows)
+    has_more = len(raw) > limit
+    raw = raw[:limit]
 
     items: list[dict[str, Any]] = []
     for row in raw:
@@ -1196,16 +1275,29 @@ async def listar_leads(
             }
         )
 
-    total = _content_range_total(resp.headers.get("content-range"))
-    computed_total = total if total is not None else offset + len(items)
+    if total is None and counted:
+        total = offset + len(items) + (1 if has_more else 0)
+
+    next_cursor = None
+    if has_more and raw:
+        if search_term:
+            next_cursor = _encode_cursor(
+                {"s": sort_column, "d": direction_value, "o": offset + len(raw)}
+            )
+        else:
+            next_cursor = _encode_leads_cursor(raw[-1], sort_column, direction_value)
 
     return {
         "ok": True,
         "items": items,
-        "total": computed_total,
+        "total": total,
+        "total_aproximado": counted and count in {"planned", "estimated"},
         "limit": limit,
         "offset": offset,
-        "has_more": computed_total > offset + len(items),
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "sort": sort_column,
+        "direction": direction_value,
     }
 
 
@@ -1498,6 +1590,101 @@ async def get_inbox(
     return {"ok": True, "items": items}
 
 
+async def _inbox_event_stream(
+    canal: str | None,
+    visibility: inbox_events.VisibilityFilter,
+    *,
+    expires_at: float | None = None,
+    heartbeat: float | None = None,
+) -> AsyncIterator[str]:
+    """Eventos SSE del hub del inbox filtrados por la RLS del agente.
+
+    Comentarios `ping` mantienen viva la conexión. El stream termina cuando el
+    JWT del agente vence o PostgREST deja de aceptarlo; el cliente pide un ticket
+    nuevo y reconecta.
+    """
+    interval = heartbeat or settings.inbox_heartbeat_seconds
+    async with inbox_events.hub.subscribe() as queue:
+        yield "retry: 3000\n\n"
+        while True:
+            if expires_at is not None and time.time() >= expires_at:
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=interval)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if canal and event.get("canal") not in (None, canal):
+                continue
+            try:
+                if not await visibility.allows(event):
+                    continue
+            except inbox_events.VisibilityExpired:
+                return
+            except Exception as exc:
+                logger.warning(
+                    "inbox.visibility_check_failed",
+                    extra={"conversation_id": event.get("conversation_id"), "error": str(exc)},
+                )
+                continue
+            data = json.dumps(event, ensure_ascii=False, default=str)
+            yield f"event: {event.get('type', 'message')}\ndata: {data}\n\n"
+
+
+def _stream_grant(token: str | None) -> inbox_events.StreamGrant | None:
+    claims = _jwt_verify_and_claims(token)
+    user_id = str(claims.get("sub") or "") if claims else ""
+    if not token or not claims or not user_id:
+        return None
+    exp = claims.get("exp")
+    return inbox_events.StreamGrant(
+        user_id=user_id,
+        token=token,
+        expires_at=float(exp) if isinstance(exp, (int, float)) else None,
+    )
+
+
+@router.post("/inbox/stream/ticket")
+async def inbox_stream_ticket(authorization: str | None = Header(default=None)) -> dict[str, Any]:
+    """Ticket de un solo uso para abrir `/inbox/stream` desde `EventSource`.
+
+    `EventSource` no envía headers; el ticket evita poner el JWT en la URL (y en
+    los logs de proxies). Vence en `inbox_stream_ticket_ttl_seconds`.
+    """
+    grant = _stream_grant(_parse_bearer(authorization))
+    if grant is None:
+        raise HTTPException(status_code=401, detail="auth_required")
+    return {
+        "ok": True,
+        "ticket": inbox_events.tickets.issue(grant),
+        "expires_in": settings.inbox_stream_ticket_ttl_seconds,
+    }
+
+
+@router.get("/inbox/stream")
+async def stream_inbox(
+    canal: str | None = Query(default=None),
+    ticket: str | None = Query(default=None, description="De `POST /inbox/stream/ticket`."),
+    authorization: str | None = Header(default=None),
+) -> StreamingResponse:
+    """Push de cambios del inbox (Server-Sent Events) para agentes conectados.
+
+    Eventos `message`, `conversation`, `manual` y `resync` (volver a pedir `/inbox`),
+    sólo de conversaciones que el agente puede ver.
+    """
+    grant = _stream_grant(_parse_bearer(authorization)) or inbox_events.tickets.redeem(ticket)
+    if grant is None:
+        raise HTTPException(status_code=401, detail="auth_required")
+    visibility = inbox_events.VisibilityFilter(
+        grant.token, ttl=settings.inbox_visibility_cache_ttl_seconds
+    )
+    return StreamingResponse(
+        _inbox_event_stream(canal, visibility, expires_at=grant.expires_at),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/conversaciones/{conversacion_id}/marcar_leida")
 async def mark_conversation_read(
     conversacion_id: str,
@@ -1507,36 +1694,20 @@ async def mark_conversation_read(
     if not token:
         raise HTTPException(status_code=401, detail="auth_required")
     # Intenta poner no_leidos = 0 (RLS aplica)
-    base = _supabase_base_url()
-    url = f"{base}/rest/v1/conversaciones?id=eq.{conversacion_id}"
-    headers: dict[str, str] = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
-    anon = getattr(settings, "supabase_anon", None)
-    if anon:
-        headers["apikey"] = anon
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.patch(url, headers=headers, json={"no_leidos": 0})
-    except httpx.RequestError:
-        raise HTTPException(status_code=502, detail="Error al conectar a Supabase")
+    resp = await _sb_patch(
+        "/rest/v1/conversaciones",
+        params={"id": f"eq.{conversacion_id}"},
+        json={"no_leidos": 0},
+        token=token,
+    )
     if resp.status_code >= 400:
         raise HTTPException(status_code=resp.status_code, detail="No fue posible marcar como leída")
+    inbox_events.publish(
+        {"type": "conversation", "conversation_id": conversacion_id, "no_leidos": 0}
+    )
     return {"ok": True}
 
 
-def _auth_headers_for_user(token: str) -> dict[str, str]:
-    headers: dict[str, str] = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
-    anon = getattr(settings, "supabase_anon", None)
-    if anon:
-        headers["apikey"] = anon
-    return headers
-
-
 @router.post("/conversaciones/{conversacion_id}/cerrar")
 async def close_conversation(
     conversacion_id: str,
@@ -1545,18 +1716,19 @@ async def close_conversation(
     token = _parse_bearer(authorization)
     if not token:
         raise HTTPException(status_code=401, detail="auth_required")
-    base = _supabase_base_url()
-    url = f"{base}/rest/v1/conversaciones?id=eq.{conversacion_id}"
-    headers = _auth_headers_for_user(token)
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.patch(url, headers=headers, json={"estado": "cerrada"})
-    except httpx.RequestError:
-        raise HTTPException(status_code=502, detail="Error al conectar a Supabase")
+    resp = await _sb_patch(
+        "/rest/v1/conversaciones",
+        params={"id": f"eq.{conversacion_id}"},
+        json={"estado": "cerrada"},
+        token=token,
+    )
     if resp.status_code >= 400:
         raise HTTPException(
             status_code=resp.status_code, detail="No fue posible cerrar la conversación"
         )
+    inbox_events.publish(
+        {"type": "conversation", "conversation_id": conversacion_id, "estado": "cerrada"}
+    )
     return {"ok": True}
 
 
@@ -1569,16 +1741,17 @@ async def set_conversation_state(
     token = _parse_bearer(authorization)
     if not token:
         raise HTTPException(status_code=401, detail="auth_required")
-    base = _supabase_base_url()
-    url = f"{base}/rest/v1/conversaciones?id=eq.{conversacion_id}"
-    headers = _auth_headers_for_user(token)
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.patch(url, headers=headers, json={"estado": new_estado})
-    except httpx.RequestError:
-        raise HTTPException(status_code=502, detail="Error al conectar a Supabase")
+    resp = await _sb_patch(
+        "/rest/v1/conversaciones",
+        params={"id": f"eq.{conversacion_id}"},
+        json={"estado": new_estado},
+        token=token,
+    )
     if resp.status_code >= 400:
         raise HTTPException(status_code=resp.status_code, detail="No fue posible cambiar el estado")
+    inbox_events.publish(
+        {"type": "conversation", "conversation_id": conversacion_id, "estado": new_estado}
+    )
     return {"ok": True, "estado": new_estado}
 
 
@@ -1883,6 +2056,7 @@ async def listar_embudo_tableros(
 
 @router.get("/embudo")
 async def obtener_embudo(
+    response: Response,
     tablero: str | None = Query(default=None),
     canales: str | None = Query(default=None),
     rango: str | None = Query(default=None),
@@ -1894,18 +2068,44 @@ async def obtener_embudo(
     if not token:
         raise HTTPException(status_code=401, detail="auth_required")
 
-    board = await _fetch_tablero(token, tablero)
-    board_id = str(board.get("id"))
-
     channel_values: list[str] = []
     if canales:
         channel_values = [c.strip().lower() for c in canales.split(",") if c.strip()]
 
     date_from, date_to = _resolve_date_range(rango, desde, hasta)
 
-    etapas = await _fetch_etapas(token, board_id)
-    cards = await _fetch_embudo_cards(token, board_id, channel_values, date_from, date_to)
-    visitantes_total = await _fetch_visitantes_total(token, channel_values, date_from, date_to)
+    # Visitantes no depende del tablero; etapas y tarjetas arrancan en cuanto se
+    # conoce su id. Si alguna subconsulta falla, el TaskGroup cancela las demás.
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+    try:
+        async with asyncio.TaskGroup() as tg:
+            visitantes_task = tg.create_task(
+                _timed(
+                    timings,
+                    "visitantes",
+                    _fetch_visitantes_total(token, channel_values, date_from, date_to),
+                )
+            )
+            board = await _timed(timings, "tablero", _fetch_tablero(token, tablero))
+            board_id = str(board.get("id"))
+            etapas_task = tg.create_task(_timed(timings, "etapas", _fetch_etapas(token, board_id)))
+            cards_task = tg.create_task(
+                _timed(
+                    timings,
+                    "cards",
+                    _fetch_embudo_cards(token, board_id, channel_values, date_from, date_to),
+                )
+            )
+    except BaseExceptionGroup as group:
+        raise _first_error(group) from None
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+
+    etapas = etapas_task.result()
+    cards = cards_task.result()
+    visitantes_total = visitantes_task.result()
+    response.headers["Server-Timing"] = _server_timing(timings)
+    logger.debug("embudo.timings", extra={"timings_ms": timings})
 
     cards_by_stage: dict[str, list[dict[str, Any]]] = {}
     for row in cards:
@@ -1985,18 +2185,24 @@ async def embudo_visitantes(
     if canales:
         channel_values = [c.strip().lower() for c in canales.split(",") if c.strip()]
 
-    date_from, date_to = _resolve_date_range(rango, desde, hasta)
-    total = await _fetch_visitantes_total(token, channel_values, date_from, date_to)
+    date_from, date_to = _snap_date_range(*_resolve_date_range(rango, desde, hasta))
 
-    return {
-        "ok": True,
-        "total": total,
-        "range": {
-            "preset": (rango or "").strip().lower() or None,
-            "from": _format_utc(date_from) if date_from else None,
-            "to": _format_utc(date_to) if date_to else None,
-        },
-    }
+    async def load() -> dict[str, Any]:
+        total = await _fetch_visitantes_total(token, channel_values, date_from, date_to)
+        return {
+            "ok": True,
+            "total": total,
+            "range": _build_range_payload(rango, date_from, date_to),
+        }
+
+    key = (
+        "embudo.visitantes",
+        _range_preset(rango),
+        date_from,
+        date_to,
+        tuple(sorted(channel_values)),
+    )
+    return await _cached_kpis(key, token, load)
 
 
 @router.get("/dashboard/kpis")
@@ -2010,18 +2216,18 @@ async def dashboard_kpis_endpoint(
     if not token:
         raise HTTPException(status_code=401, detail="auth_required")
 
-    date_from, date_to = _resolve_date_range(rango, desde, hasta)
-    payload = await _fetch_dashboard_kpis(token, date_from, date_to)
+    date_from, date_to = _snap_date_range(*_resolve_date_range(rango, desde, hasta))
 
-    return {
-        "ok": True,
-        "kpis": payload,
-        "range": {
-            "preset": (rango or "").strip().lower() or None,
-            "from": _format_utc(date_from) if date_from else None,
-            "to": _format_utc(date_to) if date_to else None,
-        },
-    }
+    async def load() -> dict[str, Any]:
+        payload = await _fetch_dashboard_kpis(token, date_from, date_to)
+        return {
+            "ok": True,
+            "kpis": payload,
+            "range": _build_range_payload(rango, date_from, date_to),
+        }
+
+    key = ("dashboard.kpis", _range_preset(rango), date_from, date_to)
+    return await _cached_kpis(key, token, load)
 
 
 def _parse_bool_flag(value: str | None) -> bool | None:
@@ -2099,18 +2305,83 @@ async def visitas_webchat_detalle(
     }
 
 
+def _range_preset(rango: str | None) -> str | None:
+    return (rango or "").strip().lower() or None
+
+
 def _build_range_payload(
     rango: str | None,
     date_from: datetime | None,
     date_to: datetime | None,
 ) -> dict[str, str | None]:
     return {
-        "preset": (rango or "").strip().lower() or None,
+        "preset": _range_preset(rango),
         "from": _format_utc(date_from) if date_from else None,
         "to": _format_utc(date_to) if date_to else None,
     }
 
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_KPI_CACHE: StaleWhileRevalidateCache[tuple[Any, ...], dict[str, Any]] = StaleWhileRevalidateCache(
+    ttl=settings.panel_kpi_cache_ttl_seconds,
+    stale_ttl=settings.panel_kpi_cache_stale_seconds,
+    maxsize=settings.panel_kpi_cache_max_entries,
+)
+
+
+def _snap_date_range(
+    date_from: datetime | None,
+    date_to: datetime | None,
+) -> tuple[datetime | None, datetime | None]:
+    """Redondea el rango a `panel_kpi_cache_granularity_seconds`.
+
+    El inicio baja al comienzo de su intervalo y el fin sube al último microsegundo
+    del suyo: el rango sólo se amplía y los presets móviles (`7d`, `30d`) pedidos
+    dentro del mismo intervalo comparten llave de caché.
+    """
+    step = int(settings.panel_kpi_cache_granularity_seconds) * 1_000_000
+    if step <= 0:
+        return date_from, date_to
+    resolution = timedelta(microseconds=1)
+    if date_from:
+        micros = (date_from - _EPOCH) // resolution
+        date_from = _EPOCH + (micros // step * step) * resolution
+    if date_to:
+        micros = (date_to - _EPOCH) // resolution
+        date_to = _EPOCH + ((micros // step + 1) * step - 1) * resolution
+    return date_from, date_to
+
+
+async def _kpi_cache_scope(token: str) -> str | None:
+    """Roles del solicitante para la llave de caché; `None` si el JWT no es verificable.
+
+    Las agregaciones son SECURITY DEFINER y no filtran por usuario, así que basta con
+    separar por rol; sin claims verificados no se comparte nada y se consulta directo.
+    """
+    claims = _jwt_verify_and_claims(token)
+    user_id = str(claims.get("sub") or "") if claims else ""
+    if not claims or not user_id:
+        return None
+    roles = await _user_roles(user_id, claims, "Error validando roles")
+    return ",".join(sorted(roles)) or "-"
+
+
+async def _cached_kpis(
+    key: tuple[Any, ...],
+    token: str,
+    load: Callable[[], Awaitable[dict[str, Any]]],
+) -> dict[str, Any]:
+    """Sirve una respuesta de dashboard/KPIs desde `_KPI_CACHE` (stale-while-revalidate)."""
+    scope = await _kpi_cache_scope(token)
+    if scope is None:
+        return await load()
+    return await _KPI_CACHE.get_or_load((*key, scope), load)
+
+
+def kpi_cache_stats() -> dict[str, float]:
+    return _KPI_CACHE.stats()
+
+
 @router.get("/agenda/demos")
 async def agenda_demos(
     limit: int = Query(default=100, ge=1, le=500),
@@ -2427,34 +2698,72 @@ def _parse_channels_param(canales: str | None) -> list[str]:
     return values
 
 
+_GEO_STALE_WHILE_REVALIDATE = 7 * 24 * 3600
+
+
+def _geo_response(
+    asset: geo_assets.EncodedAsset,
+    accept_encoding: str | None,
+    if_none_match: str | None,
+) -> Response:
+    """Entrega un catálogo pre-codificado negociando compresión y revalidación."""
+    encoding, body = asset.negotiate(accept_encoding)
+    headers = {
+        "ETag": asset.etag(encoding),
+        "Cache-Control": (
+            f"public, max-age={settings.geo_cache_max_age_seconds}, "
+            f"stale-while-revalidate={_GEO_STALE_WHILE_REVALIDATE}"
+        ),
+        "Vary": "Accept-Encoding",
+    }
+    if asset.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/kpis/leads/geo/estados")
-async def leads_geo_estados() -> dict[str, Any]:
+async def leads_geo_estados(
+    detalle: leads_geo.Detalle = Query(default="alto"),
+    accept_encoding: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+) -> Response:
     try:
-        geojson = leads_geo.load_states_geojson()
+        asset = await geo_assets.states(detalle)
     except FileNotFoundError as exc:  # pragma: no cover - depende de despliegue
         logger.exception("geo.states_missing")
         raise HTTPException(status_code=500, detail="geojson_missing") from exc
-    return {"ok": True, "geojson": geojson}
+    return _geo_response(asset, accept_encoding, if_none_match)
 
 
 @router.get("/kpis/leads/geo/municipios/{estado}")
-async def leads_geo_municipios(estado: str) -> dict[str, Any]:
+async def leads_geo_municipios(
+    estado: str,
+    detalle: leads_geo.Detalle = Query(default="alto"),
+    accept_encoding: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+) -> Response:
     code = _ensure_state_code(estado)
     try:
-        geojson = leads_geo.load_state_municipalities_geojson(code)
+        asset = await geo_assets.municipalities(code, detalle)
     except KeyError as exc:
         raise HTTPException(status_code=404, detail="estado_not_found") from exc
-    return {"ok": True, "geojson": geojson}
+    return _geo_response(asset, accept_encoding, if_none_match)
 
 
 @router.get("/kpis/leads/geo/paises")
-async def leads_geo_paises() -> dict[str, Any]:
+async def leads_geo_paises(
+    detalle: leads_geo.Detalle = Query(default="alto"),
+    accept_encoding: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+) -> Response:
     try:
-        geojson = leads_geo.load_world_countries_geojson()
+        asset = await geo_assets.world(detalle)
     except FileNotFoundError as exc:  # pragma: no cover - depende del despliegue
         logger.exception("geo.world_missing")
         raise HTTPException(status_code=500, detail="geojson_missing") from exc
-    return {"ok": True, "geojson": geojson}
+    return _geo_response(asset, accept_encoding, if_none_match)
 
 
 @router.get("/kpis/visitantes/estados")
@@ -2468,7 +2777,19 @@ async def visitantes_estado_metrics(
     if not token:
         raise HTTPException(status_code=401, detail="auth_required")
 
-    date_from, date_to = _resolve_date_range(rango, desde, hasta)
+    date_from, date_to = _snap_date_range(*_resolve_date_range(rango, desde, hasta))
+    return await _cached_kpis(
+        ("kpis.visitantes.estados", _range_preset(rango), date_from, date_to),
+        token,
+        lambda: _visitantes_estados_payload(rango, date_from, date_to),
+    )
+
+
+async def _visitantes_estados_payload(
+    rango: str | None,
+    date_from: datetime | None,
+    date_to: datetime | None,
+) -> dict[str, Any]:
     try:
         payload = await storage.fetch_visitantes_estados(date_from=date_from, date_to=date_to)
     except storage.StorageError as exc:
@@ -2526,8 +2847,19 @@ async def visitantes_paises_metrics(
     if not token:
         raise HTTPException(status_code=401, detail="auth_required")
 
-    date_from, date_to = _resolve_date_range(rango, desde, hasta)
+    date_from, date_to = _snap_date_range(*_resolve_date_range(rango, desde, hasta))
+    return await _cached_kpis(
+        ("kpis.visitantes.paises", _range_preset(rango), date_from, date_to),
+        token,
+        lambda: _visitantes_paises_payload(rango, date_from, date_to),
+    )
 
+
+async def _visitantes_paises_payload(
+    rango: str | None,
+    date_from: datetime | None,
+    date_to: datetime | None,
+) -> dict[str, Any]:
     try:
         payload = await storage.fetch_visitantes_paises(date_from=date_from, date_to=date_to)
     except storage.StorageError as exc:
@@ -2592,8 +2924,20 @@ async def visitantes_municipios_metrics(
         raise HTTPException(status_code=401, detail="auth_required")
 
     state_code = _ensure_state_code(estado)
-    date_from, date_to = _resolve_date_range(rango, desde, hasta)
+    date_from, date_to = _snap_date_range(*_resolve_date_range(rango, desde, hasta))
+    return await _cached_kpis(
+        ("kpis.visitantes.municipios", state_code, _range_preset(rango), date_from, date_to),
+        token,
+        lambda: _visitantes_municipios_payload(state_code, rango, date_from, date_to),
+    )
+
 
+async def _visitantes_municipios_payload(
+    state_code: str,
+    rango: str | None,
+    date_from: datetime | None,
+    date_to: datetime | None,
+) -> dict[str, Any]:
     try:
         payload = await storage.fetch_visitantes_municipios(
             state_code, date_from=date_from, date_to=date_to
@@ -2670,11 +3014,30 @@ async def leads_estado_metrics(
         raise HTTPException(status_code=401, detail="auth_required")
 
     channel_values = _parse_channels_param(canales)
+    date_from, date_to = _snap_date_range(*_resolve_date_range(rango, desde, hasta))
+    key = (
+        "kpis.leads.estados",
+        _range_preset(rango),
+        date_from,
+        date_to,
+        tuple(sorted(channel_values)),
+    )
+    return await _cached_kpis(
+        key,
+        token,
+        lambda: _leads_estados_payload(channel_values, rango, date_from, date_to),
+    )
+
+
+async def _leads_estados_payload(
+    channel_values: list[str],
+    rango: str | None,
+    date_from: datetime | None,
+    date_to: datetime | None,
+) -> dict[str, Any]:
     include_visitantes = "visitantes" in channel_values
     lead_channels = [value for value in channel_values if value != "visitantes"]
 
-    date_from, date_to = _resolve_date_range(rango, desde, hasta)
-
     leads_payload: dict[str, Any] = {"items": [], "totals": {}}
     should_fetch_leads = not channel_values or bool(lead_channels)
     if should_fetch_leads:
@@ -2793,11 +3156,32 @@ async def leads_municipios_metrics(
 
     state_code = _ensure_state_code(estado)
     channel_values = _parse_channels_param(canales)
+    date_from, date_to = _snap_date_range(*_resolve_date_range(rango, desde, hasta))
+    key = (
+        "kpis.leads.municipios",
+        state_code,
+        _range_preset(rango),
+        date_from,
+        date_to,
+        tuple(sorted(channel_values)),
+    )
+    return await _cached_kpis(
+        key,
+        token,
+        lambda: _leads_municipios_payload(state_code, channel_values, rango, date_from, date_to),
+    )
+
+
+async def _leads_municipios_payload(
+    state_code: str,
+    channel_values: list[str],
+    rango: str | None,
+    date_from: datetime | None,
+    date_to: datetime | None,
+) -> dict[str, Any]:
     include_visitantes = "visitantes" in channel_values
     lead_channels = [value for value in channel_values if value != "visitantes"]
 
-    date_from, date_to = _resolve_date_range(rango, desde, hasta)
-
     leads_payload: dict[str, Any] = {"items": [], "totals": {}, "estado": None}
     should_fetch_leads = not channel_values or bool(lead_channels)
     if should_fetch_leads:
@@ -0,0 +1,181 @@
+"""Caché de especificaciones (modelo, instrucciones, tools) de asistentes OpenAI.
+
+Las specs se precargan al arrancar para los asistentes del registro. Una spec
+vencida se sigue sirviendo mientras se refresca en segundo plano; si OpenAI no
+responde se conserva la última spec válida y se reintenta más tarde. Las cargas
+concurrentes de un mismo asistente comparten una sola llamada.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from openai import AsyncOpenAI
+
+from app.core.cache import SingleFlight
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services import openai as openai_service
+
+from . import registry
+
+logger = get_logger(__name__)
+
+_RETRY_SECONDS = 30.0  # espera antes de reintentar un refresco fallido
+
+
+@dataclass(slots=True)
+class AssistantSpec:
+    """Especificación resuelta del asistente remoto."""
+
+    model: str
+    instructions: str | None
+    tools: list[dict[str, Any]]
+
+
+@dataclass(slots=True)
+class _Entry:
+    spec: AssistantSpec
+    refresh_at: float
+
+
+_SPECS: dict[str, _Entry] = {}
+_INFLIGHT: SingleFlight[str, AssistantSpec] = SingleFlight()
+_REFRESHES: dict[str, asyncio.Task[None]] = {}
+_PRELOAD: asyncio.Task[None] | None = None
+
+
+async def get_spec(client: AsyncOpenAI, assistant_id: str) -> AssistantSpec:
+    """Spec del asistente; sólo espera a OpenAI cuando no hay ninguna en memoria."""
+    entry = _SPECS.get(assistant_id)
+    if entry is None:
+        return await _INFLIGHT.run(assistant_id, lambda: _load(client, assistant_id))
+    if entry.refresh_at <= time.monotonic():
+        _schedule_refresh(client, assistant_id)
+    return entry.spec
+
+
+def _schedule_refresh(client: AsyncOpenAI, assistant_id: str) -> None:
+    if assistant_id in _REFRESHES:
+        return
+    task = asyncio.ensure_future(_refresh(client, assistant_id))
+    _REFRESHES[assistant_id] = task
+    task.add_done_callback(lambda _task, key=assistant_id: _REFRESHES.pop(key, None))
+
+
+async def _refresh(client: AsyncOpenAI, assistant_id: str) -> None:
+    try:
+        await _INFLIGHT.run(assistant_id, lambda: _load(client, assistant_id))
+    except Exception as exc:
+        entry = _SPECS.get(assistant_id)
+        if entry is not None:
+            entry.refresh_at = time.monotonic() + _RETRY_SECONDS
+        logger.warning(
+            "assistants.spec_refresh_failed",
+            extra={"assistant_id": assistant_id, "error": str(exc)},
+        )
+
+
+async def _load(client: AsyncOpenAI, assistant_id: str) -> AssistantSpec:
+    spec = await fetch_spec(client, assistant_id)
+    _SPECS[assistant_id] = _Entry(
+        spec=spec,
+        refresh_at=time.monotonic() + settings.openai_assistant_spec_ttl_seconds,
+    )
+    return spec
+
+
+async def fetch_spec(client: AsyncOpenAI, assistant_id: str) -> AssistantSpec:
+    """Consulta la configuración completa del asistente en OpenAI (sin caché)."""
+    record = await client.beta.assistants.retrieve(assistant_id=assistant_id)
+    dump = record.model_dump()
+    tools_dump = dump.get("tools") or []
+    tools: list[dict[str, Any]] = []
+    for tool in tools_dump:
+        if isinstance(tool, dict):
+            tools.append(tool)
+        else:  # pragma: no cover
+            try:
+                tools.append(tool.model_dump(exclude_none=True))
+            except AttributeError:
+                tools.append(dict(tool))
+    return AssistantSpec(
+        model=_extract_model(dump, assistant_id),
+        instructions=dump.get("instructions"),
+        tools=tools,
+    )
+
+
+def _extract_model(dump: dict[str, Any], assistant_id: str) -> str:
+    """Obtiene el modelo declarado en el asistente o lanza error descriptivo."""
+    model = dump.get("model")
+    if not model:
+        raise ValueError(f"El asistente {assistant_id} no tiene modelo configurado")
+    return str(model)
+
+
+def invalidate(assistant_id: str | None = None) -> None:
+    """Descarta la spec de un asistente (o todas) para forzar la siguiente carga."""
+    if assistant_id is None:
+        _SPECS.clear()
+    else:
+        _SPECS.pop(assistant_id, None)
+
+
+async def _preload(client: AsyncOpenAI, assistant_ids: set[str]) -> None:
+    results = await asyncio.gather(
+        *(_INFLIGHT.run(aid, lambda aid=aid: _load(client, aid)) for aid in assistant_ids),
+        return_exceptions=True,
+    )
+    for assistant_id, result in zip(assistant_ids, results):
+        if isinstance(result, BaseException):
+            logger.warning(
+                "assistants.spec_preload_failed",
+                extra={"assistant_id": assistant_id, "error": str(result)},
+            )
+
+
+async def startup() -> None:
+    """Precarga en segundo plano las specs de los asistentes registrados.
+
+    No bloquea el arranque: si OpenAI está lento, el primer turno se une a la
+    misma carga en curso mediante `_INFLIGHT`.
+    """
+    global _PRELOAD
+    assistant_ids: set[str] = set()
+    for name in registry.REGISTRY:
+        try:
+            config = registry.resolve_assistant(name)
+        except (RuntimeError, ValueError) as exc:
+            logger.warning(
+                "assistants.spec_preload_skipped", extra={"assistant": name, "error": str(exc)}
+            )
+            continue
+        if config.assistant_id and not config.is_prompt:
+            assistant_ids.add(config.assistant_id)
+    if not assistant_ids:
+        return
+    try:
+        client = openai_service.get_assistant_client()
+    except RuntimeError as exc:
+        logger.warning("assistants.spec_preload_skipped", extra={"error": str(exc)})
+        return
+    if _PRELOAD is None or _PRELOAD.done():
+        _PRELOAD = asyncio.create_task(
+            _preload(client, assistant_ids), name="assistant-specs-preload"
+        )
+
+
+async def shutdown() -> None:
+    """Cancela la precarga y los refrescos en curso."""
+    global _PRELOAD
+    tasks = list(_REFRESHES.values())
+    if _PRELOAD is not None:
+        tasks.append(_PRELOAD)
+        _PRELOAD = None
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Query, Request, Response
+from datetime import datetime
+
+from fastapi import APIRouter, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
 from app.core.config import settings
 
@@ -24,17 +27,52 @@ async def post_webchat_message(
     return await service.handle_message(payload, request=request)
 
 
+@router.post(
+    "/messages/stream",
+    summary="Procesa un mensaje y transmite la respuesta por Server-Sent Events",
+)
+async def stream_webchat_message(
+    payload: schemas.MessageRequest,
+    request: Request,
+) -> StreamingResponse:
+    """Igual que `POST /messages`, pero emite la respuesta conforme se genera.
+
+    Eventos: `metadata`, `delta` (`{"text": ...}`) y `done` (cuerpo de `MessageResponse`).
+    """
+    events = await service.stream_message(payload, request=request)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get(
     "/messages",
     response_model=schemas.HistoryResponse,
     summary="Recupera historial de mensajes para un session_id",
+    responses={304: {"description": "El historial no cambió (If-None-Match)."}},
 )
 async def get_webchat_messages(
+    response: Response,
     session_id: str = Query(..., min_length=4, description="Identificador de sesión webchat."),
     limit: int = Query(100, ge=1, le=200, description="Número máximo de mensajes a recuperar."),
-) -> schemas.HistoryResponse:
-    """Devuelve mensajes recientes asociados a la sesión solicitada."""
-    return await service.fetch_history(session_id=session_id, limit=limit)
+    since: datetime | None = Query(
+        None, description="Cursor (`cursor` de la respuesta previa): sólo mensajes posteriores."
+    ),
+    if_none_match: str | None = Header(default=None),
+) -> schemas.HistoryResponse | Response:
+    """Devuelve mensajes recientes asociados a la sesión solicitada.
+
+    Responde con `ETag`; si coincide con `If-None-Match` se devuelve 304 sin cuerpo.
+    """
+    history = await service.fetch_history(session_id=session_id, limit=limit, since=since)
+    etag = service.history_etag(history)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if service.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return history
 
 
 @router.post(
@@ -70,6 +70,10 @@ class HistoryResponse(BaseModel):
     conversation_id: str | None = None
     messages: list[HistoryMessage] = Field(default_factory=list)
     manual_mode: bool = False
+    cursor: datetime | None = Field(
+        default=None,
+        description="Marca del último mensaje; enviarla como `since` para pedir sólo lo nuevo.",
+    )
 
 
 class CloseSessionRequest(BaseModel):
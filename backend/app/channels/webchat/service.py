@@ -2,18 +2,25 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
-from dataclasses import dataclass
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from datetime import datetime
 from typing import Any
 
 from fastapi import HTTPException, Request, status
 from openai import AsyncOpenAI
 
 from app.assistants import registry
+from app.assistants import specs as assistant_specs
 from app.assistants.manager import AssistantConfig
+from app.assistants.specs import AssistantSpec
+from app.core.cache import SingleFlight, TTLCache
 from app.core.config import settings
 from app.core.logging import get_logger, log_event
-from app.services import geolocation, leads_geo, storage
+from app.services import background, geolocation, leads_geo, storage
 from app.services import openai as openai_service
 
 from . import schemas
@@ -37,15 +44,31 @@ class WebchatContext:
 
 
 @dataclass(slots=True)
-class AssistantSpec:
-    """Especificación resuelta del asistente remoto."""
+class ToolWrites:
+    """Escrituras pendientes de una tool call; se aplican junto con las del resto de la ronda.
 
-    model: str
-    instructions: str | None
-    tools: list[dict[str, Any]]
+    `insights` son los argumentos de `storage.upsert_conversation_insights`, que se
+    escriben después de los PATCH a `contactos` y `conversaciones`.
+    """
 
+    contact: dict[str, Any] = field(default_factory=dict)
+    conversation: dict[str, Any] = field(default_factory=dict)
+    insights: dict[str, Any] | None = None
 
-_ASSISTANT_CACHE: dict[str, AssistantSpec] = {}
+    def __bool__(self) -> bool:
+        return bool(self.contact or self.conversation or self.insights)
+
+
+# (respuesta, payload final de OpenAI, tools llamadas, call_ids, conversación OpenAI)
+TurnResult = tuple[str | None, dict[str, Any], list[str], list[str], str | None]
+
+# Reintentos del widget: (session_id, client_message_id) → respuesta ya entregada.
+IdempotencyKey = tuple[str, str]
+_RESPONSES: TTLCache[IdempotencyKey, schemas.MessageResponse] = TTLCache(
+    ttl=settings.webchat_idempotency_ttl_seconds,
+    maxsize=settings.webchat_idempotency_max_entries,
+)
+_IN_FLIGHT: SingleFlight[IdempotencyKey, schemas.MessageResponse] = SingleFlight()
 
 
 def _extract_client_ip(request: Request | None) -> str | None:
@@ -228,19 +251,34 @@ async def _maybe_enrich_contact_metadata(
         )
 
 
+@dataclass(slots=True)
+class _VisitProgress:
+    """Pasos ya completados de un trabajo de visita, conservados entre reintentos."""
+
+    recorded: bool = False
+
+
 async def _register_webchat_visit(
     session_id: str,
     *,
-    request: Request | None,
+    client_ip: str | None,
+    user_agent_header: str | None,
     metadata: dict[str, Any] | None,
     contact_id_hint: str | None = None,
+    progress: _VisitProgress | None = None,
 ) -> str | None:
-    """Registra la visita para métricas y enriquece metadatos del contacto."""
+    """Registra la visita para métricas y enriquece metadatos del contacto.
+
+    Corre en la cola de segundo plano: las fallas al registrar la visita o al
+    resolver el contacto se elevan para que la cola reintente. El registro no es
+    idempotente (`record_webchat_visitante` incrementa `visit_count`), así que
+    `progress` recuerda que ya se hizo y un reintento sólo repite lo que falló.
+    El enriquecimiento del contacto sigue siendo de mejor esfuerzo.
+    """
+    progress = progress or _VisitProgress()
     client_meta = _safe_dict(metadata)
     client_context = _safe_dict(client_meta.get("client"))
 
-    client_ip = _extract_client_ip(request)
-    user_agent_header = request.headers.get("user-agent") if request else None
     device_type = _classify_device_type(user_agent_header, client_context)
 
     geo_ip_data: dict[str, Any] | None = None
@@ -327,36 +365,39 @@ async def _register_webchat_visit(
         },
     )
 
-    try:
-        await storage.record_webchat_visit(
-            session_id,
-            ip=client_ip,
-            device_type=device_type,
-            geo=visitor_geo_payload or None,
-            cve_ent=estado_clave,
-            nom_ent=estado_nombre,
-            cve_mun=municipio_clave,
-            nom_mun=municipio_nombre,
-            cvegeo=cvegeo,
-            referrer=referrer,
-            landing_url=landing_url,
-        )
-    except storage.StorageError as exc:
-        logger.exception(
-            "webchat.record_visit_failed",
-            extra={"session_id": session_id, "error": str(exc)},
-        )
+    if not progress.recorded:
+        try:
+            await storage.record_webchat_visit(
+                session_id,
+                ip=client_ip,
+                device_type=device_type,
+                geo=visitor_geo_payload or None,
+                cve_ent=estado_clave,
+                nom_ent=estado_nombre,
+                cve_mun=municipio_clave,
+                nom_mun=municipio_nombre,
+                cvegeo=cvegeo,
+                referrer=referrer,
+                landing_url=landing_url,
+            )
+        except storage.StorageError as exc:
+            logger.warning(
+                "webchat.record_visit_failed",
+                extra={"session_id": session_id, "error": str(exc)},
+            )
+            raise
+        progress.recorded = True
 
     contact_id = str(contact_id_hint) if contact_id_hint else None
     if not contact_id:
         try:
             contact_id = await storage.get_webchat_contact_id(session_id)
         except storage.StorageError as exc:
-            logger.exception(
+            logger.warning(
                 "webchat.resolve_contact_failed",
                 extra={"session_id": session_id, "error": str(exc)},
             )
-            contact_id = None
+            raise
 
     if contact_id:
         try:
@@ -382,26 +423,84 @@ async def _register_webchat_visit(
     return contact_id
 
 
+def enqueue_visit(
+    session_id: str,
+    *,
+    request: Request | None,
+    metadata: dict[str, Any] | None,
+    contact_id_hint: str | None = None,
+) -> bool:
+    """Encola el registro/enriquecimiento de la visita fuera del camino crítico.
+
+    IP y user-agent se extraen aquí porque el `Request` no sobrevive a la respuesta.
+    """
+    client_ip = _extract_client_ip(request)
+    user_agent_header = request.headers.get("user-agent") if request else None
+
+    # La cola vuelve a invocar `job` en cada reintento; el progreso sobrevive.
+    progress = _VisitProgress()
+
+    async def job() -> None:
+        await _register_webchat_visit(
+            session_id,
+            client_ip=client_ip,
+            user_agent_header=user_agent_header,
+            metadata=metadata,
+            contact_id_hint=contact_id_hint,
+            progress=progress,
+        )
+
+    return background.submit("webchat.visit", job)
+
+
 async def register_visit(
     session_id: str,
     *,
     metadata: dict[str, Any] | None,
     request: Request | None,
-) -> str | None:
+) -> None:
     """Endpoint público para registrar la visita aunque no haya mensajes."""
-    return await _register_webchat_visit(
-        session_id,
-        request=request,
-        metadata=metadata,
-    )
+    enqueue_visit(session_id, request=request, metadata=metadata)
 
 
-async def handle_message(
+@dataclass(slots=True)
+class PreparedTurn:
+    """Estado resuelto antes de invocar al modelo (compartido por respuesta y stream)."""
+
+    payload: schemas.MessageRequest
+    metadata: schemas.MessageMetadata
+    client: AsyncOpenAI | None = None
+    assistant: AssistantConfig | None = None
+    assistant_spec: AssistantSpec | None = None
+    context: WebchatContext | None = None
+    previous_response_id: str | None = None
+
+    @property
+    def manual(self) -> bool:
+        return self.context is None
+
+
+async def _lookup_conversation(conversation_id: str) -> dict[str, Any]:
+    try:
+        return await storage.fetch_webchat_conversation(conversation_id)
+    except storage.StorageError as exc:
+        logger.exception(
+            "webchat.conversation_lookup_failed",
+            extra={"conversation_id": conversation_id, "error": str(exc)},
+        )
+        raise HTTPException(status_code=500, detail="No se pudo recuperar la conversación") from exc
+
+
+async def prepare_turn(
     payload: schemas.MessageRequest,
     *,
     request: Request | None = None,
-) -> schemas.MessageResponse:
-    """Orquesta la recepción de un mensaje y delega en OpenAI/Supabase."""
+) -> PreparedTurn:
+    """Registra el mensaje del visitante y resuelve conversación y asistente.
+
+    Eleva `HTTPException` ante errores, de modo que el endpoint de streaming pueda
+    fallar con un estado HTTP normal antes de abrir el stream.
+    """
     if payload.author != "user":
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -434,14 +533,16 @@ async def handle_message(
     if not conversation_id:
         raise HTTPException(status_code=500, detail="No se pudo identificar la conversación")
 
-    try:
-        conversation_meta = await storage.fetch_webchat_conversation(conversation_id)
-    except storage.StorageError as exc:
-        logger.exception(
-            "webchat.conversation_lookup_failed",
-            extra={"conversation_id": conversation_id, "error": str(exc)},
-        )
-        raise HTTPException(status_code=500, detail="No se pudo recuperar la conversación") from exc
+    conversation_meta: dict[str, Any] = {
+        "id": conversation_id,
+        "contact_id": registration.get("contact_id"),
+        "openai_conversation_id": registration.get("openai_conversation_id"),
+        "last_response_id": registration.get("last_response_id"),
+        "manual_override": registration.get("manual_override"),
+    }
+    if registration.get("contact_id") is None or registration.get("manual_override") is None:
+        # La RPC previa no devuelve el estado de la conversación.
+        conversation_meta = await _lookup_conversation(conversation_id)
 
     openai_conversation_id = registration.get("openai_conversation_id") or conversation_meta.get(
         "openai_conversation_id"
@@ -462,7 +563,7 @@ async def handle_message(
             conversation_id=str(conversation_id),
             session_id=payload.session_id,
         )
-        return schemas.MessageResponse(reply=None, metadata=metadata)
+        return PreparedTurn(payload=payload, metadata=metadata)
 
     contact_id = conversation_meta.get("contact_id")
     if not contact_id:
@@ -470,13 +571,12 @@ async def handle_message(
             status_code=500, detail="No se pudo asociar la conversación al contacto"
         )
 
-    contact_id_value = await _register_webchat_visit(
+    enqueue_visit(
         payload.session_id,
         request=request,
         metadata=metadata_dict,
         contact_id_hint=str(contact_id),
     )
-    contact_id = contact_id_value or str(contact_id)
 
     assistant: AssistantConfig
     try:
@@ -500,41 +600,39 @@ async def handle_message(
             raise HTTPException(
                 status_code=500, detail="No se pudo cargar la configuración del asistente"
             ) from exc
-    context = WebchatContext(
-        conversation_id=str(conversation_id),
-        contact_id=str(contact_id),
-        session_id=payload.session_id,
+
+    return PreparedTurn(
+        payload=payload,
+        metadata=metadata,
+        client=client,
+        assistant=assistant,
+        assistant_spec=assistant_spec,
+        context=WebchatContext(
+            conversation_id=str(conversation_id),
+            contact_id=str(contact_id),
+            session_id=payload.session_id,
+        ),
+        previous_response_id=conversation_meta.get("last_response_id"),
     )
 
-    try:
-        (
-            assistant_reply,
-            response_payload,
-            tools_called,
-            tool_call_ids,
-            resolved_openai_conversation,
-        ) = await _run_assistant_turn(
-            client=client,
-            assistant=assistant,
-            assistant_spec=assistant_spec,
-            context=context,
-            user_message=payload,
-            openai_conversation_id=openai_conversation_id,
-            previous_response_id=conversation_meta.get("last_response_id"),
-        )
-    except Exception as exc:  # pragma: no cover - se registra y responde fallback
-        logger.exception(
-            "webchat.assistant_turn_failed",
-            extra={"conversation_id": str(conversation_id), "error": str(exc)},
-        )
-        return schemas.MessageResponse(
-            reply=DEFAULT_FALLBACK,
-            metadata=metadata,
-        )
 
-    metadata.openai_conversation_id = (
-        resolved_openai_conversation or metadata.openai_conversation_id
-    )
+def _turn_kwargs(turn: PreparedTurn) -> dict[str, Any]:
+    return {
+        "client": turn.client,
+        "assistant": turn.assistant,
+        "assistant_spec": turn.assistant_spec,
+        "context": turn.context,
+        "user_message": turn.payload,
+        "openai_conversation_id": turn.metadata.openai_conversation_id,
+        "previous_response_id": turn.previous_response_id,
+    }
+
+
+async def _finalize_turn(turn: PreparedTurn, result: TurnResult) -> schemas.MessageResponse:
+    """Completa la metadata con el resultado del modelo y persiste la respuesta."""
+    assistant_reply, response_payload, tools_called, tool_call_ids, resolved_conversation = result
+    metadata = turn.metadata
+    metadata.openai_conversation_id = resolved_conversation or metadata.openai_conversation_id
     metadata.assistant_response_id = (
         response_payload.get("id") if isinstance(response_payload, dict) else None
     )
@@ -544,7 +642,7 @@ async def handle_message(
     if assistant_reply:
         try:
             await storage.register_webchat_message(
-                session_id=payload.session_id,
+                session_id=turn.payload.session_id,
                 author="assistant",
                 content=assistant_reply,
                 response_id=metadata.assistant_response_id,
@@ -559,7 +657,7 @@ async def handle_message(
             logger.exception(
                 "webchat.register_assistant_failed",
                 extra={
-                    "conversation_id": str(conversation_id),
+                    "conversation_id": metadata.conversation_id,
                     "response_id": metadata.assistant_response_id,
                     "error": str(exc),
                 },
@@ -568,33 +666,234 @@ async def handle_message(
     return schemas.MessageResponse(reply=assistant_reply, metadata=metadata)
 
 
-async def fetch_history(session_id: str, limit: int) -> schemas.HistoryResponse:
-    """Devuelve mensajes recientes asociados al session_id del widget."""
+def _idempotency_key(payload: schemas.MessageRequest) -> IdempotencyKey | None:
+    if not payload.client_message_id:
+        return None
+    return (payload.session_id, payload.client_message_id)
+
+
+def remembered_response(payload: schemas.MessageRequest) -> schemas.MessageResponse | None:
+    """Respuesta ya entregada para el mismo `client_message_id` (reintento), si existe."""
+    key = _idempotency_key(payload)
+    if key is None:
+        return None
+    cached = _RESPONSES.get(key)
+    return cached.model_copy(deep=True) if cached is not None else None
+
+
+def _remember_response(payload: schemas.MessageRequest, response: schemas.MessageResponse) -> None:
+    key = _idempotency_key(payload)
+    if key is not None:
+        _RESPONSES.set(key, response.model_copy(deep=True))
+
+
+async def handle_message(
+    payload: schemas.MessageRequest,
+    *,
+    request: Request | None = None,
+) -> schemas.MessageResponse:
+    """Orquesta la recepción de un mensaje y delega en OpenAI/Supabase.
+
+    Es idempotente por `(session_id, client_message_id)`: un reintento que llega
+    mientras el original sigue en curso espera ese mismo resultado, y uno que llega
+    después recibe la respuesta guardada sin volver a registrar ni llamar a OpenAI.
+    """
+    key = _idempotency_key(payload)
+    if key is None:
+        return await _handle_message(payload, request=request)
+
+    cached = remembered_response(payload)
+    if cached is not None:
+        log_event(
+            logger,
+            "webchat.duplicate_message",
+            session_id=payload.session_id,
+            client_message_id=payload.client_message_id,
+        )
+        return cached
+
+    response = await _IN_FLIGHT.run(key, lambda: _remembered_handle(payload, request))
+    return response.model_copy(deep=True)
+
+
+async def _remembered_handle(
+    payload: schemas.MessageRequest, request: Request | None
+) -> schemas.MessageResponse:
+    response = await _handle_message(payload, request=request)
+    _remember_response(payload, response)
+    return response
+
+
+async def _handle_message(
+    payload: schemas.MessageRequest,
+    *,
+    request: Request | None = None,
+) -> schemas.MessageResponse:
+    turn = await prepare_turn(payload, request=request)
+    if turn.manual:
+        return schemas.MessageResponse(reply=None, metadata=turn.metadata)
+
     try:
-        conversation = await storage.resolve_webchat_conversation_from_session(session_id)
-    except storage.StorageError as exc:
-        logger.exception("webchat.history_resolve_failed", extra={"session_id": session_id})
-        raise HTTPException(
-            status_code=500, detail="No fue posible consultar la conversación"
-        ) from exc
+        result = await _run_assistant_turn(**_turn_kwargs(turn))
+    except Exception as exc:  # pragma: no cover - se registra y responde fallback
+        logger.exception(
+            "webchat.assistant_turn_failed",
+            extra={"conversation_id": turn.metadata.conversation_id, "error": str(exc)},
+        )
+        return schemas.MessageResponse(reply=DEFAULT_FALLBACK, metadata=turn.metadata)
 
-    if not conversation:
-        return schemas.HistoryResponse(conversation_id=None, messages=[], manual_mode=False)
+    return await _finalize_turn(turn, result)
+
+
+def _sse(event: str, data: Any) -> str:
+    body = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {body}\n\n"
+
+
+async def _turn_events(turn: PreparedTurn) -> AsyncIterator[tuple[str, Any]]:
+    """Eventos de un turno ya preparado; `done` lleva el `MessageResponse` final."""
+    yield "metadata", turn.metadata.model_dump(mode="json")
+    if turn.manual:
+        response = schemas.MessageResponse(reply=None, metadata=turn.metadata)
+        _remember_response(turn.payload, response)
+        yield "done", response
+        return
 
+    result: TurnResult | None = None
     try:
-        rows = await storage.fetch_recent_messages(
-            conversation_id=str(conversation["id"]),
-            limit=limit,
+        async for kind, value in _stream_assistant_turn(**_turn_kwargs(turn)):
+            if kind == "delta":
+                yield "delta", {"text": value}
+            else:
+                result = value
+    except Exception as exc:  # pragma: no cover - se registra y responde fallback
+        logger.exception(
+            "webchat.assistant_stream_failed",
+            extra={"conversation_id": turn.metadata.conversation_id, "error": str(exc)},
+        )
+
+    if result is None:
+        response = schemas.MessageResponse(reply=DEFAULT_FALLBACK, metadata=turn.metadata)
+    else:
+        response = await _finalize_turn(turn, result)
+    _remember_response(turn.payload, response)
+    yield "done", response
+
+
+def _sse_event(event: str, data: Any) -> str:
+    if isinstance(data, schemas.MessageResponse):
+        data = data.model_dump(mode="json")
+    return _sse(event, data)
+
+
+async def stream_turn(turn: PreparedTurn) -> AsyncIterator[str]:
+    """Genera eventos SSE para un turno ya preparado.
+
+    Eventos: `metadata` (al inicio), `delta` (`{"text": ...}` por fragmento) y
+    `done` con el mismo cuerpo que `POST /webchat/messages`. Si el modelo falla se
+    envía `done` con la respuesta de respaldo, igual que en el endpoint bloqueante.
+    """
+    async for event, data in _turn_events(turn):
+        yield _sse_event(event, data)
+
+
+async def _drain(events: asyncio.Queue[str | None]) -> AsyncIterator[str]:
+    while (chunk := await events.get()) is not None:
+        yield chunk
+
+
+async def stream_message(
+    payload: schemas.MessageRequest,
+    *,
+    request: Request | None = None,
+) -> AsyncIterator[str]:
+    """Prepara el turno y devuelve sus eventos SSE, con la misma idempotencia que `handle_message`.
+
+    Con `client_message_id`, el turno corre dentro de `_IN_FLIGHT`: un reintento
+    (por stream o por `POST /messages`) que llega mientras sigue en curso espera
+    ese resultado y lo recibe con `replay_stream`, sin registrar el mensaje ni
+    llamar a OpenAI otra vez. El turno corre en su propia tarea y reenvía los
+    eventos por una cola, así que termina y queda guardado aunque el cliente
+    original se desconecte. Los errores de preparación (4xx/5xx) se elevan antes
+    de abrir el stream.
+    """
+    key = _idempotency_key(payload)
+    if key is None:
+        return stream_turn(await prepare_turn(payload, request=request))
+
+    cached = remembered_response(payload)
+    if cached is None and key in _IN_FLIGHT:
+        log_event(
+            logger,
+            "webchat.duplicate_message",
+            session_id=payload.session_id,
+            client_message_id=payload.client_message_id,
         )
+        response = await _IN_FLIGHT.run(key, lambda: _remembered_handle(payload, request))
+        cached = response.model_copy(deep=True)
+    if cached is not None:
+        return replay_stream(cached)
+
+    loop = asyncio.get_running_loop()
+    prepared: asyncio.Future[None] = loop.create_future()
+    events: asyncio.Queue[str | None] = asyncio.Queue()
+
+    async def run() -> schemas.MessageResponse:
+        try:
+            try:
+                turn = await prepare_turn(payload, request=request)
+            except BaseException as exc:
+                if not prepared.done():
+                    prepared.set_exception(exc)
+                raise
+            prepared.set_result(None)
+            response: schemas.MessageResponse | None = None
+            async for event, data in _turn_events(turn):
+                events.put_nowait(_sse_event(event, data))
+                if event == "done":
+                    response = data
+            if response is None:  # pragma: no cover - `_turn_events` siempre cierra con done
+                raise RuntimeError("El turno terminó sin respuesta")
+            return response
+        finally:
+            events.put_nowait(None)
+
+    _IN_FLIGHT.start(key, run)
+    await asyncio.shield(prepared)
+    return _drain(events)
+
+
+async def replay_stream(response: schemas.MessageResponse) -> AsyncIterator[str]:
+    """Reenvía como SSE una respuesta ya entregada (reintento de un stream completo)."""
+    yield _sse("metadata", response.metadata.model_dump(mode="json"))
+    if response.reply:
+        yield _sse("delta", {"text": response.reply})
+    yield _sse("done", response.model_dump(mode="json"))
+
+
+async def fetch_history(
+    session_id: str,
+    limit: int,
+    since: datetime | None = None,
+) -> schemas.HistoryResponse:
+    """Devuelve mensajes recientes asociados al session_id del widget.
+
+    Con `since` sólo se devuelven los mensajes posteriores (delta vacío si no hay).
+    """
+    try:
+        history = await storage.fetch_webchat_history(session_id, limit=limit, since=since)
     except storage.StorageError as exc:
         logger.exception(
-            "webchat.history_fetch_failed",
-            extra={"conversation_id": conversation.get("id"), "error": str(exc)},
+            "webchat.history_fetch_failed", extra={"session_id": session_id, "error": str(exc)}
         )
         raise HTTPException(
             status_code=500, detail="No fue posible recuperar el historial"
         ) from exc
 
+    if not history:
+        return schemas.HistoryResponse(conversation_id=None, messages=[], manual_mode=False)
+
+    rows = history["messages"]
     messages: list[schemas.HistoryMessage] = []
     for row in rows:
         raw_metadata = row.get("datos")
@@ -617,12 +916,30 @@ async def fetch_history(session_id: str, limit: int) -> schemas.HistoryResponse:
         )
 
     return schemas.HistoryResponse(
-        conversation_id=str(conversation["id"]),
+        conversation_id=str(history["conversation_id"]),
         messages=messages,
-        manual_mode=bool(conversation.get("manual_override")),
+        manual_mode=history["manual_override"],
+        cursor=messages[-1].created_at if messages else since,
     )
 
 
+def history_etag(history: schemas.HistoryResponse) -> str:
+    """ETag fuerte del cuerpo serializado del historial."""
+    body = history.model_dump_json(by_alias=True).encode()
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Evalúa `If-None-Match` (lista separada por comas, admite `*` y `W/`)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
 async def close_session(
     session_id: str,
     *,
@@ -638,30 +955,19 @@ async def close_session(
         )
         raise HTTPException(status_code=502, detail="No fue posible registrar el cierre") from exc
 
-    try:
-        await _register_webchat_visit(
-            session_id,
-            request=request,
-            metadata=metadata,
-        )
-    except Exception:  # pragma: no cover - best effort
-        logger.exception(
-            "webchat.visit_capture_failed",
-            extra={"session_id": session_id},
-        )
+    enqueue_visit(session_id, request=request, metadata=metadata)
 
 
-async def _run_assistant_turn(
+def _initial_request(
     *,
-    client: AsyncOpenAI,
     assistant: AssistantConfig,
     assistant_spec: AssistantSpec | None,
     context: WebchatContext,
     user_message: schemas.MessageRequest,
     openai_conversation_id: str | None,
     previous_response_id: str | None,
-) -> tuple[str | None, dict[str, Any], list[str], list[str], str | None]:
-    """Gestiona la interacción con OpenAI y la resolución de tool calls."""
+) -> dict[str, Any]:
+    """Arma los argumentos de `responses.create` para el mensaje del visitante."""
     metadata_payload = {
         "session_id": context.session_id,
         "conversation_id": context.conversation_id,
@@ -697,6 +1003,261 @@ async def _run_assistant_turn(
         request_kwargs["conversation"] = openai_conversation_id
     elif previous_response_id:
         request_kwargs["previous_response_id"] = previous_response_id
+    return request_kwargs
+
+
+def _follow_up_request(
+    follow_up_inputs: list[dict[str, Any]],
+    *,
+    assistant: AssistantConfig,
+    assistant_spec: AssistantSpec | None,
+    context: WebchatContext,
+    openai_conversation_id: str | None,
+    response_id: str | None,
+) -> dict[str, Any]:
+    """Arma la siguiente llamada con los resultados de las tool calls."""
+    request_kwargs: dict[str, Any] = {
+        "input": follow_up_inputs,
+        "store": True,
+    }
+    if openai_conversation_id:
+        request_kwargs["conversation"] = openai_conversation_id
+    elif response_id:
+        request_kwargs["previous_response_id"] = response_id
+    if assistant.is_prompt and assistant.prompt_id:
+        request_kwargs["prompt"] = _build_prompt_payload(assistant, context)
+        request_kwargs["text"] = {"format": {"type": "text"}}
+    elif assistant_spec:
+        request_kwargs["model"] = assistant_spec.model
+        if assistant_spec.instructions:
+            request_kwargs["instructions"] = assistant_spec.instructions
+        if assistant_spec.tools:
+            request_kwargs["tools"] = assistant_spec.tools
+    return request_kwargs
+
+
+def _output_text(output_items: list[dict[str, Any]]) -> str | None:
+    """Concatena el texto de los mensajes de salida (si ya existe)."""
+    text_fragments: list[str] = []
+    for item in output_items:
+        if item.get("type") != "message":
+            continue
+        for content in item.get("content") or []:
+            if content.get("type") == "output_text":
+                text = content.get("text")
+                if text:
+                    text_fragments.append(text)
+    if not text_fragments:
+        return None
+    return "\n".join(fragment.strip() for fragment in text_fragments if fragment)
+
+
+async def _resolve_tool_calls(
+    pending_calls: list[dict[str, Any]],
+    context: WebchatContext,
+    tools_called: list[str],
+    tool_call_ids: list[str],
+) -> list[dict[str, Any]]:
+    """Ejecuta las function calls pendientes y arma sus `function_call_output`.
+
+    Las llamadas corren en paralelo (hasta `webchat_tool_concurrency`); las salidas
+    conservan el orden en que el modelo las emitió y el fallo de una no afecta a las
+    demás: se le reporta al modelo como `{"status": "error"}`. Los cambios al
+    contacto y a la conversación se acumulan y se aplican en un solo PATCH por fila
+    al terminar la ronda (ver `_flush_tool_writes`).
+    """
+    semaphore = asyncio.Semaphore(max(settings.webchat_tool_concurrency, 1))
+    staged = [ToolWrites() for _ in pending_calls]
+
+    async def run(call: dict[str, Any], writes: ToolWrites) -> dict[str, Any]:
+        name = call.get("name")
+        async with semaphore:
+            try:
+                return await _execute_function_call(
+                    name, call.get("arguments"), context, writes=writes
+                )
+            except Exception as exc:  # pragma: no cover - se reporta al modelo
+                writes.contact.clear()
+                writes.conversation.clear()
+                writes.insights = None
+                logger.exception(
+                    "webchat.tool_execution_failed",
+                    extra={
+                        "conversation_id": context.conversation_id,
+                        "tool": name,
+                        "error": str(exc),
+                    },
+                )
+                return {"status": "error", "message": str(exc)}
+
+    results = list(
+        await asyncio.gather(*(run(call, writes) for call, writes in zip(pending_calls, staged)))
+    )
+    await _flush_tool_writes(context, staged, results)
+
+    follow_up_inputs: list[dict[str, Any]] = []
+    for call, result in zip(pending_calls, results):
+        name = call.get("name")
+        call_id = call.get("call_id")
+        follow_up_inputs.append(
+            {
+                "type": "function_call_output",
+                "call_id": call_id,
+                "output": json.dumps(result, ensure_ascii=False),
+            }
+        )
+        if name:
+            tools_called.append(str(name))
+        if call_id:
+            tool_call_ids.append(str(call_id))
+    return follow_up_inputs
+
+
+async def _flush_tool_writes(
+    context: WebchatContext,
+    staged: list[ToolWrites],
+    results: list[dict[str, Any]],
+) -> None:
+    """Fusiona los PATCH de la ronda (en orden de emisión) y los aplica una vez por fila.
+
+    Si un PATCH falla, las tools que aportaron a esa fila reportan el error al modelo.
+    Los insights se escriben al final y sólo para las tools cuyos PATCH se aplicaron.
+    """
+    targets = {
+        "contact": (storage.update_contact, context.contact_id),
+        "conversation": (storage.update_conversation, context.conversation_id),
+    }
+
+    async def apply(kind: str) -> None:
+        patch: dict[str, Any] = {}
+        owners: list[int] = []
+        for index, writes in enumerate(staged):
+            changes = getattr(writes, kind)
+            if changes:
+                patch.update(changes)
+                owners.append(index)
+        if not patch:
+            return
+        update, row_id = targets[kind]
+        try:
+            await update(row_id, patch)
+        except storage.StorageError as exc:
+            logger.exception(
+                "webchat.tool_flush_failed",
+                extra={
+                    "conversation_id": context.conversation_id,
+                    "target": kind,
+                    "error": str(exc),
+                },
+            )
+            for index in owners:
+                results[index] = {"status": "error", "message": str(exc)}
+
+    if not any(staged):
+        return
+    await asyncio.gather(*(apply(kind) for kind in targets))
+    for index, writes in enumerate(staged):
+        if not writes.insights or results[index].get("status") == "error":
+            continue
+        try:
+            await storage.upsert_conversation_insights(
+                conversation_id=context.conversation_id, **writes.insights
+            )
+        except storage.StorageError as exc:
+            logger.exception(
+                "webchat.tool_flush_failed",
+                extra={
+                    "conversation_id": context.conversation_id,
+                    "target": "insights",
+                    "error": str(exc),
+                },
+            )
+            results[index] = {"status": "error", "message": str(exc)}
+
+
+async def _run_assistant_turn(
+    *,
+    client: AsyncOpenAI,
+    assistant: AssistantConfig,
+    assistant_spec: AssistantSpec | None,
+    context: WebchatContext,
+    user_message: schemas.MessageRequest,
+    openai_conversation_id: str | None,
+    previous_response_id: str | None,
+) -> TurnResult:
+    """Gestiona la interacción con OpenAI y la resolución de tool calls."""
+    result: TurnResult | None = None
+    async for kind, value in _assistant_turn_events(
+        client=client,
+        assistant=assistant,
+        assistant_spec=assistant_spec,
+        context=context,
+        user_message=user_message,
+        openai_conversation_id=openai_conversation_id,
+        previous_response_id=previous_response_id,
+        stream=False,
+    ):
+        if kind == "done":
+            result = value
+    assert result is not None
+    return result
+
+
+async def _stream_assistant_turn(**kwargs: Any) -> AsyncIterator[tuple[str, Any]]:
+    """Igual que `_run_assistant_turn` pero emite `("delta", texto)` mientras se genera.
+
+    Termina con `("done", TurnResult)`.
+    """
+    async for event in _assistant_turn_events(**kwargs, stream=True):
+        yield event
+
+
+async def _create_response(
+    client: AsyncOpenAI, request_kwargs: dict[str, Any], *, stream: bool
+) -> AsyncIterator[tuple[str, Any]]:
+    """Llama a Responses; con `stream` reenvía deltas y entrega la respuesta final."""
+    if not stream:
+        response = await client.responses.create(**request_kwargs)
+        yield "response", response.model_dump()
+        return
+
+    events = await client.responses.create(**request_kwargs, stream=True)
+    final: dict[str, Any] | None = None
+    async for event in events:
+        event_type = getattr(event, "type", None)
+        if event_type == "response.output_text.delta":
+            delta = getattr(event, "delta", None)
+            if delta:
+                yield "delta", delta
+        elif event_type == "response.completed":
+            final = event.response.model_dump()
+        elif event_type in {"response.failed", "response.incomplete", "error"}:
+            raise RuntimeError(f"Stream de OpenAI terminó con {event_type}")
+    if final is None:
+        raise RuntimeError("Stream de OpenAI sin evento response.completed")
+    yield "response", final
+
+
+async def _assistant_turn_events(
+    *,
+    client: AsyncOpenAI,
+    assistant: AssistantConfig,
+    assistant_spec: AssistantSpec | None,
+    context: WebchatContext,
+    user_message: schemas.MessageRequest,
+    openai_conversation_id: str | None,
+    previous_response_id: str | None,
+    stream: bool,
+) -> AsyncIterator[tuple[str, Any]]:
+    """Bucle de turno: llama al modelo, resuelve tool calls y repite hasta obtener texto."""
+    request_kwargs = _initial_request(
+        assistant=assistant,
+        assistant_spec=assistant_spec,
+        context=context,
+        user_message=user_message,
+        openai_conversation_id=openai_conversation_id,
+        previous_response_id=previous_response_id,
+    )
 
     tools_called: list[str] = []
     tool_call_ids: list[str] = []
@@ -706,8 +1267,12 @@ async def _run_assistant_turn(
     latest_response_id = previous_response_id
 
     while True:
-        response = await client.responses.create(**request_kwargs)
-        response_dict = response.model_dump()
+        response_dict: dict[str, Any] = {}
+        async for kind, value in _create_response(client, request_kwargs, stream=stream):
+            if kind == "delta":
+                yield kind, value
+            else:
+                response_dict = value
         final_response = response_dict
         latest_response_id = response_dict.get("id") or latest_response_id
         conversation_obj = response_dict.get("conversation") or {}
@@ -716,76 +1281,34 @@ async def _run_assistant_turn(
         output_items = response_dict.get("output") or []
         pending_calls = [item for item in output_items if item.get("type") == "function_call"]
 
-        # Extrae texto de mensajes (si ya existe).
-        text_fragments: list[str] = []
-        for item in output_items:
-            if item.get("type") != "message":
-                continue
-            for content in item.get("content") or []:
-                if content.get("type") == "output_text":
-                    text = content.get("text")
-                    if text:
-                        text_fragments.append(text)
-        if text_fragments:
-            assistant_reply = "\n".join(fragment.strip() for fragment in text_fragments if fragment)
+        text = _output_text(output_items)
+        if text:
+            assistant_reply = text
 
         if not pending_calls:
             break
 
-        follow_up_inputs: list[dict[str, Any]] = []
-        for call in pending_calls:
-            name = call.get("name")
-            call_id = call.get("call_id")
-            arguments = call.get("arguments")
-            try:
-                result = await _execute_function_call(name, arguments, context)
-            except Exception as exc:  # pragma: no cover - se reporta al modelo
-                logger.exception(
-                    "webchat.tool_execution_failed",
-                    extra={
-                        "conversation_id": context.conversation_id,
-                        "tool": name,
-                        "error": str(exc),
-                    },
-                )
-                result = {"status": "error", "message": str(exc)}
-
-            payload = {
-                "type": "function_call_output",
-                "call_id": call_id,
-                "output": json.dumps(result, ensure_ascii=False),
-            }
-            follow_up_inputs.append(payload)
-
-            if name:
-                tools_called.append(str(name))
-            if call_id:
-                tool_call_ids.append(str(call_id))
+        follow_up_inputs = await _resolve_tool_calls(
+            pending_calls, context, tools_called, tool_call_ids
+        )
+        request_kwargs = _follow_up_request(
+            follow_up_inputs,
+            assistant=assistant,
+            assistant_spec=assistant_spec,
+            context=context,
+            openai_conversation_id=latest_openai_conversation,
+            response_id=latest_response_id,
+        )
 
-        request_kwargs = {
-            "input": follow_up_inputs,
-            "store": True,
-        }
-        if latest_openai_conversation:
-            request_kwargs["conversation"] = latest_openai_conversation
-        elif latest_response_id:
-            request_kwargs["previous_response_id"] = latest_response_id
-        if assistant.is_prompt and assistant.prompt_id:
-            request_kwargs["prompt"] = _build_prompt_payload(assistant, context)
-            request_kwargs["text"] = {"format": {"type": "text"}}
-        elif assistant_spec:
-            request_kwargs["model"] = assistant_spec.model
-            if assistant_spec.instructions:
-                request_kwargs["instructions"] = assistant_spec.instructions
-            if assistant_spec.tools:
-                request_kwargs["tools"] = assistant_spec.tools
-
-    return (
-        assistant_reply,
-        final_response or {},
-        tools_called,
-        tool_call_ids,
-        latest_openai_conversation,
+    yield (
+        "done",
+        (
+            assistant_reply,
+            final_response or {},
+            tools_called,
+            tool_call_ids,
+            latest_openai_conversation,
+        ),
     )
 
 
@@ -793,8 +1316,34 @@ async def _execute_function_call(
     name: str | None,
     arguments_payload: Any,
     context: WebchatContext,
+    *,
+    writes: ToolWrites | None = None,
+) -> dict[str, Any]:
+    """Ejecuta la acción solicitada por el asistente.
+
+    Con `writes`, los cambios a `contactos`/`conversaciones` y los insights se acumulan
+    ahí en lugar de aplicarse de inmediato; quien llama es responsable de persistirlos.
+    """
+    staged = writes if writes is not None else ToolWrites()
+    result = await _apply_function_call(name, arguments_payload, context, staged)
+    if writes is None:
+        if staged.contact:
+            await storage.update_contact(context.contact_id, staged.contact)
+        if staged.conversation:
+            await storage.update_conversation(context.conversation_id, staged.conversation)
+        if staged.insights:
+            await storage.upsert_conversation_insights(
+                conversation_id=context.conversation_id, **staged.insights
+            )
+    return result
+
+
+async def _apply_function_call(
+    name: str | None,
+    arguments_payload: Any,
+    context: WebchatContext,
+    staged: ToolWrites,
 ) -> dict[str, Any]:
-    """Ejecuta la acción solicitada por el asistente."""
     if not name:
         raise ValueError("Nombre de función ausente en tool call")
 
@@ -820,28 +1369,28 @@ async def _execute_function_call(
         full_name = (arguments.get("full_name") or "").strip()
         if not full_name:
             raise ValueError("full_name requerido para set_full_name")
-        await storage.update_contact(context.contact_id, {"nombre_completo": full_name})
+        staged.contact.update({"nombre_completo": full_name})
         return {"status": "ok", "full_name": full_name}
 
     if name == "set_email":
         email = (arguments.get("email") or "").strip()
         if not email:
             raise ValueError("email requerido para set_email")
-        await storage.update_contact(context.contact_id, {"correo": email.lower()})
+        staged.contact.update({"correo": email.lower()})
         return {"status": "ok", "email": email.lower()}
 
     if name == "set_phone_number":
         phone_number = (arguments.get("phone_number") or "").strip()
         if not phone_number:
             raise ValueError("phone_number requerido para set_phone_number")
-        await storage.update_contact(context.contact_id, {"telefono_e164": phone_number})
+        staged.contact.update({"telefono_e164": phone_number})
         return {"status": "ok", "phone_number": phone_number}
 
     if name == "set_company_name":
         company_name = (arguments.get("company_name") or "").strip()
         if not company_name:
             raise ValueError("company_name requerido para set_company_name")
-        await storage.update_contact(context.contact_id, {"company_name": company_name})
+        staged.contact.update({"company_name": company_name})
         return {"status": "ok", "company_name": company_name}
 
     if name == "close_lead":
@@ -850,17 +1399,13 @@ async def _execute_function_call(
         siguiente_accion = (arguments.get("siguiente_accion") or "").strip() or None
         if not notes or not necesidad:
             raise ValueError("notes y necesidad_proposito son requeridos para close_lead")
-        await storage.update_contact(
-            context.contact_id,
-            {"notes": notes, "necesidad_proposito": necesidad},
-        )
-        await storage.update_conversation(context.conversation_id, {"estado": "pendiente"})
-        await storage.upsert_conversation_insights(
-            conversation_id=context.conversation_id,
-            resumen=notes,
-            intencion=necesidad,
-            siguiente_accion=siguiente_accion,
-        )
+        staged.contact.update({"notes": notes, "necesidad_proposito": necesidad})
+        staged.conversation["estado"] = "pendiente"
+        staged.insights = {
+            "resumen": notes,
+            "intencion": necesidad,
+            "siguiente_accion": siguiente_accion,
+        }
         return {
             "status": "ok",
             "notes": notes,
@@ -876,37 +1421,8 @@ async def _execute_function_call(
 
 
 async def _resolve_assistant_spec(client: AsyncOpenAI, assistant_id: str) -> AssistantSpec:
-    """Recupera la configuración completa del asistente y la cachea en memoria."""
-    cached = _ASSISTANT_CACHE.get(assistant_id)
-    if cached:
-        return cached
-    record = await client.beta.assistants.retrieve(assistant_id=assistant_id)
-    dump = record.model_dump()
-    tools_dump = dump.get("tools") or []
-    tools: list[dict[str, Any]] = []
-    for tool in tools_dump:
-        if isinstance(tool, dict):
-            tools.append(tool)
-        else:  # pragma: no cover
-            try:
-                tools.append(tool.model_dump(exclude_none=True))
-            except AttributeError:
-                tools.append(dict(tool))
-    spec = AssistantSpec(
-        model=_extract_model(dump, assistant_id),
-        instructions=dump.get("instructions"),
-        tools=tools,
-    )
-    _ASSISTANT_CACHE[assistant_id] = spec
-    return spec
-
-
-def _extract_model(dump: dict[str, Any], assistant_id: str) -> str:
-    """Obtiene el modelo declarado en el asistente o lanza error descriptivo."""
-    model = dump.get("model")
-    if not model:
-        raise ValueError(f"El asistente {assistant_id} no tiene modelo configurado")
-    return str(model)
+    """Recupera la configuración del asistente desde la caché precargada."""
+    return await assistant_specs.get_spec(client, assistant_id)
 
 
 def _build_prompt_payload(assistant: AssistantConfig, context: WebchatContext) -> dict[str, Any]:
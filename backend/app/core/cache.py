@@ -0,0 +1,240 @@
+"""Caché en memoria con expiración por entrada y desalojo LRU, más single-flight.
+
+Pensada para catálogos y resultados pequeños por proceso; no se comparte entre
+workers, por lo que los TTL deben ser cortos cuando el dato puede cambiar desde
+otra instancia. `StaleWhileRevalidateCache` añade una ventana en la que el valor
+vencido se sigue sirviendo mientras se recalcula en segundo plano.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """Diccionario acotado con TTL por entrada.
+
+    - `ttl` es el tiempo de vida por defecto (segundos); `set(..., ttl=)` lo ajusta
+      por entrada. Un TTL <= 0 desactiva el almacenamiento.
+    - Con `maxsize`, al superar el límite se desaloja la entrada usada hace más tiempo.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: float,
+        maxsize: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, *, ttl: float | None = None) -> None:
+        effective = self.ttl if ttl is None else ttl
+        if effective <= 0:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (self._clock() + effective, value)
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SingleFlight(Generic[K, V]):
+    """Colapsa llamadas concurrentes con la misma llave en una sola ejecución.
+
+    La carga corre en su propia tarea: si el primer solicitante se cancela, los
+    demás siguen esperando el mismo resultado (o la misma excepción).
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[K, asyncio.Future[V]] = {}
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._calls
+
+    def start(self, key: K, fn: Callable[[], Awaitable[V]]) -> asyncio.Future[V]:
+        """Registra la carga (o se une a la existente) sin esperarla.
+
+        El registro es síncrono: entre `key in flight` y `start` no hay cambio de
+        tarea, así que quien hace la verificación sabe si es el líder.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        else:
+            self.shared += 1
+        return task
+
+    async def run(self, key: K, fn: Callable[[], Awaitable[V]]) -> V:
+        return await asyncio.shield(self.start(key, fn))
+
+    def _done(self, key: K, task: asyncio.Future[V]) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # marca la excepción como recuperada
+
+
+class StaleWhileRevalidateCache(Generic[K, V]):
+    """Caché de resultados asíncronos con stale-while-revalidate.
+
+    - Durante `ttl` segundos la entrada es fresca y se sirve sin más.
+    - Durante los `stale_ttl` segundos siguientes se sirve el valor vencido y se
+      lanza una sola recarga en segundo plano por llave; si falla, el valor vencido
+      se conserva hasta agotar la ventana.
+    - Fuera de esa ventana es un fallo: el solicitante espera la carga, y los fallos
+      concurrentes de la misma llave comparten una sola ejecución.
+
+    Las excepciones de la carga no se cachean.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: float,
+        stale_ttl: float,
+        maxsize: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, 0.0)
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data: OrderedDict[K, tuple[float, float, V]] = OrderedDict()
+        self._flight: SingleFlight[K, V] = SingleFlight()
+        self._refreshes: set[asyncio.Future[V]] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refresh_failures = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def get_or_load(self, key: K, load: Callable[[], Awaitable[V]]) -> V:
+        entry = self._data.get(key)
+        if entry is not None:
+            fresh_until, stale_until, value = entry
+            now = self._clock()
+            if now < fresh_until:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            if now < stale_until:
+                self._data.move_to_end(key)
+                self.stale_hits += 1
+                self._revalidate(key, load)
+                return value
+            del self._data[key]
+        self.misses += 1
+        return await self._flight.run(key, lambda: self._load(key, load))
+
+    async def _load(self, key: K, load: Callable[[], Awaitable[V]]) -> V:
+        value = await load()
+        self._store(key, value)
+        return value
+
+    def _store(self, key: K, value: V) -> None:
+        if self.ttl <= 0:
+            self._data.pop(key, None)
+            return
+        fresh_until = self._clock() + self.ttl
+        self._data[key] = (fresh_until, fresh_until + self.stale_ttl, value)
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _revalidate(self, key: K, load: Callable[[], Awaitable[V]]) -> None:
+        if key in self._flight:
+            return
+        refresh = asyncio.ensure_future(self._flight.run(key, lambda: self._load(key, load)))
+        self._refreshes.add(refresh)
+        refresh.add_done_callback(self._refreshed)
+
+    def _refreshed(self, refresh: asyncio.Future[V]) -> None:
+        self._refreshes.discard(refresh)
+        if refresh.cancelled():
+            return
+        exc = refresh.exception()
+        if exc is not None:
+            self.refresh_failures += 1
+            logger.warning("cache.refresh_failed", extra={"error": str(exc)})
+
+    def pop(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, float]:
+        served = self.hits + self.stale_hits
+        lookups = served + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "refreshing": len(self._refreshes),
+            "refresh_failures": self.refresh_failures,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+        }
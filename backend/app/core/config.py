@@ -1,5 +1,7 @@
 """Configuración central basada en variables de entorno."""
 
+from typing import Literal
+
 from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -37,6 +39,10 @@ class Settings(BaseSettings):
     openai_assistant_id: str | None = None
     openai_prompt_version: str | None = None
     openai_project_id: str | None = None
+    openai_assistant_spec_ttl_seconds: float = Field(
+        default=600.0,
+        description="Segundos tras los cuales se refresca en segundo plano la spec del asistente.",
+    )
     twilio_account_sid: str | None = None
     twilio_auth_token: str | None = None
     supabase_url: str | None = None
@@ -48,13 +54,148 @@ class Settings(BaseSettings):
     )
     supabase_jwt_secret: str | None = None
     supabase_legacy_jwt_secret: str | None = None
+    jwt_claims_cache_size: int = Field(
+        default=2048,
+        description="Cantidad máxima de JWT verificados cuyos claims se mantienen en memoria.",
+    )
+    jwt_leeway_seconds: float = Field(
+        default=0.0,
+        description="Tolerancia (segundos) al validar `exp`/`nbf` por desfase de relojes.",
+    )
+    supabase_http2: bool = Field(
+        default=False,
+        description="Habilita HTTP/2 hacia Supabase (opcional; requiere instalar `httpx[http2]`).",
+    )
+    supabase_pool_max_connections: int = Field(
+        default=50,
+        description="Máximo de conexiones simultáneas en el pool compartido de Supabase.",
+    )
+    supabase_pool_max_keepalive: int = Field(
+        default=20,
+        description="Conexiones ociosas que se mantienen abiertas para reutilizarse.",
+    )
+    supabase_keepalive_expiry_seconds: float = Field(
+        default=30.0,
+        description="Segundos que una conexión ociosa permanece en el pool antes de cerrarse.",
+    )
+    supabase_timeout_seconds: float = Field(
+        default=10.0,
+        description="Timeout por defecto (lectura/escritura) para operaciones contra Supabase.",
+    )
+    supabase_connect_timeout_seconds: float = Field(
+        default=5.0,
+        description="Timeout para establecer conexiones nuevas hacia Supabase.",
+    )
+    supabase_read_retries: int = Field(
+        default=1,
+        description="Reintentos ante fallas de red para lecturas idempotentes (GET) a PostgREST.",
+    )
+    panel_catalog_cache_ttl_seconds: float = Field(
+        default=60.0,
+        description="TTL del caché en proceso para catálogos del panel (roles, departamentos, puestos).",
+    )
+    panel_roles_cache_ttl_seconds: float = Field(
+        default=120.0,
+        description="TTL máximo del caché de roles por usuario (nunca excede el `exp` del JWT).",
+    )
+    panel_kpi_cache_ttl_seconds: float = Field(
+        default=60.0,
+        description="Segundos que una respuesta de dashboard/KPIs se considera fresca.",
+    )
+    panel_kpi_cache_stale_seconds: float = Field(
+        default=300.0,
+        description=(
+            "Ventana adicional en la que se sirve la respuesta vencida mientras se "
+            "recalcula en segundo plano."
+        ),
+    )
+    panel_kpi_cache_granularity_seconds: int = Field(
+        default=300,
+        description="Resolución a la que se redondea el rango de fechas para compartir entradas.",
+    )
+    panel_kpi_cache_max_entries: int = Field(
+        default=1000,
+        description="Respuestas de dashboard/KPIs que se mantienen en memoria.",
+    )
+    kpi_rollup_interval_seconds: float = Field(
+        default=600.0,
+        description=(
+            "Intervalo con el que el backend consolida `kpi_respuestas_pendientes` "
+            "cuando pg_cron no tiene el job programado (0 lo desactiva)."
+        ),
+    )
+    geo_cache_max_age_seconds: int = Field(
+        default=86400,
+        description=(
+            "`max-age` de los catálogos GeoJSON del mapa; el `ETag` permite revalidar "
+            "sin volver a descargarlos."
+        ),
+    )
+    geolocation_provider: Literal["http", "local"] = Field(
+        default="http",
+        description=(
+            "Origen de la geolocalización por IP: `http` consulta el proveedor externo; "
+            "`local` usa la base de rangos en `geolocation_db_path` sin salir a red."
+        ),
+    )
+    geolocation_db_path: str | None = Field(
+        default=None,
+        description="CSV (o .csv.gz) de rangos IP; por defecto app/data/geoip/ip_ranges.csv.",
+    )
     geolocation_api_url: str | None = None
     geolocation_api_token: str | None = None
     geolocation_cache_ttl_seconds: int = Field(
         default=4 * 60 * 60,
         description="Tiempo de vida (en segundos) para reutilizar resultados de geolocalización por IP.",
     )
+    geolocation_cache_max_entries: int = Field(
+        default=10_000,
+        description="Máximo de IPs en el caché de geolocalización (desalojo LRU).",
+    )
+    background_workers: int = Field(
+        default=4,
+        description="Workers concurrentes de la cola en segundo plano (visitas/enriquecimiento).",
+    )
+    background_queue_max: int = Field(
+        default=1000,
+        description="Trabajos pendientes máximos; al llenarse se descartan los nuevos.",
+    )
+    background_max_attempts: int = Field(
+        default=3,
+        description="Intentos por trabajo antes de darlo por fallido (backoff exponencial).",
+    )
+    background_drain_timeout_seconds: float = Field(
+        default=10.0,
+        description="Tiempo máximo para terminar trabajos pendientes al apagar la aplicación.",
+    )
     log_file_path: str = "/home/devuser/talia/logs/api.log"
+    inbox_change_feed: Literal["none", "polling"] = Field(
+        default="none",
+        description="Fuente externa de cambios para el push del inbox (además de escrituras propias).",
+    )
+    inbox_poll_interval_seconds: float = Field(
+        default=2.0,
+        description="Intervalo de consulta del change feed `polling` del inbox.",
+    )
+    inbox_subscriber_queue_size: int = Field(
+        default=100,
+        description="Eventos pendientes por agente conectado antes de forzar un `resync`.",
+    )
+    inbox_heartbeat_seconds: float = Field(
+        default=15.0,
+        description="Intervalo de comentarios keep-alive en el stream del inbox.",
+    )
+    inbox_stream_ticket_ttl_seconds: float = Field(
+        default=30.0,
+        description="Vigencia de los tickets de un solo uso para abrir el stream del inbox.",
+    )
+    inbox_visibility_cache_ttl_seconds: float = Field(
+        default=60.0,
+        description=(
+            "Segundos que un stream del inbox recuerda si el agente puede ver una "
+            "conversación (acota cuánto tarda en reflejarse una reasignación)."
+        ),
+    )
     webchat_inactivity_hours: int | None = Field(
         default=None,
         description="Número de horas para reiniciar conversación webchat; usa default SQL cuando no se define.",
@@ -63,6 +204,18 @@ class Settings(BaseSettings):
         default=True,
         description="Controla si el widget reutiliza session_id entre recargas.",
     )
+    webchat_idempotency_ttl_seconds: float = Field(
+        default=600.0,
+        description="Segundos que se conserva la respuesta de un client_message_id para reintentos.",
+    )
+    webchat_idempotency_max_entries: int = Field(
+        default=10_000,
+        description="Respuestas webchat conservadas para deduplicar reintentos del widget.",
+    )
+    webchat_tool_concurrency: int = Field(
+        default=4,
+        description="Máximo de tool calls de un mismo turno que se ejecutan en paralelo.",
+    )
     model_config = SettingsConfigDict(env_file=".env", env_prefix="TALIA_", extra="allow")
 
 
@@ -1,7 +1,18 @@
-"""Helpers de validación común para webhooks y firmas."""
+"""Helpers de validación común para webhooks, firmas y JWT."""
 
+from __future__ import annotations
+
+import base64
+import binascii
 import hmac
+import json
+import time
+from collections.abc import Callable, Sequence
 from hashlib import sha256
+from typing import Any
+
+from app.core.cache import TTLCache
+from app.core.config import settings
 
 
 class SignatureError(Exception):
@@ -37,3 +48,125 @@ def mask_secret(value: str | None) -> str | None:
     if len(value) <= 4:
         return "***"
     return f"{value[:2]}***{value[-2:]}"
+
+
+class TokenError(Exception):
+    """JWT malformado, con firma inválida o fuera de su ventana de validez."""
+
+
+def _b64url_decode(segment: str) -> bytes:
+    rem = len(segment) % 4
+    if rem:
+        segment += "=" * (4 - rem)
+    return base64.urlsafe_b64decode(segment.encode())
+
+
+class JWTVerifier:
+    """Verificador HS256 para los JWT de Supabase con caché de claims.
+
+    Las llaves HMAC se preparan una sola vez. Los claims ya verificados se guardan
+    en un LRU indexado por la firma (y se confirma el token completo en cada hit),
+    de modo que las peticiones paralelas de una misma sesión no repiten el HMAC ni
+    la decodificación. `exp`/`nbf` se revisan en cada llamada.
+
+    Sin secretos configurados sólo decodifica (modo desarrollo), igual que antes.
+    """
+
+    def __init__(
+        self,
+        secrets: Sequence[str],
+        *,
+        maxsize: int = 2048,
+        leeway: float = 0.0,
+        default_ttl: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.secrets = tuple(s for s in secrets if s)
+        self._keys = tuple(s.encode() for s in self.secrets)
+        self.leeway = leeway
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._cache: TTLCache[str, tuple[str, dict[str, Any]]] = TTLCache(
+            ttl=default_ttl, maxsize=maxsize
+        )
+
+    @property
+    def cache(self) -> TTLCache[str, tuple[str, dict[str, Any]]]:
+        return self._cache
+
+    def verify(self, token: str) -> dict[str, Any]:
+        """Retorna los claims del token o eleva `TokenError`."""
+        try:
+            header_b64, payload_b64, signature_b64 = token.split(".")
+        except ValueError as exc:
+            raise TokenError("malformed") from exc
+
+        cached = self._cache.get(signature_b64)
+        if cached is not None and cached[0] == token:
+            claims = cached[1]
+        else:
+            claims = self._decode(header_b64, payload_b64, signature_b64)
+            now = self._clock()
+            exp = claims.get("exp")
+            ttl = self.default_ttl
+            if isinstance(exp, (int, float)):
+                ttl = min(ttl, exp + self.leeway - now)
+            self._cache.set(signature_b64, (token, claims), ttl=ttl)
+        self._check_window(claims)
+        return claims
+
+    def _decode(self, header_b64: str, payload_b64: str, signature_b64: str) -> dict[str, Any]:
+        try:
+            if self._keys:
+                header = json.loads(_b64url_decode(header_b64))
+                if not isinstance(header, dict) or header.get("alg") != "HS256":
+                    raise TokenError("unsupported_alg")
+                signing_input = f"{header_b64}.{payload_b64}".encode()
+                provided = _b64url_decode(signature_b64)
+                if not any(
+                    hmac.compare_digest(hmac.new(key, signing_input, sha256).digest(), provided)
+                    for key in self._keys
+                ):
+                    raise TokenError("bad_signature")
+            claims = json.loads(_b64url_decode(payload_b64))
+        except (ValueError, binascii.Error) as exc:
+            raise TokenError("malformed") from exc
+        if not isinstance(claims, dict):
+            raise TokenError("malformed")
+        return claims
+
+    def _check_window(self, claims: dict[str, Any]) -> None:
+        now = self._clock()
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)) and now >= exp + self.leeway:
+            raise TokenError("expired")
+        nbf = claims.get("nbf")
+        if isinstance(nbf, (int, float)) and now < nbf - self.leeway:
+            raise TokenError("not_yet_valid")
+
+
+_VERIFIER: JWTVerifier | None = None
+
+
+def get_jwt_verifier() -> JWTVerifier:
+    """Verificador compartido; se reconstruye si cambian los secretos configurados."""
+    global _VERIFIER
+    secrets = tuple(
+        s for s in (settings.supabase_jwt_secret, settings.supabase_legacy_jwt_secret) if s
+    )
+    if _VERIFIER is None or _VERIFIER.secrets != secrets:
+        _VERIFIER = JWTVerifier(
+            secrets,
+            maxsize=settings.jwt_claims_cache_size,
+            leeway=settings.jwt_leeway_seconds,
+        )
+    return _VERIFIER
+
+
+def parse_bearer(authorization: str | None) -> str | None:
+    """Extrae el token de una cabecera `Authorization: Bearer ...`."""
+    if not authorization:
+        return None
+    if authorization.lower().startswith("bearer "):
+        return authorization.split(" ", 1)[1].strip() or None
+    return None
@@ -1,6 +1,8 @@
 """Punto de entrada principal para la aplicación FastAPI."""
 
 import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
@@ -8,13 +10,38 @@ from fastapi.middleware.cors import CORSMiddleware
 from starlette.staticfiles import StaticFiles
 
 from app.api.routes.health import router as health_router
+from app.api.routes.metrics import router as metrics_router
 from app.api.routes.panel import router as panel_router
+from app.assistants import specs as assistant_specs
 from app.channels.voice.router import router as voice_router
 from app.channels.webchat.router import router as webchat_router
 from app.channels.whatsapp.router import router as whatsapp_router
 from app.core.config import settings
 from app.core.logging import configure_logging, get_logger, resolve_log_level
 from app.core.middleware import RequestLoggingMiddleware
+from app.services import background, geo_assets, geolocation, inbox_events, kpi_rollups, supabase
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """Abre recursos compartidos al arrancar y los libera al apagar."""
+    await supabase.startup()
+    await geolocation.startup()
+    await background.startup()
+    await assistant_specs.startup()
+    await inbox_events.startup()
+    await geo_assets.startup()
+    await kpi_rollups.startup()
+    try:
+        yield
+    finally:
+        await kpi_rollups.shutdown()
+        await geo_assets.shutdown()
+        await inbox_events.shutdown()
+        await assistant_specs.shutdown()
+        await background.shutdown()
+        await geolocation.shutdown()
+        await supabase.shutdown()
 
 
 def create_app() -> FastAPI:
@@ -36,7 +63,7 @@ def create_app() -> FastAPI:
         per_logger_files=per_logger_files,
     )
 
-    app = FastAPI(title="TalIA API", version="0.1.0", root_path="/api")
+    app = FastAPI(title="TalIA API", version="0.1.0", root_path="/api", lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -49,6 +76,7 @@ def create_app() -> FastAPI:
     app.add_middleware(RequestLoggingMiddleware)
 
     app.include_router(health_router)
+    app.include_router(metrics_router)
     app.include_router(panel_router)
     app.include_router(webchat_router)
     app.include_router(whatsapp_router)
@@ -5,6 +5,7 @@ const leadsState = {
   total: 0,
   limit: 50,
   hasMore: false,
+  nextCursor: null,
   loading: false,
   view: 'table',
   filters: {
@@ -510,8 +511,13 @@ async function fetchLeads({ reset = false } = {}) {
 
   const params = new URLSearchParams();
   params.set('limit', String(leadsState.limit));
-  const offset = reset ? 0 : leadsState.items.length;
-  params.set('offset', String(offset));
+  // Primera página: total estimado; las siguientes avanzan por cursor sin recontar.
+  if (reset || !leadsState.nextCursor) {
+    params.set('count', 'estimated');
+  } else {
+    params.set('cursor', leadsState.nextCursor);
+    params.set('count', 'none');
+  }
 
   const { search, canal, etapa, vendedor } = leadsState.filters;
   if (search) params.set('q', search);
@@ -534,8 +540,13 @@ async function fetchLeads({ reset = false } = {}) {
       leadsState.items = leadsState.items.concat(normalized);
       updateLookups(normalized, false);
     }
-    leadsState.total = typeof data.total === 'number' ? data.total : leadsState.items.length;
-    leadsState.hasMore = Boolean(data.has_more) || leadsState.items.length < leadsState.total;
+    if (typeof data.total === 'number') {
+      leadsState.total = data.total;
+    } else if (reset) {
+      leadsState.total = leadsState.items.length;
+    }
+    leadsState.nextCursor = data.next_cursor || null;
+    leadsState.hasMore = Boolean(data.has_more);
     renderAll();
   } catch (error) {
     console.error(error);
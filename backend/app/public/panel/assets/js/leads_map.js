@@ -367,7 +367,7 @@ async function getStatesData(channelParam) {
               `/api/kpis/leads/estados?canales=${encodeURIComponent(channelParam)}`,
             );
       const [geo, metrics] = await Promise.all([
-        fetchJSON('/api/kpis/leads/geo/estados'),
+        fetchJSON('/api/kpis/leads/geo/estados?detalle=bajo'),
         metricsPromise,
       ]);
       if (!geo.ok || !geo.json?.geojson) {
@@ -400,7 +400,7 @@ async function getMunicipalityData(channelParam, stateCode) {
               )}`,
             );
       const [geo, metrics] = await Promise.all([
-        fetchJSON(`/api/kpis/leads/geo/municipios/${code}`),
+        fetchJSON(`/api/kpis/leads/geo/municipios/${code}?detalle=medio`),
         metricsPromise,
       ]);
       if (!geo.ok || !geo.json?.geojson) {
@@ -425,7 +425,7 @@ async function getWorldResources() {
   if (!state.worldCache.has(cacheKey)) {
     const promise = (async () => {
       const [geo, metrics] = await Promise.all([
-        fetchJSON('/api/kpis/leads/geo/paises'),
+        fetchJSON('/api/kpis/leads/geo/paises?detalle=bajo'),
         fetchJSONWithAuth(`/api/kpis/visitantes/paises${rangeQuery}`),
       ]);
       if (!geo.ok || !geo.json?.geojson) {
@@ -0,0 +1,194 @@
+"""Cola de trabajos en segundo plano dentro del proceso.
+
+Para tareas que no deben bloquear la respuesta al usuario (registro de visitas,
+enriquecimiento de contactos). Ofrece concurrencia acotada, reintentos con
+backoff exponencial, drenado ordenado al apagar y contadores de profundidad.
+
+Los trabajos viven en memoria: si el proceso muere sin drenar se pierden, así
+que sólo deben encolarse operaciones de mejor esfuerzo. Como un fallo se
+reintenta invocando de nuevo la fábrica, un trabajo que no sea idempotente debe
+llevar su propio registro de avance entre intentos para no repetir los pasos ya
+hechos (como el registro de visitas con `_VisitProgress`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+JobFactory = Callable[[], Awaitable[object]]
+
+
+@dataclass(slots=True)
+class _Job:
+    name: str
+    factory: JobFactory
+    attempt: int = 1
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class BackgroundQueue:
+    """Cola FIFO acotada con `workers` consumidores.
+
+    `submit` nunca espera: si la cola está llena el trabajo se descarta y se
+    registra, para no trasladar la contención al request. Los workers arrancan en
+    el primer `submit` (o en `start`) sobre el event loop en curso.
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int,
+        maxsize: int,
+        max_attempts: int,
+        retry_base_seconds: float = 0.5,
+    ) -> None:
+        self.workers = max(workers, 1)
+        self.maxsize = maxsize
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_base_seconds = retry_base_seconds
+        self._queue: asyncio.Queue[_Job] | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._closing = False
+        self._in_flight = 0
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "retried": 0,
+            "dropped": 0,
+        }
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._closing = False
+        self._in_flight = 0
+        self._tasks = [
+            loop.create_task(self._worker(), name=f"background-worker-{index}")
+            for index in range(self.workers)
+        ]
+
+    def submit(self, name: str, factory: JobFactory) -> bool:
+        """Encola `factory` (una corrutina por intento). Retorna False si se descartó."""
+        if self._closing:
+            logger.warning("background.job_rejected", extra={"job": name, "reason": "closing"})
+            self._counters["dropped"] += 1
+            return False
+        self.start()
+        assert self._queue is not None
+        try:
+            self._queue.put_nowait(_Job(name=name, factory=factory))
+        except asyncio.QueueFull:
+            logger.warning("background.queue_full", extra={"job": name, "depth": self.maxsize})
+            self._counters["dropped"] += 1
+            return False
+        self._counters["submitted"] += 1
+        return True
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            job = await queue.get()
+            self._in_flight += 1
+            try:
+                await self._run(job)
+            finally:
+                self._in_flight -= 1
+                queue.task_done()
+
+    async def _run(self, job: _Job) -> None:
+        try:
+            await job.factory()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            if job.attempt < self.max_attempts:
+                delay = self.retry_base_seconds * (2 ** (job.attempt - 1))
+                logger.warning(
+                    "background.job_retry",
+                    extra={"job": job.name, "attempt": job.attempt, "error": str(exc)},
+                )
+                self._counters["retried"] += 1
+                job.attempt += 1
+                await asyncio.sleep(delay)
+                await self._run(job)
+                return
+            self._counters["failed"] += 1
+            logger.exception(
+                "background.job_failed",
+                extra={"job": job.name, "attempt": job.attempt, "error": str(exc)},
+            )
+            return
+        self._counters["completed"] += 1
+        logger.debug(
+            "background.job_completed",
+            extra={
+                "job": job.name,
+                "attempt": job.attempt,
+                "latency_ms": round((time.monotonic() - job.enqueued_at) * 1000, 1),
+            },
+        )
+
+    async def drain(self, timeout: float) -> None:
+        """Deja de aceptar trabajos, espera los pendientes hasta `timeout` y detiene workers."""
+        self._closing = True
+        queue, tasks = self._queue, self._tasks
+        if queue is None or not tasks or self._loop is not asyncio.get_running_loop():
+            return
+        try:
+            await asyncio.wait_for(queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "background.drain_timeout",
+                extra={"pending": queue.qsize(), "in_flight": self._in_flight},
+            )
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict[str, int]:
+        depth = self._queue.qsize() if self._queue is not None else 0
+        return {
+            "depth": depth,
+            "in_flight": self._in_flight,
+            "workers": len(self._tasks),
+            **self._counters,
+        }
+
+
+queue = BackgroundQueue(
+    workers=settings.background_workers,
+    maxsize=settings.background_queue_max,
+    max_attempts=settings.background_max_attempts,
+)
+
+
+def submit(name: str, factory: JobFactory) -> bool:
+    """Atajo para encolar en la cola compartida del proceso."""
+    return queue.submit(name, factory)
+
+
+async def startup() -> None:
+    queue.start()
+
+
+async def shutdown() -> None:
+    await queue.drain(settings.background_drain_timeout_seconds)
+
+
+def stats() -> dict[str, int]:
+    return queue.stats()
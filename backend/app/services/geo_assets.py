@@ -0,0 +1,178 @@
+"""Catálogos GeoJSON del panel pre-serializados y comprimidos.
+
+Los mapas piden GeoJSON de 1–4 MB que no cambia entre despliegues. Cada catálogo
+se serializa una sola vez por proceso con su envoltura `{"ok": true, "geojson": …}`
+y se guardan sus variantes gzip y, cuando el paquete opcional `brotli` está
+instalado (extra `compresion`), brotli. Las rutas sólo eligen la variante según
+`Accept-Encoding` y responden 304 cuando el `ETag` coincide.
+
+La compresión corre en un hilo para no bloquear el event loop; cargas
+concurrentes del mismo catálogo comparten una sola codificación.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import importlib.util
+import json
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.cache import SingleFlight
+from app.core.logging import get_logger
+from app.services import leads_geo
+
+logger = get_logger(__name__)
+
+# Preferencia del servidor cuando el cliente acepta varias codificaciones.
+_PREFERENCE = ("br", "gzip")
+# En un catálogo de 4 MB, 11 tarda más del doble que 10 y sólo reduce ~4 % más;
+# por debajo de 10 brotli no supera a gzip 9 con estos GeoJSON.
+_BROTLI_QUALITY = 10
+
+_ASSETS: dict[str, EncodedAsset] = {}
+_INFLIGHT: SingleFlight[str, EncodedAsset] = SingleFlight()
+_WARMUP: asyncio.Task[None] | None = None
+
+
+def _brotli_available() -> bool:
+    """Indica si el paquete opcional `brotli` está instalado."""
+    return importlib.util.find_spec("brotli") is not None
+
+
+@dataclass(frozen=True, slots=True)
+class EncodedAsset:
+    """Cuerpo JSON ya serializado con sus variantes comprimidas.
+
+    El `ETag` es fuerte por representación: la variante comprimida agrega el
+    sufijo de su codificación (`"<hash>-gzip"`) y todas comparten el hash base.
+    """
+
+    digest: str
+    variants: dict[str | None, bytes]
+
+    def etag(self, encoding: str | None) -> str:
+        suffix = f"-{encoding}" if encoding else ""
+        return f'"{self.digest}{suffix}"'
+
+    def matches(self, if_none_match: str | None) -> bool:
+        """Evalúa `If-None-Match` con comparación débil (cualquier variante vale)."""
+        if not if_none_match:
+            return False
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate == "*":
+                return True
+            tag = candidate.removeprefix("W/").strip('"')
+            if tag.split("-", 1)[0] == self.digest:
+                return True
+        return False
+
+    def negotiate(self, accept_encoding: str | None) -> tuple[str | None, bytes]:
+        """Elige la variante a enviar según `Accept-Encoding` (q=0 la excluye)."""
+        accepted: set[str] = set()
+        for part in (accept_encoding or "").split(","):
+            name, _, params = part.partition(";")
+            name = name.strip().lower()
+            if not name:
+                continue
+            quality = 1.0
+            key, _, value = params.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+            if quality > 0:
+                accepted.add(name)
+        for encoding in _PREFERENCE:
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding, self.variants[encoding]
+        return None, self.variants[None]
+
+
+def encode(payload: Any) -> EncodedAsset:
+    """Serializa `payload` en JSON compacto y precalcula sus variantes comprimidas."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    variants: dict[str | None, bytes] = {
+        None: body,
+        "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+    }
+    if _brotli_available():
+        import brotli
+
+        variants["br"] = brotli.compress(body, quality=_BROTLI_QUALITY)
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    return EncodedAsset(digest=digest, variants=variants)
+
+
+def _envelope(load: Callable[[], dict[str, Any]]) -> EncodedAsset:
+    return encode({"ok": True, "geojson": load()})
+
+
+async def _get(name: str, load: Callable[[], dict[str, Any]]) -> EncodedAsset:
+    asset = _ASSETS.get(name)
+    if asset is not None:
+        return asset
+    asset = await _INFLIGHT.run(name, lambda: asyncio.to_thread(_envelope, load))
+    _ASSETS[name] = asset
+    logger.debug(
+        "geo.asset_encoded",
+        extra={
+            "asset": name,
+            "sizes": {str(enc or "identity"): len(data) for enc, data in asset.variants.items()},
+        },
+    )
+    return asset
+
+
+async def states(detalle: leads_geo.Detalle = "alto") -> EncodedAsset:
+    return await _get(f"estados:{detalle}", lambda: leads_geo.load_states_geojson(detalle))
+
+
+async def world(detalle: leads_geo.Detalle = "alto") -> EncodedAsset:
+    return await _get(f"paises:{detalle}", lambda: leads_geo.load_world_countries_geojson(detalle))
+
+
+async def municipalities(cve_ent: str, detalle: leads_geo.Detalle = "alto") -> EncodedAsset:
+    """Municipios de `cve_ent`; propaga `KeyError` si el estado no existe."""
+    code = str(cve_ent).zfill(2)
+    return await _get(
+        f"municipios/{code}:{detalle}",
+        lambda: leads_geo.load_state_municipalities_geojson(code, detalle),
+    )
+
+
+async def _warm() -> None:
+    try:
+        # Los niveles que pide el panel en su vista inicial.
+        await states("bajo")
+        await world("bajo")
+    except Exception as exc:  # pragma: no cover - depende de los archivos desplegados
+        logger.warning("geo.asset_warmup_failed", extra={"error": str(exc)})
+
+
+async def startup() -> None:
+    """Codifica en segundo plano los catálogos que se piden en cada carga del panel."""
+    global _WARMUP
+    if _WARMUP is None or _WARMUP.done():
+        _WARMUP = asyncio.create_task(_warm(), name="geo-assets-warmup")
+
+
+async def shutdown() -> None:
+    global _WARMUP
+    task, _WARMUP = _WARMUP, None
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def stats() -> dict[str, int]:
+    return {
+        "assets": len(_ASSETS),
+        "bytes": sum(len(data) for asset in _ASSETS.values() for data in asset.variants.values()),
+        "brotli": int(_brotli_available()),
+    }
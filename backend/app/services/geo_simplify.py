@@ -0,0 +1,303 @@
+"""Simplificación y cuantización de catálogos GeoJSON para el mapa del panel.
+
+Se usa fuera de línea (`scripts/build_geo_variants.py`) para generar las variantes
+`bajo`/`medio` de `app/data/geo`. Sólo depende de la biblioteca estándar.
+
+La topología se preserva como lo hace TopoJSON: los anillos se cortan en arcos en
+los vértices donde una frontera deja de ser compartida y cada arco compartido se
+simplifica una sola vez, así dos estados vecinos conservan exactamente la misma
+frontera y no aparecen huecos ni traslapes. La simplificación es
+Visvalingam–Whyatt: se eliminan primero los vértices cuyo triángulo efectivo tiene
+menor área, hasta que todos superan la tolerancia.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+Point = tuple[float, float]
+Arc = tuple[Point, ...]
+# Un anillo referencia arcos por índice; `~i` recorre el arco `i` al revés.
+RingRefs = list[int]
+
+
+@dataclass(frozen=True, slots=True)
+class Nivel:
+    """Parámetros de una variante de detalle.
+
+    `area` es el área mínima (grados²) del triángulo efectivo que sobrevive a la
+    simplificación y `digits` los decimales que se conservan en las coordenadas.
+    """
+
+    area: float
+    digits: int
+    quantization: int
+
+
+NIVELES: dict[str, Nivel] = {
+    # Vista nacional/mundial: ~1 km de precisión, bordes suavizados.
+    "bajo": Nivel(area=1e-4, digits=3, quantization=10_000),
+    # Vista de estado: ~100 m de precisión, suficiente para municipios.
+    "medio": Nivel(area=2e-6, digits=4, quantization=100_000),
+}
+
+
+def _triangle_area(a: Point, b: Point, c: Point) -> float:
+    return abs((b[0] - a[0]) * (c[1] - a[1]) - (c[0] - a[0]) * (b[1] - a[1])) / 2
+
+
+def visvalingam(points: Sequence[Point], min_area: float, keep: int = 2) -> list[Point]:
+    """Simplifica una polilínea conservando sus extremos y al menos `keep` vértices."""
+    n = len(points)
+    if n <= max(keep, 2):
+        return list(points)
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    areas = [math.inf] * n
+    heap: list[tuple[float, int]] = []
+    for i in range(1, n - 1):
+        areas[i] = _triangle_area(points[i - 1], points[i], points[i + 1])
+        heap.append((areas[i], i))
+    heapq.heapify(heap)
+    removed = [False] * n
+    remaining = n
+    while heap and remaining > keep:
+        area, i = heapq.heappop(heap)
+        if removed[i] or area != areas[i]:
+            continue
+        if area >= min_area:
+            break
+        removed[i] = True
+        remaining -= 1
+        before, after = prev[i], nxt[i]
+        nxt[before] = after
+        prev[after] = before
+        for j in (before, after):
+            if 0 < j < n - 1:
+                # El área nunca baja de la del vértice eliminado: evita que un
+                # vecino se elimine antes que puntos más relevantes.
+                areas[j] = max(_triangle_area(points[prev[j]], points[j], points[nxt[j]]), area)
+                heapq.heappush(heap, (areas[j], j))
+    return [point for point, gone in zip(points, removed) if not gone]
+
+
+def _rounded_ring(ring: Iterable[Sequence[float]], digits: int) -> list[Point]:
+    out: list[Point] = []
+    for coord in ring:
+        point = (round(float(coord[0]), digits), round(float(coord[1]), digits))
+        if not out or out[-1] != point:
+            out.append(point)
+    if len(out) > 1 and out[0] == out[-1]:
+        out.pop()
+    return out
+
+
+def _polygons(geometry: dict[str, Any] | None) -> list[list[Sequence[Sequence[float]]]]:
+    if not geometry:
+        return []
+    kind = geometry.get("type")
+    coords = geometry.get("coordinates") or []
+    if kind == "Polygon":
+        return [coords]
+    if kind == "MultiPolygon":
+        return list(coords)
+    raise ValueError(f"geometría no soportada: {kind}")
+
+
+@dataclass(slots=True)
+class Topology:
+    """Arcos compartidos de una colección de polígonos."""
+
+    arcs: list[Arc] = field(default_factory=list)
+    # feature → polígonos → anillos → referencias a arcos
+    shapes: list[list[list[RingRefs]]] = field(default_factory=list)
+    _index: dict[Arc, int] = field(default_factory=dict)
+
+    def add_arc(self, arc: Sequence[Point]) -> int:
+        forward = tuple(arc)
+        backward = forward[::-1]
+        canonical = min(forward, backward)
+        idx = self._index.get(canonical)
+        if idx is None:
+            idx = len(self.arcs)
+            self.arcs.append(canonical)
+            self._index[canonical] = idx
+        return idx if forward == canonical else ~idx
+
+
+def _junctions(rings: Iterable[list[Point]]) -> set[Point]:
+    neighbours: dict[Point, set[frozenset[Point]]] = {}
+    for ring in rings:
+        size = len(ring)
+        for i, point in enumerate(ring):
+            pair = frozenset((ring[i - 1], ring[(i + 1) % size]))
+            neighbours.setdefault(point, set()).add(pair)
+    return {point for point, pairs in neighbours.items() if len(pairs) > 1}
+
+
+def _ring_arcs(ring: list[Point], junctions: set[Point]) -> list[list[Point]]:
+    cuts = [i for i, point in enumerate(ring) if point in junctions]
+    if not cuts:
+        # Anillo aislado: se rota al vértice menor para que un anillo idéntico
+        # en otro polígono (enclave/hueco) produzca el mismo arco.
+        start = ring.index(min(ring))
+        rotated = ring[start:] + ring[:start]
+        return [[*rotated, rotated[0]]]
+    rotated = ring[cuts[0] :] + ring[: cuts[0]]
+    offsets = [i - cuts[0] for i in cuts] + [len(ring)]
+    closed = [*rotated, rotated[0]]
+    return [closed[a : b + 1] for a, b in zip(offsets, offsets[1:])]
+
+
+def build_topology(features: Sequence[dict[str, Any]], digits: int) -> Topology:
+    """Redondea coordenadas y corta los anillos en arcos compartidos."""
+    rounded: list[list[list[list[Point]]]] = []
+    for feature in features:
+        shape: list[list[list[Point]]] = []
+        for polygon in _polygons(feature.get("geometry")):
+            rings = [_rounded_ring(ring, digits) for ring in polygon]
+            rings = [ring for ring in rings if len(ring) >= 3]
+            if rings:
+                shape.append(rings)
+        rounded.append(shape)
+
+    junctions = _junctions(ring for shape in rounded for polygon in shape for ring in polygon)
+    topology = Topology()
+    for shape in rounded:
+        topology.shapes.append(
+            [
+                [[topology.add_arc(arc) for arc in _ring_arcs(ring, junctions)] for ring in polygon]
+                for polygon in shape
+            ]
+        )
+    return topology
+
+
+def simplify_topology(topology: Topology, min_area: float) -> Topology:
+    """Simplifica cada arco una sola vez; los vecinos comparten el resultado."""
+    arcs: list[Arc] = []
+    for arc in topology.arcs:
+        keep = 4 if arc[0] == arc[-1] else 2
+        arcs.append(tuple(visvalingam(arc, min_area, keep=keep)))
+    return Topology(arcs=arcs, shapes=topology.shapes)
+
+
+def _ring_coords(topology: Topology, refs: RingRefs) -> list[list[float]]:
+    coords: list[Point] = []
+    for ref in refs:
+        arc = topology.arcs[ref] if ref >= 0 else topology.arcs[~ref][::-1]
+        coords.extend(arc if not coords else arc[1:])
+    deduped = [point for i, point in enumerate(coords) if i == 0 or point != coords[i - 1]]
+    if len(deduped) < 4:
+        return []
+    return [list(point) for point in deduped]
+
+
+def _feature_geometry(topology: Topology, shape: list[list[RingRefs]]) -> dict[str, Any] | None:
+    polygons: list[list[list[list[float]]]] = []
+    for polygon in shape:
+        rings = [_ring_coords(topology, refs) for refs in polygon]
+        if not rings or not rings[0]:
+            continue  # el exterior colapsó: islote menor que la tolerancia
+        polygons.append([rings[0], *(ring for ring in rings[1:] if ring)])
+    if not polygons:
+        return None
+    if len(polygons) == 1:
+        return {"type": "Polygon", "coordinates": polygons[0]}
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+
+def _properties(feature: dict[str, Any], keep: Sequence[str] | None) -> dict[str, Any]:
+    props = feature.get("properties") or {}
+    if keep is None:
+        return dict(props)
+    return {key: props[key] for key in keep if key in props}
+
+
+def simplify_geojson(
+    collection: dict[str, Any],
+    nivel: Nivel,
+    *,
+    properties: Sequence[str] | None = None,
+) -> dict[str, Any]:
+    """Regresa una copia simplificada y cuantizada de la `FeatureCollection`.
+
+    Si un feature colapsa por completo (p. ej. una isla diminuta) se conserva su
+    geometría original redondeada para no perderlo del mapa.
+    """
+    features = collection.get("features") or []
+    base = build_topology(features, nivel.digits)
+    simplified = simplify_topology(base, nivel.area)
+    out: list[dict[str, Any]] = []
+    for feature, shape in zip(features, simplified.shapes):
+        geometry = _feature_geometry(simplified, shape) or _feature_geometry(base, shape)
+        out.append(
+            {
+                "type": "Feature",
+                "properties": _properties(feature, properties),
+                "geometry": geometry,
+            }
+        )
+    return {"type": "FeatureCollection", "features": out}
+
+
+def to_topojson(
+    collection: dict[str, Any],
+    nivel: Nivel,
+    *,
+    name: str,
+    properties: Sequence[str] | None = None,
+) -> dict[str, Any]:
+    """Codifica la colección como TopoJSON cuantizado (arcos delta-codificados)."""
+    features = collection.get("features") or []
+    topology = simplify_topology(build_topology(features, nivel.digits), nivel.area)
+    xs = [x for arc in topology.arcs for x, _ in arc] or [0.0]
+    ys = [y for arc in topology.arcs for _, y in arc] or [0.0]
+    min_x, min_y = min(xs), min(ys)
+    steps = max(nivel.quantization - 1, 1)
+    kx = (max(xs) - min_x) / steps or 1.0
+    ky = (max(ys) - min_y) / steps or 1.0
+
+    arcs: list[list[list[int]]] = []
+    for arc in topology.arcs:
+        encoded: list[list[int]] = []
+        last_x = last_y = 0
+        for x, y in arc:
+            qx, qy = round((x - min_x) / kx), round((y - min_y) / ky)
+            if encoded and qx == last_x and qy == last_y:
+                continue
+            encoded.append([qx - last_x, qy - last_y] if encoded else [qx, qy])
+            last_x, last_y = qx, qy
+        if len(encoded) < 2:
+            encoded.append([0, 0])
+        arcs.append(encoded)
+
+    geometries: list[dict[str, Any]] = []
+    for feature, shape in zip(features, topology.shapes):
+        props = _properties(feature, properties)
+        if not shape:
+            geometries.append({"type": None, "properties": props})
+        elif len(shape) == 1:
+            geometries.append({"type": "Polygon", "arcs": shape[0], "properties": props})
+        else:
+            geometries.append({"type": "MultiPolygon", "arcs": shape, "properties": props})
+
+    return {
+        "type": "Topology",
+        "transform": {"scale": [kx, ky], "translate": [min_x, min_y]},
+        "objects": {name: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": arcs,
+    }
+
+
+def vertex_count(collection: dict[str, Any]) -> int:
+    """Número total de vértices de los polígonos de la colección."""
+    total = 0
+    for feature in collection.get("features") or []:
+        for polygon in _polygons(feature.get("geometry")):
+            total += sum(len(ring) for ring in polygon)
+    return total
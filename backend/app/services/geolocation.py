@@ -2,40 +2,107 @@
 
 from __future__ import annotations
 
-import time
 from typing import Any
 
 import httpx
 
+from app.core.cache import SingleFlight, TTLCache
 from app.core.config import settings
 from app.core.logging import get_logger
+from app.services import ip_database
 
 logger = get_logger(__name__)
 
 _LOOPBACKS = {"127.0.0.1", "::1", ""}
 _DEFAULT_ENDPOINT = "https://ipapi.co/{ip}/json/"
-_CACHE: dict[str, tuple[float, dict[str, Any] | None]] = {}
 _NEGATIVE_TTL = 5 * 60  # TTL más corto para resultados fallidos
+_TIMEOUT_SECONDS = 6.0
+
+# Se guarda `(resultado,)` para distinguir un fallo cacheado (None) de un miss.
+_CACHE: TTLCache[str, tuple[dict[str, Any] | None]] = TTLCache(
+    ttl=settings.geolocation_cache_ttl_seconds,
+    maxsize=settings.geolocation_cache_max_entries,
+)
+_INFLIGHT: SingleFlight[str, dict[str, Any] | None] = SingleFlight()
+_STATS = {"upstream_calls": 0, "upstream_errors": 0}
+_CLIENT: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Cliente HTTP compartido hacia el proveedor de geolocalización."""
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(
+            timeout=_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+        )
+    return _CLIENT
+
+
+def _local_database() -> ip_database.IPRangeDatabase | None:
+    path = settings.geolocation_db_path or str(ip_database.DEFAULT_PATH)
+    return ip_database.load_database(path)
+
+
+async def startup() -> None:
+    """Precarga la base local de rangos IP cuando es el proveedor configurado."""
+    if settings.geolocation_provider == "local":
+        _local_database()
+
+
+async def shutdown() -> None:
+    """Cierra el cliente HTTP compartido (se invoca desde el `lifespan`)."""
+    global _CLIENT
+    client, _CLIENT = _CLIENT, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+def stats() -> dict[str, int]:
+    """Contadores del caché (hits/misses/evictions) y de llamadas al proveedor."""
+    return {**_CACHE.stats(), **_STATS, "coalesced": _INFLIGHT.shared}
+
+
+def _remember(ip: str, result: dict[str, Any] | None, ttl: int) -> None:
+    if not ttl:
+        return
+    # TTL dinámico: si el valor es None usamos TTL reducido
+    _CACHE.set(ip, (result,), ttl=min(_NEGATIVE_TTL, ttl) if result is None else ttl)
 
 
 async def lookup_ip(ip: str | None) -> dict[str, Any] | None:
     """Obtiene metadata geográfica aproximada para la dirección IP recibida.
 
-    Retorna `None` si la IP es inválida o si la consulta falla.
+    Retorna `None` si la IP es inválida o si la consulta falla. Las consultas
+    concurrentes de una misma IP comparten una sola llamada al proveedor.
     """
 
     if not ip or ip in _LOOPBACKS:
         return None
 
-    ttl = max(int(settings.geolocation_cache_ttl_seconds or 0), 0)
-    now = time.monotonic()
+    if settings.geolocation_provider == "local":
+        return lookup_local(ip)
+
     cached = _CACHE.get(ip)
-    if cached:
-        timestamp, stored = cached
-        # TTL dinámico: si el valor es None usamos TTL reducido
-        effective_ttl = _NEGATIVE_TTL if stored is None and ttl else ttl
-        if effective_ttl and now - timestamp < effective_ttl:
-            return stored
+    if cached is not None:
+        return cached[0]
+
+    return await _INFLIGHT.run(ip, lambda: _fetch(ip))
+
+
+def lookup_local(ip: str) -> dict[str, Any] | None:
+    """Resuelve la IP contra la base local (búsqueda binaria, sin red)."""
+    database = _local_database()
+    if database is None:
+        return None
+    record = database.lookup(ip)
+    if record is None:
+        return None
+    return normalize(ip, record)
+
+
+async def _fetch(ip: str) -> dict[str, Any] | None:
+    ttl = max(int(settings.geolocation_cache_ttl_seconds or 0), 0)
 
     endpoint_template = settings.geolocation_api_url or _DEFAULT_ENDPOINT
     url = endpoint_template.format(ip=ip)
@@ -45,21 +112,21 @@ async def lookup_ip(ip: str | None) -> dict[str, Any] | None:
     if token:
         headers["Authorization"] = f"Bearer {token}"
 
+    _STATS["upstream_calls"] += 1
     try:
-        async with httpx.AsyncClient(timeout=6.0) as client:
-            response = await client.get(url, headers=headers)
+        response = await _get_client().get(url, headers=headers)
     except httpx.RequestError as exc:  # pragma: no cover - depende de red externa
         logger.warning("No se pudo resolver geolocalización", exc_info=exc)
-        if ttl:
-            _CACHE[ip] = (now, None)
+        _STATS["upstream_errors"] += 1
+        _remember(ip, None, ttl)
         return None
 
     if response.status_code >= 400:
         logger.warning(
             "Geolocalización respondió con error", extra={"status": response.status_code}
         )
-        if ttl:
-            _CACHE[ip] = (now, None)
+        _STATS["upstream_errors"] += 1
+        _remember(ip, None, ttl)
         return None
 
     try:
@@ -70,7 +137,13 @@ async def lookup_ip(ip: str | None) -> dict[str, Any] | None:
     if not isinstance(data, dict):
         return None
 
-    # Normalizamos campos más comunes de distintos proveedores.
+    result = normalize(ip, data)
+    _remember(ip, result, ttl)
+    return result
+
+
+def normalize(ip: str, data: dict[str, Any]) -> dict[str, Any]:
+    """Normaliza los campos más comunes de distintos proveedores."""
     normalized = {
         "ip": ip,
         "city": data.get("city") or data.get("town"),
@@ -83,7 +156,4 @@ async def lookup_ip(ip: str | None) -> dict[str, Any] | None:
     }
 
     # Removemos claves con valores None para evitar ruido.
-    result = {key: value for key, value in normalized.items() if value is not None}
-    if ttl:
-        _CACHE[ip] = (now, result)
-    return result
+    return {key: value for key, value in normalized.items() if value is not None}
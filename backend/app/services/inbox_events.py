@@ -0,0 +1,290 @@
+"""Difusión en tiempo real de cambios del inbox hacia el panel.
+
+Las escrituras propias (mensajes registrados, cambios de estado, modo manual,
+lecturas) publican eventos en un hub en memoria; cada agente conectado recibe
+una copia a través de su cola. Así, N agentes mirando el inbox cuestan una sola
+difusión en lugar de N ciclos de polling.
+
+Para cambios que ocurren fuera de este proceso (otros workers, WhatsApp vía
+triggers, ediciones directas en Supabase) se registran *change feeds*: tareas que
+observan una fuente externa y publican en el mismo hub. `PollingChangeFeed` es
+la implementación incluida; otra fuente (p. ej. Supabase Realtime) sólo necesita
+implementar `ChangeFeed`.
+
+Eventos: diccionarios con `type` (`message`, `conversation`, `manual`, `resync`),
+`conversation_id` y campos propios de cada tipo.
+
+El hub no aplica permisos: los change feeds leen con service_role. Cada stream
+filtra con `VisibilityFilter`, que pregunta a PostgREST con el JWT del agente
+(misma RLS que `GET /inbox`) qué conversaciones puede ver. Para abrir el stream
+desde `EventSource` (sin headers) se usa un ticket de un solo uso y vida corta
+emitido por `StreamTickets`, en lugar de poner el JWT en la URL.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import secrets
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Protocol
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services import postgrest
+
+logger = get_logger(__name__)
+
+InboxEvent = dict[str, Any]
+Publish = Callable[[InboxEvent], None]
+
+
+class ChangeFeed(Protocol):
+    """Fuente externa de cambios; corre hasta ser cancelada publicando eventos."""
+
+    name: str
+
+    async def run(self, publish: Publish) -> None: ...
+
+
+class InboxHub:
+    """Fan-out de eventos a suscriptores con colas acotadas.
+
+    `publish` nunca bloquea. Si un suscriptor no consume a tiempo y su cola se
+    llena, se vacía y recibe un único evento `resync` para que vuelva a consultar
+    `GET /inbox`.
+    """
+
+    def __init__(self, *, queue_size: int = 100) -> None:
+        self.queue_size = queue_size
+        self._subscribers: set[asyncio.Queue[InboxEvent]] = set()
+        self._counters = {"published": 0, "delivered": 0, "resyncs": 0}
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: InboxEvent) -> None:
+        self._counters["published"] += 1
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+                self._counters["resyncs"] += 1
+            else:
+                self._counters["delivered"] += 1
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue[InboxEvent]]:
+        queue: asyncio.Queue[InboxEvent] = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    def stats(self) -> dict[str, int]:
+        return {"subscribers": len(self._subscribers), **self._counters}
+
+
+@dataclass(frozen=True, slots=True)
+class StreamGrant:
+    """Identidad con la que corre un stream: el JWT se queda en el servidor."""
+
+    user_id: str
+    token: str
+    expires_at: float | None = None
+
+
+class StreamTickets:
+    """Tickets opacos, de un solo uso y vida corta para abrir `GET /inbox/stream`.
+
+    Viven en memoria del proceso, igual que el hub: el ticket se canjea en el
+    mismo worker que lo emitió.
+    """
+
+    def __init__(self, *, ttl: float, maxsize: int = 10_000) -> None:
+        self._grants: TTLCache[str, StreamGrant] = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    def issue(self, grant: StreamGrant) -> str:
+        ticket = secrets.token_urlsafe(32)
+        self._grants.set(ticket, grant)
+        return ticket
+
+    def redeem(self, ticket: str | None) -> StreamGrant | None:
+        if not ticket:
+            return None
+        grant = self._grants.get(ticket)
+        self._grants.pop(ticket)
+        return grant
+
+
+class VisibilityExpired(Exception):
+    """El JWT del suscriptor ya no es aceptado por PostgREST (expiró o fue revocado)."""
+
+
+FetchVisible = Callable[[str, Iterable[str]], Awaitable[set[str]]]
+
+
+class VisibilityFilter:
+    """Decide qué eventos ve un suscriptor según la RLS de `conversaciones`.
+
+    Consulta con el JWT del agente y recuerda la respuesta por conversación
+    durante `ttl` segundos, así una conversación activa cuesta una consulta por
+    ventana y no una por evento. Ante un error de consulta el evento se descarta.
+    """
+
+    def __init__(self, token: str, *, ttl: float, fetch: FetchVisible | None = None) -> None:
+        self.token = token
+        self._fetch = fetch or _fetch_visible_conversations
+        self._known: TTLCache[str, bool] = TTLCache(ttl=ttl, maxsize=5_000)
+
+    async def allows(self, event: InboxEvent) -> bool:
+        conversation_id = event.get("conversation_id")
+        if not conversation_id:
+            return event.get("type") == "resync"
+        key = str(conversation_id)
+        known = self._known.get(key)
+        if known is None:
+            known = key in await self._fetch(self.token, [key])
+            self._known.set(key, known)
+        return known
+
+
+async def _fetch_visible_conversations(token: str, ids: Iterable[str]) -> set[str]:
+    response = await postgrest.get(
+        "/rest/v1/conversaciones",
+        params={"select": "id", "id": f"in.({','.join(ids)})"},
+        token=token,
+    )
+    if response.status_code in (401, 403):
+        raise VisibilityExpired()
+    if response.status_code >= 400:
+        raise postgrest.PostgrestResponseError.from_response(
+            response, "Error consultando visibilidad de conversaciones"
+        )
+    data = response.json() or []
+    return {str(row.get("id")) for row in data if isinstance(row, dict)}
+
+
+class PollingChangeFeed:
+    """Consulta periódicamente `conversaciones` con actividad reciente.
+
+    Una sola consulta por intervalo y por proceso, sin importar cuántos agentes
+    estén conectados. Sólo consulta mientras haya suscriptores.
+    """
+
+    name = "polling"
+
+    def __init__(
+        self,
+        hub: InboxHub,
+        *,
+        interval: float,
+        fetch: Callable[[str], Awaitable[list[dict[str, Any]]]] | None = None,
+    ) -> None:
+        self.hub = hub
+        self.interval = interval
+        self._fetch = fetch or _fetch_recent_conversations
+        self._cursor = datetime.now(timezone.utc).isoformat()
+
+    async def run(self, publish: Publish) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if not len(self.hub):
+                self._cursor = datetime.now(timezone.utc).isoformat()
+                continue
+            try:
+                await self.poll(publish)
+            except Exception as exc:  # pragma: no cover - se reintenta en el siguiente ciclo
+                logger.warning("inbox.feed_poll_failed", extra={"error": str(exc)})
+
+    async def poll(self, publish: Publish) -> None:
+        rows = await self._fetch(self._cursor)
+        for row in rows:
+            ts = row.get("ultimo_mensaje_en")
+            if ts and ts > self._cursor:
+                self._cursor = ts
+            publish(
+                {
+                    "type": "conversation",
+                    "conversation_id": row.get("id"),
+                    "canal": row.get("canal"),
+                    "estado": row.get("estado"),
+                    "no_leidos": row.get("no_leidos"),
+                    "ultimo_mensaje_en": ts,
+                    "source": self.name,
+                }
+            )
+
+
+async def _fetch_recent_conversations(cursor: str) -> list[dict[str, Any]]:
+    response = await postgrest.get(
+        "/rest/v1/conversaciones",
+        params={
+            "select": "id,canal,estado,no_leidos,ultimo_mensaje_en",
+            "ultimo_mensaje_en": f"gt.{cursor}",
+            "order": "ultimo_mensaje_en.asc",
+            "limit": "200",
+        },
+    )
+    if response.status_code >= 400:
+        raise postgrest.PostgrestResponseError.from_response(
+            response, "Error consultando cambios del inbox"
+        )
+    data = response.json() or []
+    return data if isinstance(data, list) else []
+
+
+hub = InboxHub(queue_size=settings.inbox_subscriber_queue_size)
+tickets = StreamTickets(ttl=settings.inbox_stream_ticket_ttl_seconds)
+_FEEDS: list[ChangeFeed] = []
+_FEED_TASKS: list[asyncio.Task[None]] = []
+
+
+def publish(event: InboxEvent) -> None:
+    """Publica un evento en el hub del proceso (no bloquea; sin suscriptores no hace nada)."""
+    if len(hub):
+        hub.publish(event)
+
+
+def register_feed(feed: ChangeFeed) -> None:
+    """Agrega una fuente externa de cambios; se inicia en `startup`."""
+    _FEEDS.append(feed)
+
+
+async def _run_feed(feed: ChangeFeed) -> None:
+    try:
+        await feed.run(publish)
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:  # pragma: no cover - se registra y se detiene la fuente
+        logger.exception("inbox.feed_failed", extra={"feed": feed.name, "error": str(exc)})
+
+
+async def startup() -> None:
+    """Inicia las fuentes de cambios configuradas."""
+    if settings.inbox_change_feed == "polling" and not any(
+        isinstance(feed, PollingChangeFeed) for feed in _FEEDS
+    ):
+        register_feed(PollingChangeFeed(hub, interval=settings.inbox_poll_interval_seconds))
+    loop = asyncio.get_running_loop()
+    for feed in _FEEDS:
+        _FEED_TASKS.append(loop.create_task(_run_feed(feed), name=f"inbox-feed-{feed.name}"))
+
+
+async def shutdown() -> None:
+    tasks = list(_FEED_TASKS)
+    _FEED_TASKS.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def stats() -> dict[str, int]:
+    return hub.stats()
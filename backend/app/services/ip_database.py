@@ -0,0 +1,166 @@
+"""Base local de rangos IP → ubicación para geolocalizar sin red.
+
+Se carga un CSV (opcionalmente `.gz`) con una fila por rango y se construye un
+índice compacto: arreglos ordenados con el inicio/fin de cada rango y un índice
+hacia registros de ubicación deduplicados. Cada consulta es una búsqueda binaria.
+
+Columnas aceptadas (encabezado obligatorio):
+
+- rango: `network` (CIDR) o `start_ip`/`end_ip` (dirección o entero);
+- ubicación: `city`, `region`, `country`, `latitude`, `longitude`, `timezone`, `asn`.
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import ipaddress
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from app.core.logging import get_logger
+from app.data import data_path
+
+logger = get_logger(__name__)
+
+DEFAULT_PATH = data_path("geoip", "ip_ranges.csv")
+_FIELDS = ("city", "region", "country", "latitude", "longitude", "timezone", "asn")
+_FLOAT_FIELDS = {"latitude", "longitude"}
+
+
+def _parse_ip(value: str) -> ipaddress.IPv4Address | ipaddress.IPv6Address:
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return ipaddress.IPv4Address(number) if number < 2**32 else ipaddress.IPv6Address(number)
+    return ipaddress.ip_address(value)
+
+
+def _row_range(row: dict[str, str]) -> tuple[int, int, int]:
+    """Retorna (versión, inicio, fin) como enteros para la fila."""
+    network = (row.get("network") or "").strip()
+    if network:
+        net = ipaddress.ip_network(network, strict=False)
+        return net.version, int(net.network_address), int(net.broadcast_address)
+    start = _parse_ip(row.get("start_ip") or "")
+    end = _parse_ip(row.get("end_ip") or "")
+    if start.version != end.version or int(end) < int(start):
+        raise ValueError("rango inválido")
+    return start.version, int(start), int(end)
+
+
+def _row_record(row: dict[str, str]) -> tuple[Any, ...]:
+    values: list[Any] = []
+    for field in _FIELDS:
+        raw = (row.get(field) or "").strip()
+        if not raw:
+            values.append(None)
+        elif field in _FLOAT_FIELDS:
+            try:
+                values.append(float(raw))
+            except ValueError:
+                values.append(None)
+        else:
+            values.append(raw)
+    return tuple(values)
+
+
+class _Index:
+    """Rangos de una familia de direcciones ordenados por inicio."""
+
+    def __init__(self, starts: Any, ends: Any, refs: array) -> None:
+        self.starts = starts
+        self.ends = ends
+        self.refs = refs
+
+    def find(self, value: int) -> int | None:
+        pos = bisect_right(self.starts, value) - 1
+        if pos >= 0 and value <= self.ends[pos]:
+            return self.refs[pos]
+        return None
+
+
+class IPRangeDatabase:
+    """Índice en memoria para resolver IPv4/IPv6 a registros de ubicación."""
+
+    def __init__(self, rows: Iterable[dict[str, str]]) -> None:
+        records: dict[tuple[Any, ...], int] = {}
+        ranges: dict[int, list[tuple[int, int, int]]] = {4: [], 6: []}
+        skipped = 0
+        for row in rows:
+            try:
+                version, start, end = _row_range(row)
+            except ValueError:
+                skipped += 1
+                continue
+            record = _row_record(row)
+            ref = records.setdefault(record, len(records))
+            ranges[version].append((start, end, ref))
+
+        self.records: list[tuple[Any, ...]] = list(records)
+        self.skipped = skipped
+        self._v4 = self._build(ranges[4], typecode="I")
+        # IPv6 no cabe en arreglos de tamaño fijo; se usan listas de enteros.
+        self._v6 = self._build(ranges[6], typecode=None)
+
+    @staticmethod
+    def _build(items: list[tuple[int, int, int]], *, typecode: str | None) -> _Index:
+        items.sort()
+        starts = [start for start, _, _ in items]
+        ends = [end for _, end, _ in items]
+        refs = array("I", (ref for _, _, ref in items))
+        if typecode:
+            return _Index(array(typecode, starts), array(typecode, ends), refs)
+        return _Index(starts, ends, refs)
+
+    def __len__(self) -> int:
+        return len(self._v4.refs) + len(self._v6.refs)
+
+    def lookup(self, ip: str) -> dict[str, Any] | None:
+        """Registro crudo (claves de `_FIELDS`) para la IP o `None` si no hay rango."""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        index = self._v4 if address.version == 4 else self._v6
+        ref = index.find(int(address))
+        if ref is None:
+            return None
+        return dict(zip(_FIELDS, self.records[ref]))
+
+
+def _iter_csv(path: Path) -> Iterator[dict[str, str]]:
+    if path.suffix == ".gz":
+        with gzip.open(path, "rb") as raw:
+            yield from csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8"))
+    else:
+        with path.open("r", encoding="utf-8", newline="") as file:
+            yield from csv.DictReader(file)
+
+
+@lru_cache(maxsize=4)
+def load_database(path: str) -> IPRangeDatabase | None:
+    """Carga (una vez por proceso) la base ubicada en `path`."""
+    file_path = Path(path)
+    try:
+        database = IPRangeDatabase(_iter_csv(file_path))
+    except FileNotFoundError:
+        logger.error("geoip.database_missing", extra={"path": path})
+        return None
+    logger.info(
+        "geoip.database_loaded",
+        extra={
+            "path": path,
+            "ranges": len(database),
+            "records": len(database.records),
+            "skipped": database.skipped,
+        },
+    )
+    return database
@@ -0,0 +1,90 @@
+"""Consolidación de los rollups de tiempos de respuesta del dashboard.
+
+`kpi_procesar_pendientes()` consolida los días marcados en
+`kpi_respuestas_pendientes`; en Supabase lo programa pg_cron. Al arrancar se
+consulta `kpi_rollups_estado()`: si no hay job programado se registra como error
+y el proceso lo ejecuta cada `kpi_rollup_interval_seconds`, para que los días
+pendientes no se acumulen (el dashboard los leería en crudo indefinidamente).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services import postgrest
+
+logger = get_logger(__name__)
+
+_TASK: asyncio.Task[None] | None = None
+_STATS: dict[str, Any] = {"scheduler": "desconocido", "corridas": 0, "dias_procesados": 0}
+
+
+async def _rpc(name: str) -> Any:
+    response = await postgrest.rpc(name, {})
+    if response.status_code >= 400:
+        raise postgrest.PostgrestResponseError.from_response(response, f"Error invocando {name}")
+    return response.json()
+
+
+async def process_pending() -> int:
+    """Consolida un lote de días pendientes; retorna cuántos se procesaron."""
+    processed = int(await _rpc("kpi_procesar_pendientes") or 0)
+    _STATS["corridas"] += 1
+    _STATS["dias_procesados"] += processed
+    return processed
+
+
+async def _supervise(interval: float) -> None:
+    try:
+        estado = await _rpc("kpi_rollups_estado") or {}
+    except Exception as exc:
+        logger.warning("kpi.rollups_estado_failed", extra={"error": str(exc)})
+        return
+    if estado.get("pg_cron"):
+        _STATS["scheduler"] = "pg_cron"
+        return
+
+    _STATS["scheduler"] = "proceso" if interval > 0 else "ninguno"
+    logger.error(
+        "kpi.rollups_sin_scheduler",
+        extra={
+            "pendientes": estado.get("pendientes"),
+            "pendiente_mas_antiguo": estado.get("pendiente_mas_antiguo"),
+            "interval_seconds": interval,
+        },
+    )
+    if interval <= 0:
+        return
+    while True:
+        try:
+            # Un lote tras otro mientras haya atraso; luego, una corrida por intervalo.
+            while await process_pending():
+                pass
+        except Exception as exc:
+            logger.warning("kpi.rollups_process_failed", extra={"error": str(exc)})
+        await asyncio.sleep(interval)
+
+
+async def startup() -> None:
+    """Verifica el scheduler en segundo plano para no demorar el arranque."""
+    global _TASK
+    if not settings.supabase_url:
+        return
+    _TASK = asyncio.create_task(
+        _supervise(settings.kpi_rollup_interval_seconds), name="kpi-rollups"
+    )
+
+
+async def shutdown() -> None:
+    global _TASK
+    task, _TASK = _TASK, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def stats() -> dict[str, Any]:
+    return dict(_STATS)
@@ -6,7 +6,7 @@ import json
 import unicodedata
 from dataclasses import dataclass
 from functools import lru_cache
-from typing import Any, Iterable, Sequence
+from typing import Any, Iterable, Literal, Sequence
 
 from app.core.logging import get_logger
 from app.data import data_path
@@ -122,10 +122,32 @@ def _clean_city_name(name: str | None) -> str | None:
     return lowered.strip() or name
 
 
+STATES_GEOJSON = "mexico_states_mini.geojson"
+WORLD_GEOJSON = "world.geojson"
+# Variantes generadas por `scripts/build_geo_variants.py`, con el mismo nombre relativo.
+VARIANTS_DIR = "geo/variantes"
+
+Detalle = Literal["bajo", "medio", "alto"]
+
+
+def _geo_catalog_path(relative: str, detalle: Detalle) -> str:
+    """Ruta (relativa a `app/data`) del catálogo en el nivel de detalle pedido.
+
+    `alto` es el archivo original; si la variante no se ha generado se usa también
+    el original para que el mapa nunca se quede sin geometría.
+    """
+    if detalle != "alto":
+        candidate = f"{VARIANTS_DIR}/{detalle}/{relative}"
+        if data_path(*candidate.split("/")).exists():
+            return candidate
+        logger.debug("geo.variant_missing", extra={"catalog": relative, "detalle": detalle})
+    return f"geo/{relative}"
+
+
 @lru_cache(maxsize=None)
-def load_states_geojson() -> dict[str, Any]:
+def load_states_geojson(detalle: Detalle = "alto") -> dict[str, Any]:
     """GeoJSON compacto de estados."""
-    return _load_json("geo/mexico_states_mini.geojson")
+    return _load_json(_geo_catalog_path(STATES_GEOJSON, detalle))
 
 
 @lru_cache(maxsize=None)
@@ -135,13 +157,13 @@ def load_full_states_geojson() -> dict[str, Any]:
 
 
 @lru_cache(maxsize=None)
-def load_world_countries_geojson() -> dict[str, Any]:
+def load_world_countries_geojson(detalle: Detalle = "alto") -> dict[str, Any]:
     """GeoJSON simplificado de países."""
-    return _load_json("geo/world.geojson")
+    return _load_json(_geo_catalog_path(WORLD_GEOJSON, detalle))
 
 
 @lru_cache(maxsize=None)
-def load_state_municipalities_geojson(cve_ent: str) -> dict[str, Any]:
+def load_state_municipalities_geojson(cve_ent: str, detalle: Detalle = "alto") -> dict[str, Any]:
     """Retorna el GeoJSON de municipios para la `cve_ent` recibida."""
     manifest = _municipios_manifest()
     state_code = str(cve_ent).zfill(2)
@@ -151,7 +173,7 @@ def load_state_municipalities_geojson(cve_ent: str) -> dict[str, Any]:
     path = entry.get("path")
     if not path:
         raise KeyError(state_code)
-    return _load_json(f"geo/municipios/{path}")
+    return _load_json(_geo_catalog_path(f"municipios/{path}", detalle))
 
 
 def state_display_name(cve_ent: str) -> str | None:
@@ -0,0 +1,241 @@
+"""Gateway único hacia PostgREST (Supabase REST/RPC).
+
+Centraliza lo que antes se repetía en `storage.py` y en las rutas del panel:
+
+- reutiliza el pool compartido de `app.services.supabase`;
+- arma cabeceras según el modo de autenticación (service_role o JWT del usuario);
+- traduce `Prefer`, interpreta `Content-Range` y mapea errores a excepciones tipadas;
+- reintenta lecturas idempotentes ante fallas de red y lleva contadores básicos.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+import httpx
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services import supabase
+
+logger = get_logger(__name__)
+
+_IDEMPOTENT_METHODS = {"GET", "HEAD"}
+
+_STATS: dict[str, float] = {
+    "requests": 0,
+    "network_errors": 0,
+    "retries": 0,
+    "responses_4xx": 0,
+    "responses_5xx": 0,
+    "total_ms": 0.0,
+}
+
+
+class PostgrestError(RuntimeError):
+    """Error base del gateway PostgREST."""
+
+
+class PostgrestConfigError(PostgrestError):
+    """Supabase no está configurado (URL o llaves faltantes)."""
+
+
+class PostgrestNetworkError(PostgrestError):
+    """No fue posible completar la petición (DNS, conexión, timeout)."""
+
+
+class PostgrestResponseError(PostgrestError):
+    """Supabase respondió con un estado HTTP de error."""
+
+    def __init__(
+        self,
+        status_code: int,
+        message: str,
+        *,
+        code: str | None = None,
+        hint: str | None = None,
+        body: str | None = None,
+    ) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.code = code
+        self.hint = hint
+        self.body = body
+
+    @property
+    def http_status(self) -> int:
+        """Estado a propagar al cliente (502 si Supabase no reportó un error válido)."""
+        return self.status_code if self.status_code >= 400 else 502
+
+    @classmethod
+    def from_response(cls, resp: httpx.Response, fallback: str) -> PostgrestResponseError:
+        """Extrae el mensaje más útil del cuerpo de error de PostgREST/GoTrue."""
+        detail: str | None = None
+        code: str | None = None
+        hint: str | None = None
+        try:
+            payload = resp.json()
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict):
+            detail = (
+                payload.get("message")
+                or payload.get("error_description")
+                or payload.get("error")
+                or payload.get("hint")
+            )
+            code = payload.get("code")
+            hint = payload.get("hint")
+        elif isinstance(payload, str):
+            detail = payload
+        if not detail:
+            detail = resp.text.strip() or fallback
+        return cls(
+            resp.status_code,
+            str(detail),
+            code=str(code) if code else None,
+            hint=str(hint) if hint else None,
+            body=resp.text,
+        )
+
+
+def content_range_total(header: str | None) -> int | None:
+    """Obtiene el total de una cabecera `Content-Range` (`0-24/120`)."""
+    if not header:
+        return None
+    try:
+        _range, total = header.split("/")
+    except ValueError:
+        return None
+    total = total.strip()
+    if not total or total == "*":
+        return None
+    try:
+        return int(total)
+    except ValueError:
+        return None
+
+
+def base_url() -> str:
+    if not settings.supabase_url:
+        raise PostgrestConfigError("Supabase no está configurado")
+    return settings.supabase_url.rstrip("/")
+
+
+def build_headers(
+    *,
+    token: str | None = None,
+    prefer: str | None = None,
+    with_body: bool = False,
+) -> dict[str, str]:
+    """Cabeceras para PostgREST.
+
+    Con `token` se reenvía el JWT del usuario (aplica RLS) junto con la anon key;
+    sin él se usa la service_role del backend.
+    """
+    headers: dict[str, str] = {"Accept": "application/json"}
+    if with_body:
+        headers["Content-Type"] = "application/json"
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+        anon = getattr(settings, "supabase_anon", None)
+        if anon:
+            headers["apikey"] = anon
+    elif settings.supabase_service_role:
+        headers["apikey"] = settings.supabase_service_role
+        headers["Authorization"] = f"Bearer {settings.supabase_service_role}"
+    else:
+        raise PostgrestConfigError("Falta SUPABASE_SERVICE_ROLE")
+    if prefer:
+        headers["Prefer"] = prefer
+    return headers
+
+
+def _record(response: httpx.Response | None, elapsed_ms: float) -> None:
+    _STATS["requests"] += 1
+    _STATS["total_ms"] += elapsed_ms
+    if response is None:
+        _STATS["network_errors"] += 1
+    elif response.status_code >= 500:
+        _STATS["responses_5xx"] += 1
+    elif response.status_code >= 400:
+        _STATS["responses_4xx"] += 1
+
+
+async def request(
+    method: str,
+    path: str,
+    *,
+    params: dict[str, str] | None = None,
+    json: Any = None,
+    token: str | None = None,
+    prefer: str | None = None,
+    timeout: float | None = None,
+) -> httpx.Response:
+    """Ejecuta una petición contra `{SUPABASE_URL}{path}` usando el pool compartido.
+
+    Retorna la respuesta tal cual (incluidos estados >= 400) para que cada
+    llamador decida cómo reportarla; sólo las fallas de red se elevan como
+    `PostgrestNetworkError`.
+    """
+    method = method.upper()
+    url = f"{base_url()}{path}"
+    headers = build_headers(token=token, prefer=prefer, with_body=json is not None)
+    attempts = 1
+    if method in _IDEMPOTENT_METHODS:
+        attempts += max(int(settings.supabase_read_retries or 0), 0)
+
+    client = supabase.get_client()
+    for attempt in range(1, attempts + 1):
+        start = time.perf_counter()
+        try:
+            response = await client.request(
+                method, url, headers=headers, params=params, json=json, timeout=timeout
+            )
+        except httpx.RequestError as exc:
+            _record(None, (time.perf_counter() - start) * 1000)
+            if attempt < attempts:
+                _STATS["retries"] += 1
+                logger.warning(
+                    "postgrest.retry",
+                    extra={"method": method, "path": path, "attempt": attempt, "error": str(exc)},
+                )
+                await asyncio.sleep(0.05 * attempt)
+                continue
+            raise PostgrestNetworkError(str(exc) or exc.__class__.__name__) from exc
+        _record(response, (time.perf_counter() - start) * 1000)
+        return response
+    raise PostgrestNetworkError("Sin respuesta de Supabase")  # pragma: no cover
+
+
+async def get(path: str, **kwargs: Any) -> httpx.Response:
+    return await request("GET", path, **kwargs)
+
+
+async def post(path: str, **kwargs: Any) -> httpx.Response:
+    return await request("POST", path, **kwargs)
+
+
+async def patch(path: str, **kwargs: Any) -> httpx.Response:
+    return await request("PATCH", path, **kwargs)
+
+
+async def delete(path: str, **kwargs: Any) -> httpx.Response:
+    return await request("DELETE", path, **kwargs)
+
+
+async def rpc(name: str, payload: dict[str, Any] | None = None, **kwargs: Any) -> httpx.Response:
+    """Invoca `POST /rest/v1/rpc/{name}`."""
+    return await request("POST", f"/rest/v1/rpc/{name}", json=payload, **kwargs)
+
+
+def stats() -> dict[str, float]:
+    """Contadores acumulados del gateway desde el arranque del proceso."""
+    snapshot = dict(_STATS)
+    requests = snapshot["requests"] or 0
+    snapshot["avg_ms"] = round(snapshot["total_ms"] / requests, 2) if requests else 0.0
+    snapshot["total_ms"] = round(snapshot["total_ms"], 2)
+    return snapshot
@@ -3,13 +3,13 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any
 
 import httpx
 
-from app.core.config import settings
 from app.core.logging import get_logger
+from app.services import inbox_events, postgrest
 
 logger = get_logger(__name__)
 
@@ -18,6 +18,59 @@ class StorageError(RuntimeError):
     """Errores de persistencia para servicios externos."""
 
 
+async def _request(
+    method: str,
+    path: str,
+    *,
+    action: str,
+    params: dict[str, str] | None = None,
+    json: Any = None,
+    prefer: str | None = None,
+    check: bool = True,
+) -> httpx.Response:
+    """Ejecuta la llamada con service_role vía gateway y traduce errores a `StorageError`.
+
+    `action` describe la operación en los mensajes ("registrar mensaje webchat").
+    Con `check=False` se devuelven también respuestas >= 400.
+    """
+    try:
+        response = await postgrest.request(method, path, params=params, json=json, prefer=prefer)
+    except postgrest.PostgrestConfigError as exc:
+        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)") from exc
+    except postgrest.PostgrestNetworkError as exc:
+        msg = f"Error de red al {action}: {exc}"
+        logger.exception(msg)
+        raise StorageError(msg) from exc
+
+    if check and response.status_code >= 400:
+        msg = (
+            f"Supabase respondió error al {action}"
+            f" (status={response.status_code}, body={response.text!r})"
+        )
+        logger.error(msg)
+        raise StorageError(msg)
+    return response
+
+
+def _manual_override_from_row(row: dict[str, Any]) -> bool:
+    ctrl = row.get("conversaciones_controles") or []
+    if isinstance(ctrl, list) and ctrl:
+        return bool(ctrl[0].get("manual_override"))
+    return False
+
+
+def _normalize_contact_row(row: dict[str, Any]) -> dict[str, Any]:
+    datos = row.get("contacto_datos")
+    if isinstance(datos, str):
+        try:
+            row["contacto_datos"] = json.loads(datos)
+        except json.JSONDecodeError:
+            row["contacto_datos"] = {}
+    elif datos is None:
+        row["contacto_datos"] = {}
+    return row
+
+
 async def register_webchat_message(
     *,
     session_id: str,
@@ -26,19 +79,12 @@ async def register_webchat_message(
     response_id: str | None = None,
     metadata: dict[str, Any] | None = None,
     inactivity_hours: int | None = None,
-) -> dict[str, str | None]:
-    """Invoca la función RPC `registrar_mensaje_webchat` y retorna IDs clave."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/rpc/registrar_mensaje_webchat"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
+) -> dict[str, Any]:
+    """Invoca la función RPC `registrar_mensaje_webchat` y retorna IDs clave.
+
+    Incluye el estado de la conversación (`contact_id`, `last_response_id`,
+    `manual_override`); con versiones previas de la RPC esas claves llegan en `None`.
+    """
     payload: dict[str, Any] = {
         "p_session_id": session_id,
         "p_author": author,
@@ -50,45 +96,43 @@ async def register_webchat_message(
     if inactivity_hours is not None:
         payload["p_inactivity_hours"] = inactivity_hours
 
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al registrar mensaje webchat: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al registrar mensaje webchat"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "POST",
+        "/rest/v1/rpc/registrar_mensaje_webchat",
+        action="registrar mensaje webchat",
+        json=payload,
+    )
 
     data = response.json()
     if not isinstance(data, list) or not data:
         raise StorageError(f"Respuesta inesperada registrar_mensaje_webchat: {data!r}")
     row = data[0]
+    now = datetime.now(timezone.utc).isoformat()
+    inbox_events.publish(
+        {
+            "type": "message",
+            "conversation_id": row.get("conversacion_id"),
+            "message_id": row.get("mensaje_id"),
+            "canal": "webchat",
+            "preview": content[:160],
+            "preview_direccion": "entrante" if author == "user" else "saliente",
+            "preview_ts": now,
+            "ultimo_mensaje_en": now,
+            "no_leidos_incremento": 1 if author == "user" else 0,
+        }
+    )
     return {
         "conversation_id": row.get("conversacion_id"),
         "message_id": row.get("mensaje_id"),
         "openai_conversation_id": row.get("conversacion_openai_id"),
+        "contact_id": row.get("contacto_id"),
+        "last_response_id": row.get("last_response_id"),
+        "manual_override": row.get("manual_override"),
     }
 
 
 async def fetch_webchat_conversation(conversation_id: str) -> dict[str, Any]:
     """Recupera metadatos de la conversación incluyendo control manual."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/conversaciones"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Accept": "application/json",
-    }
     params = {
         "id": f"eq.{conversation_id}",
         "select": (
@@ -97,74 +141,41 @@ async def fetch_webchat_conversation(conversation_id: str) -> dict[str, Any]:
         ),
         "limit": "1",
     }
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=headers, params=params)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar conversación webchat: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al consultar conversación webchat"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "GET",
+        "/rest/v1/conversaciones",
+        action="consultar conversación webchat",
+        params=params,
+    )
 
     data = response.json() or []
     if not isinstance(data, list) or not data:
         raise StorageError(f"Conversación {conversation_id} no encontrada")
     row = data[0]
-    ctrl = row.get("conversaciones_controles") or []
-    manual_override = False
-    if isinstance(ctrl, list) and ctrl:
-        manual_override = bool(ctrl[0].get("manual_override"))
     return {
         "id": row.get("id"),
         "contact_id": row.get("contacto_id"),
         "channel": row.get("canal"),
         "openai_conversation_id": row.get("conversacion_openai_id"),
         "last_response_id": row.get("last_response_id"),
-        "manual_override": manual_override,
+        "manual_override": _manual_override_from_row(row),
     }
 
 
 async def get_webchat_contact_id(session_id: str) -> str | None:
     """Devuelve el contacto asociado a un session_id para el canal webchat."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Accept": "application/json",
-    }
-
-    idents_url = f"{base_url}/rest/v1/identidades_canal"
     ident_params = {
         "select": "contacto_id",
         "canal": "eq.webchat",
         "id_externo": f"eq.{session_id}",
         "limit": "1",
     }
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            ident_resp = await client.get(idents_url, headers=headers, params=ident_params)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al resolver contacto webchat: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if ident_resp.status_code >= 400:
-        msg = (
-            "Supabase respondió error al consultar identidades de canal"
-            f" (status={ident_resp.status_code}, body={ident_resp.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    ident_resp = await _request(
+        "GET",
+        "/rest/v1/identidades_canal",
+        action="resolver contacto webchat",
+        params=ident_params,
+    )
 
     ident_data = ident_resp.json() or []
     if not isinstance(ident_data, list) or not ident_data:
@@ -179,17 +190,6 @@ async def resolve_webchat_conversation_from_session(session_id: str) -> dict[str
     if not contact_id:
         return None
 
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Accept": "application/json",
-    }
-
-    conv_url = f"{base_url}/rest/v1/conversaciones"
     conv_params = {
         "select": (
             "id,contacto_id,canal,conversacion_openai_id,last_response_id,"
@@ -200,69 +200,36 @@ async def resolve_webchat_conversation_from_session(session_id: str) -> dict[str
         "order": "iniciada_en.desc",
         "limit": "1",
     }
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            conv_resp = await client.get(conv_url, headers=headers, params=conv_params)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar conversación webchat por contacto: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if conv_resp.status_code >= 400:
-        msg = (
-            "Supabase respondió error al consultar conversaciones webchat"
-            f" (status={conv_resp.status_code}, body={conv_resp.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    conv_resp = await _request(
+        "GET",
+        "/rest/v1/conversaciones",
+        action="consultar conversaciones webchat por contacto",
+        params=conv_params,
+    )
 
     conv_data = conv_resp.json() or []
     if not isinstance(conv_data, list) or not conv_data:
         return None
     row = conv_data[0]
-    ctrl = row.get("conversaciones_controles") or []
-    manual_override = False
-    if isinstance(ctrl, list) and ctrl:
-        manual_override = bool(ctrl[0].get("manual_override"))
     return {
         "id": row.get("id"),
         "contact_id": row.get("contacto_id"),
         "channel": row.get("canal"),
         "openai_conversation_id": row.get("conversacion_openai_id"),
         "last_response_id": row.get("last_response_id"),
-        "manual_override": manual_override,
+        "manual_override": _manual_override_from_row(row),
     }
 
 
 async def record_webchat_session_closure(session_id: str) -> None:
     """Persiste el cierre explícito de una sesión webchat."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/webchat_session_closures"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-        "Prefer": "resolution=merge-duplicates",
-    }
-    payload = {"session_id": session_id}
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al registrar cierre de sesión webchat: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al registrar cierre de sesión webchat"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    await _request(
+        "POST",
+        "/rest/v1/webchat_session_closures",
+        action="registrar cierre de sesión webchat",
+        json={"session_id": session_id},
+        prefer="resolution=merge-duplicates",
+    )
 
 
 async def record_webchat_visit(
@@ -280,17 +247,6 @@ async def record_webchat_visit(
     landing_url: str | None = None,
 ) -> None:
     """Actualiza/crea el registro del visitante con metadata adicional."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/rpc/record_webchat_visitante"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-    }
-
     payload: dict[str, Any] = {"p_session_id": session_id}
     if ip:
         payload["p_ip"] = ip
@@ -313,57 +269,29 @@ async def record_webchat_visit(
     if landing_url:
         payload["p_landing_url"] = landing_url
 
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al registrar visitante webchat: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al registrar visitante webchat"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    await _request(
+        "POST",
+        "/rest/v1/rpc/record_webchat_visitante",
+        action="registrar visitante webchat",
+        json=payload,
+    )
 
 
 async def update_conversation(conversation_id: str, patch: dict[str, Any]) -> dict[str, Any]:
     """Actualiza campos de una conversación."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/conversaciones"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-        "Prefer": "return=representation",
-    }
-    params = {"id": f"eq.{conversation_id}", "limit": "1"}
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.patch(url, headers=headers, params=params, json=patch)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al actualizar conversación: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al actualizar conversación"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "PATCH",
+        "/rest/v1/conversaciones",
+        action="actualizar conversación",
+        params={"id": f"eq.{conversation_id}", "limit": "1"},
+        json=patch,
+        prefer="return=representation",
+    )
 
     rows = response.json() or []
     if not rows:
         raise StorageError("No se encontró la conversación a actualizar")
+    inbox_events.publish({"type": "conversation", "conversation_id": conversation_id, **patch})
     return rows[0]
 
 
@@ -375,72 +303,34 @@ async def upsert_conversation_insights(
     siguiente_accion: str | None = None,
 ) -> None:
     """Actualiza o inserta insights de conversación."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/conversaciones_insights"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-        "Prefer": "resolution=merge-duplicates",
-    }
     payload = {
         "conversacion_id": conversation_id,
         "resumen": resumen,
         "intencion": intencion,
         "siguiente_accion": siguiente_accion,
     }
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al guardar insights de conversación: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al guardar insights de conversación"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    await _request(
+        "POST",
+        "/rest/v1/conversaciones_insights",
+        action="guardar insights de conversación",
+        json=payload,
+        prefer="resolution=merge-duplicates",
+    )
 
 
 async def get_manual_override(conversation_id: str) -> bool:
     """Indica si la conversación está en modo manual (sin asistente)."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/conversaciones_controles"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Accept": "application/json",
-    }
     params = {
         "select": "manual_override",
         "conversacion_id": f"eq.{conversation_id}",
         "limit": "1",
     }
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=headers, params=params)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar controles de conversación: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al consultar controles de conversación"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "GET",
+        "/rest/v1/conversaciones_controles",
+        action="consultar controles de conversación",
+        params=params,
+    )
 
     data = response.json() or []
     if not isinstance(data, list) or not data:
@@ -453,36 +343,18 @@ async def fetch_manual_overrides(conversation_ids: list[str]) -> dict[str, bool]
     """Obtiene flags manual_override para un conjunto de conversaciones."""
     if not conversation_ids:
         return {}
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/conversaciones_controles"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Accept": "application/json",
-    }
+
     ids = ",".join(str(cid) for cid in conversation_ids)
     params = {
         "select": "conversacion_id,manual_override",
         "conversacion_id": f"in.({ids})",
     }
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=headers, params=params)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar controles de conversación: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al consultar controles de conversación"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "GET",
+        "/rest/v1/conversaciones_controles",
+        action="consultar controles de conversación",
+        params=params,
+    )
 
     data = response.json() or []
     if not isinstance(data, list):
@@ -497,36 +369,20 @@ async def fetch_manual_overrides(conversation_ids: list[str]) -> dict[str, bool]
 
 async def set_manual_override(conversation_id: str, manual: bool) -> None:
     """Activa o desactiva el modo manual para una conversación."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/conversaciones_controles"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-        "Prefer": "return=representation,resolution=merge-duplicates",
-    }
     payload = {
         "conversacion_id": conversation_id,
         "manual_override": manual,
     }
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al actualizar controles de conversación: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al actualizar controles de conversación"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    await _request(
+        "POST",
+        "/rest/v1/conversaciones_controles",
+        action="actualizar controles de conversación",
+        json=payload,
+        prefer="return=representation,resolution=merge-duplicates",
+    )
+    inbox_events.publish(
+        {"type": "manual", "conversation_id": conversation_id, "manual_override": manual}
+    )
 
 
 async def fetch_recent_messages(*, conversation_id: str, limit: int = 8) -> list[dict[str, Any]]:
@@ -534,53 +390,61 @@ async def fetch_recent_messages(*, conversation_id: str, limit: int = 8) -> list
 
     Retorna elementos con claves: direccion (entrante/saliente), texto, creado_en, datos.
     """
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/mensajes"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-    }
     params = {
         "select": "id,direccion,texto,creado_en,datos",
         "conversacion_id": f"eq.{conversation_id}",
         "order": "creado_en.asc",
         "limit": str(limit),
     }
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=headers, params=params)
-    except httpx.RequestError as exc:  # pragma: no cover
-        msg = f"Error de red al consultar mensajes: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al obtener mensajes"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "GET",
+        "/rest/v1/mensajes",
+        action="obtener mensajes",
+        params=params,
+    )
     data = response.json() or []
     if not isinstance(data, list):
         return []
     return data  # type: ignore[return-value]
 
 
+async def fetch_webchat_history(
+    session_id: str,
+    *,
+    limit: int = 100,
+    since: datetime | None = None,
+) -> dict[str, Any] | None:
+    """Historial reciente de la sesión en una sola llamada (RPC `webchat_historial`).
+
+    Retorna `None` si la sesión no tiene conversación; de lo contrario
+    `conversation_id`, `manual_override` y `messages` (orden cronológico, con las
+    mismas claves que `fetch_recent_messages`). Con `since` sólo incluye mensajes
+    posteriores a esa marca.
+    """
+    payload: dict[str, Any] = {"p_session_id": session_id, "p_limit": limit}
+    if since is not None:
+        payload["p_since"] = since.isoformat()
+    response = await _request(
+        "POST",
+        "/rest/v1/rpc/webchat_historial",
+        action="obtener historial webchat",
+        json=payload,
+    )
+    data = response.json()
+    if not data:
+        return None
+    if not isinstance(data, dict):
+        raise StorageError(f"Respuesta inesperada webchat_historial: {data!r}")
+    messages = data.get("mensajes")
+    return {
+        "conversation_id": data.get("conversacion_id"),
+        "manual_override": bool(data.get("manual_override")),
+        "messages": messages if isinstance(messages, list) else [],
+    }
+
+
 async def fetch_contact(contact_id: str) -> dict[str, Any]:
     """Obtiene la representación del contacto indicado."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/contactos"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Accept": "application/json",
-    }
     params = {
         "select": (
             "id,nombre_completo,correo,telefono_e164,company_name,notes,necesidad_proposito,"
@@ -589,82 +453,37 @@ async def fetch_contact(contact_id: str) -> dict[str, Any]:
         "id": f"eq.{contact_id}",
         "limit": "1",
     }
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=headers, params=params)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar contacto: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al obtener contacto"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "GET",
+        "/rest/v1/contactos",
+        action="obtener contacto",
+        params=params,
+    )
 
     rows = response.json() or []
     if not rows:
         raise StorageError("Contacto no encontrado")
-    row = rows[0]
-    datos = row.get("contacto_datos")
-    if isinstance(datos, str):
-        try:
-            row["contacto_datos"] = json.loads(datos)
-        except json.JSONDecodeError:
-            row["contacto_datos"] = {}
-    elif datos is None:
-        row["contacto_datos"] = {}
-    return row
+    return _normalize_contact_row(rows[0])
 
 
 async def update_contact(contact_id: str, patch: dict[str, Any]) -> dict[str, Any]:
     """Actualiza campos del contacto indicado y devuelve la fila resultante."""
     if not patch:
         raise StorageError("No se proporcionaron datos para actualizar el contacto")
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/contactos"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-        "Prefer": "return=representation",
-    }
-    params = {"id": f"eq.{contact_id}", "limit": "1"}
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.patch(url, headers=headers, params=params, json=patch)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al actualizar contacto: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
 
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al actualizar contacto"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "PATCH",
+        "/rest/v1/contactos",
+        action="actualizar contacto",
+        params={"id": f"eq.{contact_id}", "limit": "1"},
+        json=patch,
+        prefer="return=representation",
+    )
 
     rows = response.json() or []
     if not rows:
         raise StorageError("Contacto no encontrado o sin cambios")
-    row = rows[0]
-    datos = row.get("contacto_datos")
-    if isinstance(datos, str):
-        try:
-            row["contacto_datos"] = json.loads(datos)
-        except json.JSONDecodeError:
-            row["contacto_datos"] = {}
-    elif datos is None:
-        row["contacto_datos"] = {}
-    return row
+    return _normalize_contact_row(rows[0])
 
 
 async def fetch_visitantes_estados(
@@ -673,37 +492,18 @@ async def fetch_visitantes_estados(
     date_to: datetime | None = None,
 ) -> dict[str, Any]:
     """Recupera totales de visitantes sin chat agregados por estado."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/rpc/panel_visitantes_sin_chat_estados"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-    }
     payload: dict[str, Any] = {}
     if date_from:
         payload["p_from"] = date_from.isoformat()
     if date_to:
         payload["p_to"] = date_to.isoformat()
 
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload or None)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar visitantes sin chat por estado: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al consultar visitantes sin chat por estado"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "POST",
+        "/rest/v1/rpc/panel_visitantes_sin_chat_estados",
+        action="consultar visitantes sin chat por estado",
+        json=payload or None,
+    )
 
     data = response.json()
     if not isinstance(data, dict):
@@ -718,37 +518,18 @@ async def fetch_visitantes_municipios(
     date_to: datetime | None = None,
 ) -> dict[str, Any]:
     """Recupera totales de visitantes sin chat agregados por municipio."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/rpc/panel_visitantes_sin_chat_municipios"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-    }
     payload: dict[str, Any] = {"p_estado": state_code}
     if date_from:
         payload["p_from"] = date_from.isoformat()
     if date_to:
         payload["p_to"] = date_to.isoformat()
 
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar visitantes sin chat por municipio: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al consultar visitantes sin chat por municipio"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "POST",
+        "/rest/v1/rpc/panel_visitantes_sin_chat_municipios",
+        action="consultar visitantes sin chat por municipio",
+        json=payload,
+    )
 
     data = response.json()
     if not isinstance(data, dict):
@@ -762,37 +543,18 @@ async def fetch_visitantes_paises(
     date_to: datetime | None = None,
 ) -> dict[str, Any]:
     """Recupera totales de visitantes agrupados por país."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/rpc/panel_visitantes_world_paises"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-    }
     payload: dict[str, Any] = {}
     if date_from:
         payload["p_from"] = date_from.isoformat()
     if date_to:
         payload["p_to"] = date_to.isoformat()
 
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload or None)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar visitantes por país: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al consultar visitantes por país"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "POST",
+        "/rest/v1/rpc/panel_visitantes_world_paises",
+        action="consultar visitantes por país",
+        json=payload or None,
+    )
 
     data = response.json()
     if not isinstance(data, dict):
@@ -813,19 +575,11 @@ async def fetch_webchat_visitas_detalle(
     offset: int = 0,
 ) -> dict[str, Any]:
     """Consulta visitas (con y sin chat) del webchat para el panel."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
     limit = max(1, min(limit, 500))
     offset = max(0, offset)
 
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/rpc/panel_webchat_visitas_detalle"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-    }
+    path = "/rest/v1/rpc/panel_webchat_visitas_detalle"
+    action = "consultar visitas webchat"
     country_value = country.strip() if isinstance(country, str) else country
     if isinstance(country_value, str) and not country_value:
         country_value = None
@@ -850,13 +604,7 @@ async def fetch_webchat_visitas_detalle(
     if search:
         payload["p_search"] = search
 
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar visitas webchat: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
+    response = await _request("POST", path, action=action, json=payload, check=False)
 
     if response.status_code == 400:
         try:
@@ -872,17 +620,11 @@ async def fetch_webchat_visitas_detalle(
             retry_payload = dict(payload)
             retry_payload["p_country"] = country or None
             retry_payload["p_city"] = city or None
-            try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    response = await client.post(url, headers=headers, json=retry_payload)
-            except httpx.RequestError as exc:
-                msg = f"Error de red al consultar visitas webchat: {exc}"
-                logger.exception(msg)
-                raise StorageError(msg) from exc
+            response = await _request("POST", path, action=action, json=retry_payload, check=False)
 
     if response.status_code >= 400:
         msg = (
-            "Supabase respondió error al consultar visitas webchat"
+            f"Supabase respondió error al {action}"
             f" (status={response.status_code}, body={response.text!r})"
         )
         logger.error(msg)
@@ -936,16 +678,6 @@ async def fetch_leads_states(
     date_to: datetime | None = None,
 ) -> dict[str, Any]:
     """Recupera totales de leads agrupados por estado."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/rpc/panel_leads_geo_estados"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-    }
     payload: dict[str, Any] = {}
     if channels:
         payload["p_canales"] = ",".join(channels)
@@ -954,21 +686,12 @@ async def fetch_leads_states(
     if date_to:
         payload["p_to"] = date_to.isoformat()
 
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload or None)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar leads por estado: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al consultar leads por estado"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "POST",
+        "/rest/v1/rpc/panel_leads_geo_estados",
+        action="consultar leads por estado",
+        json=payload or None,
+    )
 
     data = response.json()
     if not isinstance(data, dict):
@@ -984,16 +707,6 @@ async def fetch_leads_municipios(
     date_to: datetime | None = None,
 ) -> dict[str, Any]:
     """Recupera totales de leads agrupados por municipio."""
-    if not settings.supabase_url or not settings.supabase_service_role:
-        raise StorageError("Supabase no está configurado (SUPABASE_URL/SERVICE_ROLE)")
-
-    base_url = settings.supabase_url.rstrip("/")
-    url = f"{base_url}/rest/v1/rpc/panel_leads_geo_municipios"
-    headers = {
-        "apikey": settings.supabase_service_role,
-        "Authorization": f"Bearer {settings.supabase_service_role}",
-        "Content-Type": "application/json",
-    }
     payload: dict[str, Any] = {"p_estado": state_code}
     if channels:
         payload["p_canales"] = ",".join(channels)
@@ -1002,21 +715,12 @@ async def fetch_leads_municipios(
     if date_to:
         payload["p_to"] = date_to.isoformat()
 
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-    except httpx.RequestError as exc:
-        msg = f"Error de red al consultar leads por municipio: {exc}"
-        logger.exception(msg)
-        raise StorageError(msg) from exc
-
-    if response.status_code >= 400:
-        msg = (
-            "Supabase respondió error al consultar leads por municipio"
-            f" (status={response.status_code}, body={response.text!r})"
-        )
-        logger.error(msg)
-        raise StorageError(msg)
+    response = await _request(
+        "POST",
+        "/rest/v1/rpc/panel_leads_geo_municipios",
+        action="consultar leads por municipio",
+        json=payload,
+    )
 
     data = response.json()
     if not isinstance(data, dict):
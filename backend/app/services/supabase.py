@@ -0,0 +1,137 @@
+"""Cliente HTTP compartido para Supabase (PostgREST/RPC).
+
+Mantiene un único `httpx.AsyncClient` por proceso para reutilizar conexiones
+(DNS/TCP/TLS) entre llamadas. Se crea en el `lifespan` de FastAPI y se cierra
+al apagar la aplicación; si se usa fuera de ese ciclo (tests, scripts) se crea
+de forma perezosa en el primer uso.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+from typing import Any
+
+import httpx
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def _http2_available() -> bool:
+    """Indica si el paquete opcional `h2` está instalado (requerido por httpx)."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class SupabaseClient:
+    """Envoltura delgada sobre `httpx.AsyncClient` con pool configurable."""
+
+    def __init__(
+        self,
+        *,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        timeout: float,
+        connect_timeout: float,
+        http2: bool,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.http2 = bool(http2 and _http2_available())
+        if http2 and not self.http2:
+            logger.warning("supabase.http2_unavailable", extra={"hint": "pip install httpx[http2]"})
+        self.default_timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            timeout=self.default_timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            transport=transport,
+        )
+
+    @property
+    def is_closed(self) -> bool:
+        return self._client.is_closed
+
+    def _timeout(self, timeout: float | httpx.Timeout | None) -> httpx.Timeout:
+        if timeout is None:
+            return self.default_timeout
+        if isinstance(timeout, httpx.Timeout):
+            return timeout
+        return httpx.Timeout(timeout, connect=self.default_timeout.connect)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        params: dict[str, str] | None = None,
+        json: Any = None,
+        timeout: float | httpx.Timeout | None = None,
+    ) -> httpx.Response:
+        """Ejecuta la petición reutilizando el pool; `timeout` aplica sólo a esta operación."""
+        return await self._client.request(
+            method,
+            url,
+            headers=headers,
+            params=params,
+            json=json,
+            timeout=self._timeout(timeout),
+        )
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_CLIENT: SupabaseClient | None = None
+
+
+def _build_client() -> SupabaseClient:
+    return SupabaseClient(
+        max_connections=settings.supabase_pool_max_connections,
+        max_keepalive_connections=settings.supabase_pool_max_keepalive,
+        keepalive_expiry=settings.supabase_keepalive_expiry_seconds,
+        timeout=settings.supabase_timeout_seconds,
+        connect_timeout=settings.supabase_connect_timeout_seconds,
+        http2=settings.supabase_http2,
+    )
+
+
+def get_client() -> SupabaseClient:
+    """Retorna el cliente compartido, creándolo si aún no existe."""
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = _build_client()
+    return _CLIENT
+
+
+async def startup() -> None:
+    """Inicializa el pool al arrancar la aplicación."""
+    client = get_client()
+    logger.info("supabase.client_started", extra={"http2": client.http2})
+
+
+async def shutdown() -> None:
+    """Cierra las conexiones abiertas del pool compartido."""
+    global _CLIENT
+    client, _CLIENT = _CLIENT, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+        logger.info("supabase.client_closed")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Genera las variantes simplificadas (`bajo`/`medio`) de los catálogos del mapa.
+
+Lee los GeoJSON originales de `app/data/geo` y escribe en
+`app/data/geo/variantes/<nivel>/` archivos con el mismo nombre relativo, con la
+geometría simplificada preservando fronteras compartidas y las coordenadas
+redondeadas. Con `--topojson` también escribe un `.topojson` junto a cada uno.
+
+Uso (desde `backend/`):
+
+    python scripts/build_geo_variants.py
+    python scripts/build_geo_variants.py --niveles bajo --catalogos estados paises
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Sequence
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.data import data_path  # noqa: E402
+from app.services import geo_simplify, leads_geo  # noqa: E402
+
+# Propiedades que consume el panel; el resto sólo infla el archivo.
+WORLD_PROPERTIES = ("ISO_A2", "ISO_A3", "NAME", "NAME_ES")
+
+# Niveles que se generan por catálogo. Las tolerancias de `medio` están pensadas
+# para la vista de un estado: sobre el catálogo nacional de estados apenas quitan
+# vértices (~5%), así que ahí `medio` se sirve desde el original.
+NIVELES_POR_CATALOGO: dict[str, tuple[str, ...]] = {
+    "estados": ("bajo",),
+    "paises": ("bajo", "medio"),
+    "municipios": ("bajo", "medio"),
+}
+
+Catalog = tuple[str, Sequence[str] | None, tuple[str, ...]]
+
+
+def _catalogs(selected: Sequence[str]) -> list[Catalog]:
+    """Rutas relativas a `app/data/geo` con sus propiedades a conservar y sus niveles."""
+    out: list[Catalog] = []
+    if "estados" in selected:
+        out.append((leads_geo.STATES_GEOJSON, None, NIVELES_POR_CATALOGO["estados"]))
+    if "paises" in selected:
+        out.append((leads_geo.WORLD_GEOJSON, WORLD_PROPERTIES, NIVELES_POR_CATALOGO["paises"]))
+    if "municipios" in selected:
+        manifest = json.loads(data_path("geo", "municipios", "manifest.json").read_text("utf-8"))
+        for entry in manifest.values():
+            if isinstance(entry, dict) and entry.get("path"):
+                out.append(
+                    (f"municipios/{entry['path']}", None, NIVELES_POR_CATALOGO["municipios"])
+                )
+    return out
+
+
+def _dump(payload: dict[str, Any], destination: Path) -> int:
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    destination.write_text(body, encoding="utf-8")
+    return len(body.encode("utf-8"))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Simplifica y cuantiza los catálogos GeoJSON del mapa del panel."
+    )
+    parser.add_argument(
+        "--niveles",
+        nargs="+",
+        choices=sorted(geo_simplify.NIVELES),
+        default=sorted(geo_simplify.NIVELES),
+        help="Niveles de detalle a generar (default: los de cada catálogo).",
+    )
+    parser.add_argument(
+        "--catalogos",
+        nargs="+",
+        choices=["estados", "paises", "municipios"],
+        default=["estados", "paises", "municipios"],
+        help="Catálogos a procesar (default: todos).",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=str(data_path(*leads_geo.VARIANTS_DIR.split("/"))),
+        help="Directorio raíz de salida (default: app/data/geo/variantes).",
+    )
+    parser.add_argument(
+        "--topojson",
+        action="store_true",
+        help="Escribe además una versión TopoJSON cuantizada de cada catálogo.",
+    )
+    parser.add_argument("--quiet", action="store_true", help="Reduce el output a sólo errores.")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    output_dir = Path(args.output_dir).expanduser().resolve()
+
+    for relative, properties, niveles in _catalogs(args.catalogos):
+        source = data_path("geo", *relative.split("/"))
+        if not source.exists():
+            print(f"[build_geo_variants] AVISO: no existe {source}, se omite.", file=sys.stderr)
+            continue
+        collection = json.loads(source.read_text("utf-8"))
+        original = geo_simplify.vertex_count(collection)
+        for nombre in args.niveles:
+            if nombre not in niveles:
+                continue
+            nivel = geo_simplify.NIVELES[nombre]
+            target = output_dir / nombre / relative
+            simplified = geo_simplify.simplify_geojson(collection, nivel, properties=properties)
+            size = _dump(simplified, target)
+            if args.topojson:
+                topo = geo_simplify.to_topojson(
+                    collection, nivel, name=Path(relative).stem, properties=properties
+                )
+                _dump(topo, target.with_suffix(".topojson"))
+            if not args.quiet:
+                print(
+                    f"[build_geo_variants] {nombre}/{relative}: "
+                    f"{original} → {geo_simplify.vertex_count(simplified)} vértices, "
+                    f"{source.stat().st_size} → {size} bytes"
+                )
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover - script manual
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Pruebas de la caché de specs de asistentes."""
+
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app.assistants import specs
+
+
+class _FakeAssistants:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.fail = False
+        self.model = "gpt-4.1"
+
+    async def retrieve(self, *, assistant_id: str) -> Any:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("OpenAI no disponible")
+        dump = {"model": self.model, "instructions": "Sé breve", "tools": []}
+        return SimpleNamespace(model_dump=lambda: dump)
+
+
+@pytest.fixture(name="client")
+def fixture_client() -> Any:
+    specs.invalidate()
+    yield SimpleNamespace(beta=SimpleNamespace(assistants=_FakeAssistants()))
+    specs.invalidate()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch(client: Any) -> None:
+    results = await asyncio.gather(*(specs.get_spec(client, "asst_1") for _ in range(5)))
+
+    assert client.beta.assistants.calls == 1
+    assert {result.model for result in results} == {"gpt-4.1"}
+
+
+@pytest.mark.asyncio
+async def test_stale_spec_is_served_while_refreshing(
+    monkeypatch: pytest.MonkeyPatch, client: Any
+) -> None:
+    monkeypatch.setattr(specs.settings, "openai_assistant_spec_ttl_seconds", 0.0)
+    assistants = client.beta.assistants
+    await specs.get_spec(client, "asst_1")
+
+    assistants.fail = True
+    stale = await specs.get_spec(client, "asst_1")
+    await asyncio.gather(*specs._REFRESHES.values())
+
+    assert stale.model == "gpt-4.1"
+    assert assistants.calls == 2
+    # Tras el fallo se conserva la última spec válida y no se reintenta de inmediato.
+    assert (await specs.get_spec(client, "asst_1")).model == "gpt-4.1"
+    assert not specs._REFRESHES
+
+    assistants.fail = False
+    assistants.model = "gpt-4.1-mini"
+    specs._SPECS["asst_1"].refresh_at = 0.0
+    await specs.get_spec(client, "asst_1")
+    await asyncio.gather(*specs._REFRESHES.values())
+
+    assert (await specs.get_spec(client, "asst_1")).model == "gpt-4.1-mini"
+
+
+@pytest.mark.asyncio
+async def test_startup_preloads_registered_assistants(
+    monkeypatch: pytest.MonkeyPatch, client: Any
+) -> None:
+    monkeypatch.setattr(specs.settings, "openai_assistant_id", "asst_landing")
+    monkeypatch.setattr(specs.openai_service, "get_assistant_client", lambda: client)
+
+    await specs.startup()
+    assert specs._PRELOAD is not None
+    await specs._PRELOAD
+
+    assert "asst_landing" in specs._SPECS
+    assert client.beta.assistants.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_startup_does_not_wait_for_slow_openai(
+    monkeypatch: pytest.MonkeyPatch, client: Any
+) -> None:
+    monkeypatch.setattr(specs.settings, "openai_assistant_id", "asst_landing")
+    monkeypatch.setattr(specs.openai_service, "get_assistant_client", lambda: client)
+    hang = asyncio.Event()
+
+    async def slow_retrieve(*, assistant_id: str) -> Any:
+        await hang.wait()
+
+    monkeypatch.setattr(client.beta.assistants, "retrieve", slow_retrieve)
+
+    await asyncio.wait_for(specs.startup(), timeout=0.5)
+    assert "asst_landing" not in specs._SPECS
+
+    await specs.shutdown()
+    assert specs._PRELOAD is None
@@ -0,0 +1,86 @@
+"""Historial del widget: una sola RPC, ETag y cursor `since`."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from app.channels.webchat import service
+
+_MESSAGES = [
+    {
+        "id": "m-1",
+        "direccion": "entrante",
+        "texto": "hola",
+        "creado_en": "2025-11-25T10:00:00+00:00",
+        "datos": {"author": "user"},
+    },
+    {
+        "id": "m-2",
+        "direccion": "saliente",
+        "texto": "¡Hola! ¿En qué te ayudo?",
+        "creado_en": "2025-11-25T10:00:02+00:00",
+        "datos": None,
+    },
+]
+
+
+@pytest.mark.asyncio
+async def test_history_supports_etag_and_since(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    calls: list[dict[str, Any]] = []
+
+    async def fake_history(session_id: str, **kwargs: Any) -> dict[str, Any]:
+        calls.append({"session_id": session_id, **kwargs})
+        since = kwargs.get("since")
+        messages = [] if since is not None else _MESSAGES
+        return {"conversation_id": "conv-1", "manual_override": False, "messages": messages}
+
+    monkeypatch.setattr(service.storage, "fetch_webchat_history", fake_history)
+
+    first = await async_client.get("/webchat/messages", params={"session_id": "sess-1234"})
+
+    assert first.status_code == 200
+    body = first.json()
+    assert [message["id"] for message in body["messages"]] == ["m-1", "m-2"]
+    assert body["cursor"].startswith("2025-11-25T10:00:02")
+    etag = first.headers["etag"]
+
+    unchanged = await async_client.get(
+        "/webchat/messages",
+        params={"session_id": "sess-1234"},
+        headers={"If-None-Match": etag},
+    )
+
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["etag"] == etag
+
+    delta = await async_client.get(
+        "/webchat/messages", params={"session_id": "sess-1234", "since": body["cursor"]}
+    )
+
+    assert delta.status_code == 200
+    assert delta.json()["messages"] == []
+    assert delta.json()["cursor"] == body["cursor"]
+    assert calls[-1]["since"] is not None
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_history_without_conversation(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    async def fake_history(session_id: str, **kwargs: Any) -> None:
+        return None
+
+    monkeypatch.setattr(service.storage, "fetch_webchat_history", fake_history)
+
+    response = await async_client.get("/webchat/messages", params={"session_id": "sess-1234"})
+
+    assert response.status_code == 200
+    assert response.json()["conversation_id"] is None
+    assert response.json()["messages"] == []
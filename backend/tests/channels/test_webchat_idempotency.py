@@ -0,0 +1,127 @@
+"""Deduplicación de reintentos del widget por client_message_id."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.channels.webchat import schemas, service
+
+
+@pytest.fixture(autouse=True)
+def _clear_responses() -> Any:
+    service._RESPONSES.clear()
+    yield
+    service._RESPONSES.clear()
+
+
+@pytest.mark.asyncio
+async def test_duplicates_share_in_flight_and_stored_response(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    calls = 0
+
+    async def fake_handle(
+        payload: schemas.MessageRequest, *, request: Any = None
+    ) -> schemas.MessageResponse:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return schemas.MessageResponse(
+            reply=f"respuesta {calls}",
+            metadata=schemas.MessageMetadata(client_message_id=payload.client_message_id),
+        )
+
+    monkeypatch.setattr(service, "_handle_message", fake_handle)
+    payload = schemas.MessageRequest(
+        session_id="sess-1234", author="user", content="hola", client_message_id="m-1"
+    )
+
+    first, retry = await asyncio.gather(
+        service.handle_message(payload), service.handle_message(payload)
+    )
+    late_retry = await service.handle_message(payload)
+    other = await service.handle_message(payload.model_copy(update={"client_message_id": "m-2"}))
+
+    assert calls == 2
+    assert first.reply == retry.reply == late_retry.reply == "respuesta 1"
+    assert first is not retry
+    assert other.reply == "respuesta 2"
+
+
+@pytest.mark.asyncio
+async def test_messages_without_client_id_are_not_deduplicated(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    calls = 0
+
+    async def fake_handle(
+        payload: schemas.MessageRequest, *, request: Any = None
+    ) -> schemas.MessageResponse:
+        nonlocal calls
+        calls += 1
+        return schemas.MessageResponse(reply="ok", metadata=schemas.MessageMetadata())
+
+    monkeypatch.setattr(service, "_handle_message", fake_handle)
+    payload = schemas.MessageRequest(session_id="sess-1234", author="user", content="hola")
+
+    await service.handle_message(payload)
+    await service.handle_message(payload)
+
+    assert calls == 2
+
+
+async def _collect(events: Any) -> list[str]:
+    return [chunk async for chunk in events]
+
+
+@pytest.mark.asyncio
+async def test_stream_retries_join_the_in_flight_turn(monkeypatch: pytest.MonkeyPatch) -> None:
+    prepared = 0
+    release = asyncio.Event()
+
+    async def fake_prepare(
+        payload: schemas.MessageRequest, *, request: Any = None
+    ) -> service.PreparedTurn:
+        nonlocal prepared
+        prepared += 1
+        return service.PreparedTurn(
+            payload=payload,
+            metadata=schemas.MessageMetadata(client_message_id=payload.client_message_id),
+        )
+
+    async def fake_turn_events(turn: service.PreparedTurn) -> Any:
+        yield "metadata", turn.metadata.model_dump(mode="json")
+        yield "delta", {"text": "hola"}
+        await release.wait()
+        response = schemas.MessageResponse(reply="hola", metadata=turn.metadata)
+        service._remember_response(turn.payload, response)
+        yield "done", response
+
+    monkeypatch.setattr(service, "prepare_turn", fake_prepare)
+    monkeypatch.setattr(service, "_turn_events", fake_turn_events)
+    payload = schemas.MessageRequest(
+        session_id="sess-1234", author="user", content="hola", client_message_id="m-1"
+    )
+
+    leader = await service.stream_message(payload)
+    stream_retry = asyncio.ensure_future(service.stream_message(payload))
+    post_retry = asyncio.ensure_future(service.handle_message(payload))
+    await asyncio.sleep(0)
+    assert not stream_retry.done() and not post_retry.done()
+
+    release.set()
+    leader_events = await _collect(leader)
+    retry_events = await _collect(await stream_retry)
+    posted = await post_retry
+
+    assert prepared == 1
+    assert leader_events[-1].startswith("event: done")
+    assert [chunk.split("\n", 1)[0] for chunk in retry_events] == [
+        "event: metadata",
+        "event: delta",
+        "event: done",
+    ]
+    assert posted.reply == "hola"
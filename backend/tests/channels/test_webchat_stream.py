@@ -0,0 +1,187 @@
+"""Streaming SSE de respuestas del webchat."""
+
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from app.assistants.manager import AssistantConfig
+from app.channels.webchat import service
+
+
+class _FakeResponse:
+    def __init__(self, data: dict[str, Any]) -> None:
+        self._data = data
+
+    def model_dump(self) -> dict[str, Any]:
+        return self._data
+
+
+class _FakeStream:
+    def __init__(self, events: list[Any]) -> None:
+        self._events = events
+
+    def __aiter__(self) -> _FakeStream:
+        self._iter = iter(self._events)
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+
+class _FakeResponses:
+    def __init__(self, passes: list[list[Any]]) -> None:
+        self.passes = passes
+        self.calls: list[dict[str, Any]] = []
+
+    async def create(self, **kwargs: Any) -> _FakeStream:
+        self.calls.append(kwargs)
+        return _FakeStream(self.passes[len(self.calls) - 1])
+
+
+def _completed(data: dict[str, Any]) -> SimpleNamespace:
+    return SimpleNamespace(type="response.completed", response=_FakeResponse(data))
+
+
+def _parse_sse(body: str) -> list[tuple[str, Any]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_stream_forwards_deltas_and_persists_reply(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    stored: list[dict[str, Any]] = []
+    tool_calls: list[str] = []
+
+    async def fake_register(**kwargs: Any) -> dict[str, Any]:
+        stored.append(kwargs)
+        return {
+            "conversation_id": "conv-1",
+            "contact_id": "contact-1",
+            "last_response_id": None,
+            "manual_override": False,
+        }
+
+    async def fake_conversation(conversation_id: str) -> dict[str, Any]:
+        raise AssertionError("el estado llega con el registro del mensaje")
+
+    async def fake_tool(name: str, arguments: Any, context: Any, **kwargs: Any) -> dict[str, Any]:
+        tool_calls.append(name)
+        return {"status": "ok"}
+
+    responses = _FakeResponses(
+        [
+            [
+                _completed(
+                    {
+                        "id": "resp-1",
+                        "output": [
+                            {
+                                "type": "function_call",
+                                "name": "registrar_lead",
+                                "call_id": "call-1",
+                                "arguments": "{}",
+                            }
+                        ],
+                    }
+                )
+            ],
+            [
+                SimpleNamespace(type="response.output_text.delta", delta="Hola, "),
+                SimpleNamespace(type="response.output_text.delta", delta="¿en qué te ayudo?"),
+                _completed(
+                    {
+                        "id": "resp-2",
+                        "conversation": {"id": "oa-conv"},
+                        "output": [
+                            {
+                                "type": "message",
+                                "content": [
+                                    {"type": "output_text", "text": "Hola, ¿en qué te ayudo?"}
+                                ],
+                            }
+                        ],
+                    }
+                ),
+            ],
+        ]
+    )
+
+    monkeypatch.setattr(service.storage, "register_webchat_message", fake_register)
+    monkeypatch.setattr(service.storage, "fetch_webchat_conversation", fake_conversation)
+    monkeypatch.setattr(service, "enqueue_visit", lambda *args, **kwargs: True)
+    monkeypatch.setattr(service, "_execute_function_call", fake_tool)
+    monkeypatch.setattr(
+        service.registry, "resolve_assistant", lambda name: AssistantConfig(prompt_id="pmpt_1")
+    )
+    monkeypatch.setattr(
+        service.openai_service,
+        "get_assistant_client",
+        lambda: SimpleNamespace(responses=responses),
+    )
+
+    response = await async_client.post(
+        "/webchat/messages/stream",
+        json={"session_id": "sess-1234", "author": "user", "content": "hola"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    assert [name for name, _ in events] == ["metadata", "delta", "delta", "done"]
+    assert events[1][1] == {"text": "Hola, "}
+    done = events[-1][1]
+    assert done["reply"] == "Hola, ¿en qué te ayudo?"
+    assert done["metadata"]["assistant_response_id"] == "resp-2"
+    assert done["metadata"]["tools_called"] == ["registrar_lead"]
+
+    assert tool_calls == ["registrar_lead"]
+    assert all(call["stream"] is True for call in responses.calls)
+    assert responses.calls[1]["input"][0]["type"] == "function_call_output"
+    assert stored[-1]["author"] == "assistant"
+    assert stored[-1]["content"] == "Hola, ¿en qué te ayudo?"
+    assert stored[-1]["response_id"] == "resp-2"
+
+
+@pytest.mark.asyncio
+async def test_stream_rejects_before_opening_stream(async_client: AsyncClient) -> None:
+    response = await async_client.post(
+        "/webchat/messages/stream",
+        json={"session_id": "sess-1234", "author": "assistant", "content": "hola"},
+    )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_prepare_turn_falls_back_to_conversation_lookup(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def legacy_register(**kwargs: Any) -> dict[str, Any]:
+        return {"conversation_id": "conv-1", "contact_id": None, "manual_override": None}
+
+    async def fake_conversation(conversation_id: str) -> dict[str, Any]:
+        return {"contact_id": "contact-1", "manual_override": True, "last_response_id": "r-1"}
+
+    monkeypatch.setattr(service.storage, "register_webchat_message", legacy_register)
+    monkeypatch.setattr(service.storage, "fetch_webchat_conversation", fake_conversation)
+
+    turn = await service.prepare_turn(
+        service.schemas.MessageRequest(session_id="sess-1234", author="user", content="hola")
+    )
+
+    assert turn.manual
+    assert turn.metadata.manual_mode is True
+    assert turn.metadata.previous_response_id == "r-1"
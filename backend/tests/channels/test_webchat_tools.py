@@ -0,0 +1,141 @@
+"""Ejecución de tool calls del asistente webchat."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any
+
+import pytest
+
+from app.channels.webchat import service
+from app.core.config import settings
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_run_concurrently_in_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "webchat_tool_concurrency", 2)
+    active = 0
+    peak = 0
+    delays = {"a": 0.03, "b": 0.01, "c": 0.0, "d": 0.02}
+
+    async def fake_tool(name: str, arguments: Any, context: Any, **kwargs: Any) -> dict[str, Any]:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(delays[name])
+        active -= 1
+        if name == "c":
+            raise RuntimeError("boom")
+        return {"status": "ok", "tool": name}
+
+    monkeypatch.setattr(service, "_execute_function_call", fake_tool)
+    context = service.WebchatContext(
+        conversation_id="conv-1", contact_id="contact-1", session_id="sess-1"
+    )
+    calls = [{"name": name, "call_id": f"call-{name}", "arguments": "{}"} for name in "abcd"]
+    tools_called: list[str] = []
+    tool_call_ids: list[str] = []
+
+    outputs = await service._resolve_tool_calls(calls, context, tools_called, tool_call_ids)
+
+    assert peak == 2
+    assert [item["call_id"] for item in outputs] == ["call-a", "call-b", "call-c", "call-d"]
+    assert tools_called == ["a", "b", "c", "d"]
+    assert tool_call_ids == ["call-a", "call-b", "call-c", "call-d"]
+    results = [json.loads(item["output"]) for item in outputs]
+    assert results[2] == {"status": "error", "message": "boom"}
+    assert results[3] == {"status": "ok", "tool": "d"}
+
+
+@pytest.mark.asyncio
+async def test_contact_patches_are_coalesced_per_round(monkeypatch: pytest.MonkeyPatch) -> None:
+    contact_patches: list[dict[str, Any]] = []
+    conversation_patches: list[dict[str, Any]] = []
+
+    async def fake_update_contact(contact_id: str, patch: dict[str, Any]) -> dict[str, Any]:
+        contact_patches.append(dict(patch))
+        return {"id": contact_id}
+
+    async def fake_update_conversation(conversation_id: str, patch: dict[str, Any]) -> None:
+        conversation_patches.append(dict(patch))
+        raise service.storage.StorageError("Conversación no encontrada")
+
+    insights: list[dict[str, Any]] = []
+
+    async def fake_insights(**kwargs: Any) -> None:
+        insights.append(kwargs)
+
+    monkeypatch.setattr(service.storage, "update_contact", fake_update_contact)
+    monkeypatch.setattr(service.storage, "update_conversation", fake_update_conversation)
+    monkeypatch.setattr(service.storage, "upsert_conversation_insights", fake_insights)
+    context = service.WebchatContext(
+        conversation_id="conv-1", contact_id="contact-1", session_id="sess-1"
+    )
+    calls = [
+        {"name": "set_full_name", "call_id": "c1", "arguments": {"full_name": "Ana Pérez"}},
+        {"name": "set_email", "call_id": "c2", "arguments": {"email": "Ana@Example.com"}},
+        {"name": "set_phone_number", "call_id": "c3", "arguments": {"phone_number": "+52155"}},
+        {"name": "set_email", "call_id": "c4", "arguments": {}},
+        {
+            "name": "close_lead",
+            "call_id": "c5",
+            "arguments": {"notes": "Quiere demo", "necesidad_proposito": "CRM"},
+        },
+    ]
+
+    outputs = await service._resolve_tool_calls(calls, context, [], [])
+
+    assert contact_patches == [
+        {
+            "nombre_completo": "Ana Pérez",
+            "correo": "ana@example.com",
+            "telefono_e164": "+52155",
+            "notes": "Quiere demo",
+            "necesidad_proposito": "CRM",
+        }
+    ]
+    assert conversation_patches == [{"estado": "pendiente"}]
+    results = [json.loads(item["output"]) for item in outputs]
+    assert [result["status"] for result in results] == ["ok", "ok", "ok", "error", "error"]
+    assert results[4]["message"] == "Conversación no encontrada"
+    # El PATCH de la conversación falló: los insights de close_lead no se escriben.
+    assert insights == []
+
+
+@pytest.mark.asyncio
+async def test_close_lead_insights_are_written_after_patches(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    events: list[str] = []
+
+    async def fake_update_contact(contact_id: str, patch: dict[str, Any]) -> dict[str, Any]:
+        events.append("contact")
+        return {"id": contact_id}
+
+    async def fake_update_conversation(conversation_id: str, patch: dict[str, Any]) -> None:
+        await asyncio.sleep(0.01)
+        events.append("conversation")
+
+    async def fake_insights(**kwargs: Any) -> None:
+        events.append(f"insights:{kwargs['conversation_id']}:{kwargs['intencion']}")
+
+    monkeypatch.setattr(service.storage, "update_contact", fake_update_contact)
+    monkeypatch.setattr(service.storage, "update_conversation", fake_update_conversation)
+    monkeypatch.setattr(service.storage, "upsert_conversation_insights", fake_insights)
+    context = service.WebchatContext(
+        conversation_id="conv-1", contact_id="contact-1", session_id="sess-1"
+    )
+    calls = [
+        {
+            "name": "close_lead",
+            "call_id": "c1",
+            "arguments": {"notes": "Quiere demo", "necesidad_proposito": "CRM"},
+        }
+    ]
+
+    outputs = await service._resolve_tool_calls(calls, context, [], [])
+
+    assert json.loads(outputs[0]["output"])["status"] == "ok"
+    assert sorted(events[:2]) == ["contact", "conversation"]
+    assert events[2:] == ["insights:conv-1:CRM"]
@@ -0,0 +1,93 @@
+"""El registro de visitas del webchat corre fuera del request."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from app.channels.webchat import service
+from app.services import background
+from app.services.background import BackgroundQueue
+
+
+@pytest.mark.asyncio
+async def test_visit_endpoint_returns_before_storage(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    queue = BackgroundQueue(workers=1, maxsize=10, max_attempts=2, retry_base_seconds=0.001)
+    monkeypatch.setattr(background, "queue", queue)
+    release = asyncio.Event()
+    recorded: list[dict[str, Any]] = []
+    attempts = 0
+
+    async def fake_lookup(ip: str | None) -> None:
+        return None
+
+    async def fake_record(session_id: str, **kwargs: Any) -> None:
+        nonlocal attempts
+        attempts += 1
+        await release.wait()
+        if attempts == 1:
+            raise service.storage.StorageError("Error de red al registrar visitante webchat")
+        recorded.append({"session_id": session_id, **kwargs})
+
+    async def fake_contact_id(session_id: str) -> None:
+        return None
+
+    monkeypatch.setattr(service.geolocation, "lookup_ip", fake_lookup)
+    monkeypatch.setattr(service.storage, "record_webchat_visit", fake_record)
+    monkeypatch.setattr(service.storage, "get_webchat_contact_id", fake_contact_id)
+
+    response = await async_client.post(
+        "/webchat/visit",
+        json={"session_id": "sess-1234"},
+        headers={"x-forwarded-for": "187.188.1.1", "user-agent": "Mozilla iPhone"},
+    )
+
+    assert response.status_code == 204
+    assert recorded == []
+
+    release.set()
+    await queue.drain(timeout=1)
+
+    assert recorded[0]["session_id"] == "sess-1234"
+    assert recorded[0]["ip"] == "187.188.1.1"
+    assert recorded[0]["device_type"] == "mobile"
+    assert queue.stats()["retried"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_contact_failure_does_not_record_twice(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    queue = BackgroundQueue(workers=1, maxsize=10, max_attempts=3, retry_base_seconds=0.001)
+    monkeypatch.setattr(background, "queue", queue)
+    recorded: list[str] = []
+    lookups = 0
+
+    async def fake_lookup(ip: str | None) -> None:
+        return None
+
+    async def fake_record(session_id: str, **kwargs: Any) -> None:
+        recorded.append(session_id)
+
+    async def flaky_contact_id(session_id: str) -> None:
+        nonlocal lookups
+        lookups += 1
+        if lookups == 1:
+            raise service.storage.StorageError("Error de red al resolver contacto")
+        return None
+
+    monkeypatch.setattr(service.geolocation, "lookup_ip", fake_lookup)
+    monkeypatch.setattr(service.storage, "record_webchat_visit", fake_record)
+    monkeypatch.setattr(service.storage, "get_webchat_contact_id", flaky_contact_id)
+
+    assert service.enqueue_visit("sess-5678", request=None, metadata=None)
+    await queue.drain(timeout=1)
+
+    assert recorded == ["sess-5678"]
+    assert lookups == 2
+    assert queue.stats()["retried"] == 1
@@ -0,0 +1,122 @@
+"""Pruebas del caché TTL en memoria."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.core.cache import StaleWhileRevalidateCache, TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def _settle() -> None:
+    """Deja correr las recargas en segundo plano pendientes."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_entries_expire_after_ttl() -> None:
+    clock = FakeClock()
+    cache: TTLCache[str, int] = TTLCache(ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_respects_recent_use() -> None:
+    cache: TTLCache[str, int] = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.evictions == 1
+
+
+def test_non_positive_ttl_disables_storage() -> None:
+    cache: TTLCache[str, int] = TTLCache(ttl=0)
+    cache.set("a", 1)
+    assert len(cache) == 0
+
+
+async def test_swr_concurrent_misses_share_one_load() -> None:
+    cache: StaleWhileRevalidateCache[str, int] = StaleWhileRevalidateCache(ttl=60, stale_ttl=60)
+    calls = 0
+    release = asyncio.Event()
+
+    async def load() -> int:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return 42
+
+    waiters = [asyncio.ensure_future(cache.get_or_load("k", load)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == [42] * 5
+    assert calls == 1
+    assert await cache.get_or_load("k", load) == 42
+    assert cache.stats()["misses"] == 5
+    assert cache.stats()["hits"] == 1
+
+
+async def test_swr_serves_stale_value_while_refreshing() -> None:
+    clock = FakeClock()
+    cache: StaleWhileRevalidateCache[str, int] = StaleWhileRevalidateCache(
+        ttl=10, stale_ttl=30, clock=clock
+    )
+    values = iter([1, 2])
+
+    async def load() -> int:
+        return next(values)
+
+    assert await cache.get_or_load("k", load) == 1
+    clock.now = 15
+    assert await cache.get_or_load("k", load) == 1
+    await _settle()
+
+    assert await cache.get_or_load("k", load) == 2
+    stats = cache.stats()
+    assert (stats["misses"], stats["stale_hits"], stats["hits"]) == (1, 1, 1)
+    assert stats["hit_ratio"] == pytest.approx(2 / 3, abs=1e-3)
+
+
+async def test_swr_keeps_stale_value_when_refresh_fails() -> None:
+    clock = FakeClock()
+    cache: StaleWhileRevalidateCache[str, int] = StaleWhileRevalidateCache(
+        ttl=10, stale_ttl=30, clock=clock
+    )
+
+    async def load() -> int:
+        return 1
+
+    async def broken() -> int:
+        raise RuntimeError("boom")
+
+    await cache.get_or_load("k", load)
+    clock.now = 15
+    assert await cache.get_or_load("k", broken) == 1
+    await _settle()
+    assert cache.stats()["refresh_failures"] == 1
+
+    clock.now = 45
+    with pytest.raises(RuntimeError):
+        await cache.get_or_load("k", broken)
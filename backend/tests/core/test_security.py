@@ -0,0 +1,80 @@
+"""Pruebas del verificador de JWT."""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+import pytest
+
+from app.core.security import JWTVerifier, TokenError
+from tests.helpers import b64url, make_jwt
+
+
+def _token(claims: dict[str, Any], secret: str = "s3cret", alg: str = "HS256") -> str:
+    return make_jwt(claims, secret, alg)
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_verify_caches_claims_by_signature(monkeypatch: pytest.MonkeyPatch) -> None:
+    verifier = JWTVerifier(["s3cret"], clock=FakeClock(1000))
+    token = _token({"sub": "u-1", "exp": 2000})
+
+    assert verifier.verify(token)["sub"] == "u-1"
+
+    def boom(*args: Any) -> Any:
+        raise AssertionError("no debe volver a decodificar")
+
+    monkeypatch.setattr(verifier, "_decode", boom)
+    assert verifier.verify(token)["sub"] == "u-1"
+    assert verifier.cache.hits == 1
+
+
+def test_verify_rejects_bad_signature_and_alg() -> None:
+    verifier = JWTVerifier(["s3cret"])
+    with pytest.raises(TokenError, match="bad_signature"):
+        verifier.verify(_token({"sub": "u-1"}, secret="otro"))
+    with pytest.raises(TokenError, match="unsupported_alg"):
+        verifier.verify(_token({"sub": "u-1"}, alg="none"))
+    with pytest.raises(TokenError, match="malformed"):
+        verifier.verify("no-es-un-jwt")
+
+
+def test_verify_checks_exp_and_nbf_even_when_cached() -> None:
+    clock = FakeClock(1000)
+    verifier = JWTVerifier(["s3cret"], clock=clock, leeway=5)
+    token = _token({"sub": "u-1", "exp": 1100, "nbf": 990})
+
+    assert verifier.verify(token)["sub"] == "u-1"
+    clock.now = 1104
+    assert verifier.verify(token)["sub"] == "u-1"
+    clock.now = 1105
+    with pytest.raises(TokenError, match="expired"):
+        verifier.verify(token)
+
+    clock.now = 980
+    with pytest.raises(TokenError, match="not_yet_valid"):
+        verifier.verify(_token({"sub": "u-2", "nbf": 990}))
+
+
+def test_cached_signature_with_different_payload_is_reverified() -> None:
+    verifier = JWTVerifier(["s3cret"])
+    token = _token({"sub": "u-1"})
+    verifier.verify(token)
+    header, _, signature = token.split(".")
+    forged = f"{header}.{b64url(json.dumps({'sub': 'admin'}).encode())}.{signature}"
+
+    with pytest.raises(TokenError, match="bad_signature"):
+        verifier.verify(forged)
+
+
+def test_rotated_legacy_secret_is_accepted() -> None:
+    verifier = JWTVerifier(["nuevo", "legacy"])
+    assert verifier.verify(_token({"sub": "u-1"}, secret="legacy"))["sub"] == "u-1"
@@ -0,0 +1,37 @@
+"""Utilidades compartidas por las pruebas."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+from typing import Any
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def make_jwt(claims: dict[str, Any], secret: str, alg: str = "HS256") -> str:
+    """JWT firmado con HS256 (el `alg` del encabezado puede variarse para probar rechazos)."""
+    header = b64url(json.dumps({"alg": alg, "typ": "JWT"}).encode())
+    payload = b64url(json.dumps(claims).encode())
+    signature = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256)
+    return f"{header}.{payload}.{b64url(signature.digest())}"
+
+
+class DummyResponse:
+    """Respuesta fake que imita httpx.Response para las pruebas."""
+
+    def __init__(
+        self, status_code: int, payload: Any, headers: dict[str, str] | None = None
+    ) -> None:
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+        self.text = ""
+        self.content = b"[]"
+
+    def json(self) -> Any:
+        return self._payload
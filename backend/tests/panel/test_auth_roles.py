@@ -0,0 +1,110 @@
+"""Cobertura para el caché de roles por usuario del panel."""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from app.api.routes import panel
+from app.core.config import settings
+from tests.helpers import DummyResponse, make_jwt
+
+SECRET = "test-secret"
+
+
+def _token(sub: str, exp: float | None = None) -> str:
+    claims: dict[str, Any] = {"sub": sub}
+    if exp is not None:
+        claims["exp"] = exp
+    return make_jwt(claims, SECRET)
+
+
+@pytest.fixture(autouse=True)
+def _setup(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "supabase_jwt_secret", SECRET)
+    panel._ROLE_CACHE.clear()
+
+
+@pytest.mark.asyncio
+async def test_roles_are_cached_across_permisos_and_admin_checks(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    lookups: list[dict[str, str] | None] = []
+
+    async def fake_sb_get(path: str, *, params: dict[str, str] | None = None, **_: Any) -> Any:
+        assert path == "/rest/v1/usuarios_roles"
+        lookups.append(params)
+        return DummyResponse(200, [{"rol": {"codigo": "admin"}}])
+
+    monkeypatch.setattr(panel, "_sb_get", fake_sb_get)
+    headers = {"Authorization": f"Bearer {_token('user-1', time.time() + 3600)}"}
+
+    response = await async_client.get("/api/auth/permisos", headers=headers)
+    assert response.json() == {"ok": True, "roles": ["admin"]}
+    assert await panel._require_admin(headers["Authorization"]) == "user-1"
+    assert await panel._require_admin(headers["Authorization"]) == "user-1"
+
+    assert len(lookups) == 1
+
+
+@pytest.mark.asyncio
+async def test_role_cache_is_bounded_by_token_expiry(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = 0
+
+    async def fake_sb_get(path: str, **_: Any) -> Any:
+        nonlocal calls
+        calls += 1
+        return DummyResponse(200, [{"rol": {"codigo": "admin"}}])
+
+    monkeypatch.setattr(panel, "_sb_get", fake_sb_get)
+    monkeypatch.setattr(settings, "panel_roles_cache_ttl_seconds", 600.0)
+
+    await panel._require_admin(f"Bearer {_token('user-2', time.time() + 2)}")
+
+    expires_at, _ = panel._ROLE_CACHE._data["user-2"]
+    assert expires_at - time.monotonic() <= 2
+
+    with pytest.raises(panel.HTTPException) as excinfo:
+        await panel._require_admin(f"Bearer {_token('user-3', time.time() - 5)}")
+    assert excinfo.value.status_code == 401
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_updating_roles_invalidates_cache(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    target = "7f0c6e1e-0000-4000-8000-000000000001"
+    panel._ROLE_CACHE.set("admin-1", ["admin"])
+    panel._ROLE_CACHE.set(target, ["ventas"])
+
+    async def fake_sb_get(path: str, **_: Any) -> Any:
+        return DummyResponse(200, [{"rol_id": "r-old"}])
+
+    async def fake_sb_delete(path: str, **_: Any) -> Any:
+        return DummyResponse(204, None)
+
+    monkeypatch.setattr(panel, "_sb_get", fake_sb_get)
+    monkeypatch.setattr(panel, "_sb_delete", fake_sb_delete)
+
+    response = await async_client.put(
+        f"/api/config/usuarios/{target}/roles",
+        json={"roles": []},
+        headers={"Authorization": f"Bearer {_token('admin-1', time.time() + 3600)}"},
+    )
+
+    assert response.status_code == 200
+    assert panel._ROLE_CACHE.get(target) is None
+    assert panel._ROLE_CACHE.get("admin-1") == ["admin"]
+
+
+@pytest.mark.asyncio
+async def test_invalid_signature_is_rejected(async_client: AsyncClient) -> None:
+    token = _token("user-1", time.time() + 3600)[:-2] + "xx"
+    response = await async_client.get(
+        "/api/auth/permisos", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 401
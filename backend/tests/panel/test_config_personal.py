@@ -0,0 +1,101 @@
+"""Cobertura para la autorización, carga concurrente y caché de /config/personal."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from app.api.routes import panel
+from tests.helpers import DummyResponse
+
+
+@pytest.fixture(autouse=True)
+def _clear_catalog_cache() -> None:
+    panel._CATALOG_CACHE.clear()
+
+
+@pytest.mark.asyncio
+async def test_cfg_personal_loads_concurrently_and_caches_catalogs(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    calls: list[str] = []
+    in_flight = 0
+    peak = 0
+
+    async def fake_require_admin(authorization: str | None) -> str:
+        return "admin-1"
+
+    async def fake_sb_get(path: str, **kwargs: Any) -> DummyResponse:
+        nonlocal in_flight, peak
+        calls.append(path)
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return DummyResponse(200, [{"path": path}])
+
+    monkeypatch.setattr(panel, "_require_admin", fake_require_admin)
+    monkeypatch.setattr(panel, "_sb_get", fake_sb_get)
+
+    first = await async_client.get("/api/config/personal")
+    assert first.status_code == 200
+    body = first.json()
+    assert body["roles"] == [{"path": "/rest/v1/roles"}]
+    assert body["puestos"] == [{"path": "/rest/v1/puestos"}]
+    assert peak == 4
+
+    calls.clear()
+    second = await async_client.get("/api/config/personal")
+    assert second.status_code == 200
+    assert calls == ["/rest/v1/v_configuracion_personal"]
+
+
+@pytest.mark.asyncio
+async def test_cfg_mutation_invalidates_catalog(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    async def fake_require_admin(authorization: str | None) -> str:
+        return "admin-1"
+
+    async def fake_sb_post(path: str, **kwargs: Any) -> DummyResponse:
+        return DummyResponse(201, [{"id": "rol-1"}])
+
+    monkeypatch.setattr(panel, "_require_admin", fake_require_admin)
+    monkeypatch.setattr(panel, "_sb_post", fake_sb_post)
+    panel._CATALOG_CACHE.set("roles", [{"id": "viejo"}])
+    panel._CATALOG_CACHE.set("puestos", [{"id": "p"}])
+
+    response = await async_client.post(
+        "/api/config/roles", json={"codigo": "ventas", "nombre": "Ventas"}
+    )
+
+    assert response.status_code == 200
+    assert panel._CATALOG_CACHE.get("roles") is None
+    assert panel._CATALOG_CACHE.get("puestos") == [{"id": "p"}]
+
+
+@pytest.mark.asyncio
+async def test_cfg_personal_forbidden_skips_privileged_reads(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    calls: list[str] = []
+
+    async def fake_require_admin(authorization: str | None) -> str:
+        await asyncio.sleep(0.01)
+        raise panel.HTTPException(status_code=403, detail="forbidden")
+
+    async def fake_sb_get(path: str, **kwargs: Any) -> DummyResponse:
+        calls.append(path)
+        return DummyResponse(200, [])
+
+    monkeypatch.setattr(panel, "_require_admin", fake_require_admin)
+    monkeypatch.setattr(panel, "_sb_get", fake_sb_get)
+
+    response = await async_client.get("/api/config/personal")
+
+    assert response.status_code == 403
+    assert calls == []
+    assert len(panel._CATALOG_CACHE) == 0
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timezone
 from typing import Any
 
@@ -305,3 +306,69 @@ async def test_fetch_visitantes_total_calls_rpc(monkeypatch: pytest.MonkeyPatch)
     assert captured["path"] == "/rest/v1/rpc/embudo_visitantes_contador"
     assert captured["token"] == "jwt-token"
     assert captured["json"] == {"p_closed_after": "2025-01-01T00:00:00+00:00"}
+
+
+@pytest.mark.asyncio
+async def test_obtener_embudo_runs_subqueries_concurrently(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    visitantes_started = asyncio.Event()
+
+    async def fake_fetch_tablero(token: str, tablero_hint: str | None) -> dict[str, Any]:
+        # Visitantes no depende del tablero: debe arrancar antes de que éste termine.
+        await asyncio.wait_for(visitantes_started.wait(), timeout=1)
+        return {"id": "board-1", "nombre": "General"}
+
+    async def fake_fetch_etapas(token: str, tablero_id: str) -> list[dict[str, Any]]:
+        return [{"id": "stage-1", "orden": 1, "categoria": "abierta", "metadatos": {}}]
+
+    async def fake_fetch_cards(token: str, tablero_id: str, *args: Any) -> list[dict[str, Any]]:
+        return [{"id": "card-1", "etapa_id": "stage-1"}]
+
+    async def fake_fetch_visitantes_total(token: str | None, *args: Any) -> int:
+        visitantes_started.set()
+        return 3
+
+    monkeypatch.setattr(panel, "_fetch_tablero", fake_fetch_tablero)
+    monkeypatch.setattr(panel, "_fetch_etapas", fake_fetch_etapas)
+    monkeypatch.setattr(panel, "_fetch_embudo_cards", fake_fetch_cards)
+    monkeypatch.setattr(panel, "_fetch_visitantes_total", fake_fetch_visitantes_total)
+
+    response = await async_client.get("/api/embudo", headers={"Authorization": "Bearer test-token"})
+
+    assert response.status_code == 200
+    assert response.json()["totals"]["cards"] == 1
+    timing = response.headers["server-timing"]
+    for name in ("visitantes", "tablero", "etapas", "cards", "total"):
+        assert f"{name};dur=" in timing
+
+
+@pytest.mark.asyncio
+async def test_obtener_embudo_failure_cancels_siblings(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    cancelled = asyncio.Event()
+
+    async def fake_fetch_tablero(token: str, tablero_hint: str | None) -> dict[str, Any]:
+        return {"id": "board-1"}
+
+    async def fake_fetch_etapas(token: str, tablero_id: str) -> list[dict[str, Any]]:
+        raise panel.HTTPException(status_code=502, detail="Error consultando etapas")
+
+    async def slow_fetch(*args: Any) -> Any:
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    monkeypatch.setattr(panel, "_fetch_tablero", fake_fetch_tablero)
+    monkeypatch.setattr(panel, "_fetch_etapas", fake_fetch_etapas)
+    monkeypatch.setattr(panel, "_fetch_embudo_cards", slow_fetch)
+    monkeypatch.setattr(panel, "_fetch_visitantes_total", slow_fetch)
+
+    response = await async_client.get("/api/embudo", headers={"Authorization": "Bearer test-token"})
+
+    assert response.status_code == 502
+    assert response.json()["detail"] == "Error consultando etapas"
+    assert cancelled.is_set()
@@ -0,0 +1,100 @@
+"""Cobertura para la entrega pre-codificada de los catálogos GeoJSON del mapa."""
+
+from __future__ import annotations
+
+import gzip
+import json
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from app.services import geo_assets, leads_geo
+
+STATES = {
+    "type": "FeatureCollection",
+    "features": [{"type": "Feature", "properties": {"name": "Nuevo León"}, "geometry": None}],
+}
+
+
+@pytest.fixture(autouse=True)
+def _setup(monkeypatch: pytest.MonkeyPatch) -> None:
+    geo_assets._ASSETS.clear()
+
+    def fake_states(detalle: str = "alto") -> dict[str, Any]:
+        return STATES if detalle == "alto" else {**STATES, "features": []}
+
+    def fake_municipalities(code: str, detalle: str = "alto") -> dict[str, Any]:
+        if code != "19":
+            raise KeyError(code)
+        return {"type": "FeatureCollection", "features": []}
+
+    monkeypatch.setattr(leads_geo, "load_states_geojson", fake_states)
+    monkeypatch.setattr(leads_geo, "load_state_municipalities_geojson", fake_municipalities)
+    monkeypatch.setattr(geo_assets, "_brotli_available", lambda: False)
+    yield
+    geo_assets._ASSETS.clear()
+
+
+def test_encode_gzip_variant_round_trips() -> None:
+    asset = geo_assets.encode({"ok": True, "geojson": STATES})
+
+    assert json.loads(gzip.decompress(asset.variants["gzip"])) == json.loads(asset.variants[None])
+    assert asset.negotiate("gzip;q=0, identity") == (None, asset.variants[None])
+    assert asset.negotiate("br, *;q=0.1")[0] == "gzip"
+    assert asset.matches(f'W/"{asset.digest}-gzip"')
+    assert not asset.matches('"otro"')
+
+
+async def test_states_served_compressed_with_validators(async_client: AsyncClient) -> None:
+    resp = await async_client.get("/kpis/leads/geo/estados", headers={"accept-encoding": "gzip"})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert resp.headers["etag"].endswith('-gzip"')
+    assert "max-age=" in resp.headers["cache-control"]
+    assert resp.json() == {"ok": True, "geojson": STATES}
+
+    again = await async_client.get(
+        "/kpis/leads/geo/estados", headers={"if-none-match": resp.headers["etag"]}
+    )
+    assert again.status_code == 304
+    assert again.content == b""
+
+
+async def test_states_identity_when_compression_not_accepted(async_client: AsyncClient) -> None:
+    resp = await async_client.get(
+        "/kpis/leads/geo/estados", headers={"accept-encoding": "identity"}
+    )
+
+    assert resp.status_code == 200
+    assert "content-encoding" not in resp.headers
+    assert resp.json()["geojson"] == STATES
+
+
+async def test_detail_level_selects_variant(async_client: AsyncClient) -> None:
+    alto = await async_client.get("/kpis/leads/geo/estados")
+    bajo = await async_client.get("/kpis/leads/geo/estados", params={"detalle": "bajo"})
+    invalid = await async_client.get("/kpis/leads/geo/estados", params={"detalle": "ultra"})
+
+    assert alto.json()["geojson"] == STATES
+    assert bajo.json()["geojson"]["features"] == []
+    assert alto.headers["etag"] != bajo.headers["etag"]
+    assert invalid.status_code == 422
+
+
+async def test_unknown_state_is_404(async_client: AsyncClient) -> None:
+    ok = await async_client.get("/kpis/leads/geo/municipios/19")
+    missing = await async_client.get("/kpis/leads/geo/municipios/33")
+
+    assert ok.status_code == 200
+    assert missing.status_code == 404
+    assert missing.json()["detail"] == "estado_not_found"
+
+
+def test_states_medio_is_served_from_the_original_catalog() -> None:
+    states = leads_geo.STATES_GEOJSON
+
+    assert leads_geo._geo_catalog_path(states, "medio") == f"geo/{states}"
+    assert leads_geo._geo_catalog_path(states, "bajo") == f"{leads_geo.VARIANTS_DIR}/bajo/{states}"
@@ -0,0 +1,110 @@
+"""Cobertura para el caché stale-while-revalidate de dashboard/KPIs."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from app.api.routes import panel
+from app.core.config import settings
+from tests.helpers import make_jwt
+
+SECRET = "test-secret"
+
+
+def _token(sub: str) -> str:
+    return make_jwt({"sub": sub}, SECRET)
+
+
+@pytest.fixture(autouse=True)
+def _setup(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "supabase_jwt_secret", SECRET)
+    panel._ROLE_CACHE.clear()
+    panel._KPI_CACHE.clear()
+
+    async def fake_user_roles(user_id: str, *_: Any) -> list[str]:
+        return ["admin"] if user_id.startswith("admin") else ["agente"]
+
+    monkeypatch.setattr(panel, "_user_roles", fake_user_roles)
+
+
+def test_snap_date_range_widens_to_granularity(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "panel_kpi_cache_granularity_seconds", 300)
+    start = datetime(2025, 11, 25, 9, 3, 12, tzinfo=timezone.utc)
+    end = datetime(2025, 11, 25, 9, 7, 1, tzinfo=timezone.utc)
+    day_end = datetime(2025, 11, 25, 23, 59, 59, 999999, tzinfo=timezone.utc)
+
+    assert panel._snap_date_range(start, end) == (
+        datetime(2025, 11, 25, 9, 0, tzinfo=timezone.utc),
+        datetime(2025, 11, 25, 9, 9, 59, 999999, tzinfo=timezone.utc),
+    )
+    assert panel._snap_date_range(None, day_end) == (None, day_end)
+
+
+@pytest.mark.asyncio
+async def test_dashboard_kpis_share_one_aggregate_per_role(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    calls: list[tuple[datetime | None, datetime | None]] = []
+    release = asyncio.Event()
+
+    async def fake_fetch(token: str, date_from: Any, date_to: Any) -> dict[str, Any]:
+        calls.append((date_from, date_to))
+        await release.wait()
+        return {"conversaciones": 7}
+
+    monkeypatch.setattr(panel, "_fetch_dashboard_kpis", fake_fetch)
+
+    async def open_dashboard(sub: str) -> Any:
+        return await async_client.get(
+            "/api/dashboard/kpis",
+            params={"rango": "7d"},
+            headers={"Authorization": f"Bearer {_token(sub)}"},
+        )
+
+    pending = [asyncio.ensure_future(open_dashboard(f"admin-{i}")) for i in range(5)]
+    pending.append(asyncio.ensure_future(open_dashboard("agente-1")))
+    await asyncio.sleep(0.05)
+    release.set()
+    responses = await asyncio.gather(*pending)
+
+    assert all(resp.status_code == 200 for resp in responses)
+    assert {resp.json()["kpis"]["conversaciones"] for resp in responses} == {7}
+    assert len(calls) == 2
+
+    again = await open_dashboard("admin-9")
+    assert again.json() == responses[0].json()
+    assert len(calls) == 2
+
+    metrics = await async_client.get("/api/metrics")
+    cache_stats = metrics.json()["panel_kpi_cache"]
+    assert cache_stats["misses"] == 6
+    assert cache_stats["hits"] == 1
+    assert cache_stats["hit_ratio"] == pytest.approx(1 / 7, abs=1e-3)
+
+
+@pytest.mark.asyncio
+async def test_unverified_token_bypasses_cache(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    calls = 0
+
+    async def fake_fetch(token: str, *_: Any) -> dict[str, Any]:
+        nonlocal calls
+        calls += 1
+        return {}
+
+    monkeypatch.setattr(panel, "_fetch_dashboard_kpis", fake_fetch)
+
+    for _ in range(2):
+        resp = await async_client.get(
+            "/api/dashboard/kpis", headers={"Authorization": "Bearer opaque-token"}
+        )
+        assert resp.status_code == 200
+
+    assert calls == 2
+    assert len(panel._KPI_CACHE) == 0
@@ -0,0 +1,191 @@
+"""Paginación por cursor y modos de conteo de GET /leads."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from app.api.routes import panel
+from tests.helpers import DummyResponse
+
+
+def _row(index: int, score: int | None) -> dict[str, Any]:
+    return {
+        "id": f"lead-{index}",
+        "canal": "webchat",
+        "creado_en": f"2025-11-{index:02d}T10:00:00+00:00",
+        "lead_score": score,
+        "contacto_id": f"c-{index}",
+    }
+
+
+@pytest.mark.asyncio
+async def test_leads_keyset_pagination(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    calls: list[dict[str, Any]] = []
+    rows = [_row(1, 90), _row(2, 80), _row(3, 80)]
+
+    async def fake_sb_get(
+        path: str,
+        *,
+        params: dict[str, str] | None = None,
+        token: str | None = None,
+        prefer: str | None = None,
+    ) -> DummyResponse:
+        calls.append({"params": dict(params or {}), "prefer": prefer})
+        return DummyResponse(200, rows[: int(params["limit"])], {"content-range": "0-2/40"})
+
+    monkeypatch.setattr(panel, "_sb_get", fake_sb_get)
+    headers = {"Authorization": "Bearer token"}
+
+    first = await async_client.get(
+        "/leads", params={"limit": 2, "sort": "lead_score"}, headers=headers
+    )
+
+    assert first.status_code == 200
+    body = first.json()
+    assert [item["id"] for item in body["items"]] == ["lead-1", "lead-2"]
+    assert body["has_more"] is True
+    assert body["total"] == 40
+    assert calls[0]["params"]["limit"] == "3"
+    assert calls[0]["params"]["order"] == "lead_score.desc.nullslast,id.desc"
+    assert "offset" not in calls[0]["params"]
+    assert calls[0]["prefer"] == "count=exact"
+
+    second = await async_client.get(
+        "/leads",
+        params={
+            "limit": 2,
+            "sort": "lead_score",
+            "canal": "webchat",
+            "cursor": body["next_cursor"],
+        },
+        headers=headers,
+    )
+
+    assert second.status_code == 200
+    params = calls[1]["params"]
+    assert params["lead_score"] == "lte.80"
+    assert params["or"] == '(lead_score.lt."80",and(lead_score.eq."80",id.lt."lead-2"))'
+    assert params["canal"] == "eq.webchat"
+    # Con los filtros del keyset el conteo sólo vería las filas restantes.
+    assert calls[1]["prefer"] is None
+    assert second.json()["total"] is None
+    assert second.json()["offset"] == 0
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_leads_keyset_fetches_null_tail_after_last_score(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    calls: list[dict[str, str]] = []
+    prefers: list[str | None] = []
+
+    async def fake_sb_get(path: str, **kwargs: Any) -> DummyResponse:
+        params = dict(kwargs.get("params") or {})
+        calls.append(params)
+        prefers.append(kwargs.get("prefer"))
+        if params["lead_score"] == "is.null":
+            return DummyResponse(200, [_row(4, None), _row(5, None)], {"content-range": "0-1/7"})
+        return DummyResponse(200, [_row(3, 70)], {"content-range": "0-0/1"})
+
+    monkeypatch.setattr(panel, "_sb_get", fake_sb_get)
+    cursor = panel._encode_leads_cursor(_row(2, 80), "lead_score", "asc")
+
+    response = await async_client.get(
+        "/leads",
+        params={"limit": 2, "sort": "lead_score", "direction": "asc", "cursor": cursor},
+        headers={"Authorization": "Bearer token"},
+    )
+
+    body = response.json()
+    assert calls[0]["lead_score"] == "gte.80"
+    assert calls[0]["order"] == "lead_score.asc.nullslast,id.asc"
+    assert calls[1]["lead_score"] == "is.null"
+    assert "or" not in calls[1]
+    assert calls[1]["limit"] == "2"
+    assert [item["id"] for item in body["items"]] == ["lead-3", "lead-4"]
+    assert body["has_more"] is True
+    assert body["total"] is None
+    assert prefers == [None, None]
+    assert body["next_cursor"] == panel._encode_leads_cursor(_row(4, None), "lead_score", "asc")
+
+
+@pytest.mark.asyncio
+async def test_leads_search_uses_ranked_rpc(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    calls: list[dict[str, Any]] = []
+
+    async def fake_sb_get(path: str, **kwargs: Any) -> DummyResponse:
+        calls.append({"path": path, "params": dict(kwargs.get("params") or {})})
+        return DummyResponse(200, [_row(1, 10), _row(2, 90), _row(3, 50)])
+
+    monkeypatch.setattr(panel, "_sb_get", fake_sb_get)
+    headers = {"Authorization": "Bearer token"}
+
+    first = await async_client.get(
+        "/leads", params={"q": "  José   Pérez ", "limit": 2}, headers=headers
+    )
+    body = first.json()
+    second = await async_client.get(
+        "/leads",
+        params={"q": "José Pérez", "limit": 2, "cursor": body["next_cursor"]},
+        headers=headers,
+    )
+
+    assert calls[0]["path"] == "/rest/v1/rpc/panel_buscar_leads"
+    assert calls[0]["params"]["p_q"] == "José Pérez"
+    assert "order" not in calls[0]["params"]
+    assert [item["id"] for item in body["items"]] == ["lead-1", "lead-2"]
+    assert second.status_code == 200
+    assert calls[1]["params"]["offset"] == "2"
+    assert (body["sort"], body["direction"]) == ("relevancia", "desc")
+
+    sorted_search = await async_client.get(
+        "/leads", params={"q": "José", "sort": "lead_score"}, headers=headers
+    )
+
+    assert sorted_search.status_code == 400
+    assert sorted_search.json()["detail"] == "orden_no_aplica_con_q"
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_leads_count_modes_and_invalid_cursor(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    prefers: list[str | None] = []
+    orders: list[str] = []
+
+    async def fake_sb_get(path: str, **kwargs: Any) -> DummyResponse:
+        prefers.append(kwargs.get("prefer"))
+        orders.append(kwargs["params"]["order"])
+        return DummyResponse(200, [_row(1, None)], {"content-range": "0-0/*"})
+
+    monkeypatch.setattr(panel, "_sb_get", fake_sb_get)
+    headers = {"Authorization": "Bearer token"}
+
+    estimated = await async_client.get("/leads", params={"count": "estimated"}, headers=headers)
+    none = await async_client.get("/leads", params={"count": "none"}, headers=headers)
+    mismatched = await async_client.get(
+        "/leads",
+        params={
+            "sort": "actualizado_en",
+            "cursor": panel._encode_leads_cursor(_row(1, None), "creado_en", "desc"),
+        },
+        headers=headers,
+    )
+
+    assert prefers == ["count=estimated", None]
+    assert orders[0] == "creado_en.desc,id.desc"
+    assert estimated.json()["total_aproximado"] is True
+    assert estimated.json()["total"] == 1
+    assert none.json()["total"] is None
+    assert none.json()["next_cursor"] is None
+    assert mismatched.status_code == 400
+    assert mismatched.json()["detail"] == "cursor_invalido"
@@ -0,0 +1,89 @@
+"""Pruebas de la cola de trabajos en segundo plano."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.services.background import BackgroundQueue
+
+
+def _queue(**kwargs: int) -> BackgroundQueue:
+    options = {"workers": 2, "maxsize": 10, "max_attempts": 3}
+    options.update(kwargs)
+    return BackgroundQueue(retry_base_seconds=0.001, **options)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded_and_drain_waits() -> None:
+    queue = _queue(workers=2)
+    running = 0
+    peak = 0
+    done: list[int] = []
+
+    def make(index: int):
+        async def job() -> None:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            done.append(index)
+
+        return job
+
+    for index in range(6):
+        assert queue.submit("test", make(index))
+    assert queue.stats()["depth"] > 0
+
+    await queue.drain(timeout=1)
+
+    assert sorted(done) == list(range(6))
+    assert peak == 2
+    stats = queue.stats()
+    assert stats["completed"] == 6
+    assert stats["depth"] == 0
+    assert not queue.submit("tarde", make(99))
+    assert queue.stats()["dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_jobs_are_retried_until_max_attempts() -> None:
+    queue = _queue(max_attempts=3)
+    attempts = {"flaky": 0, "broken": 0}
+
+    async def flaky() -> None:
+        attempts["flaky"] += 1
+        if attempts["flaky"] < 2:
+            raise RuntimeError("transitorio")
+
+    async def broken() -> None:
+        attempts["broken"] += 1
+        raise RuntimeError("permanente")
+
+    queue.submit("flaky", flaky)
+    queue.submit("broken", broken)
+    await queue.drain(timeout=1)
+
+    assert attempts == {"flaky": 2, "broken": 3}
+    stats = queue.stats()
+    assert (stats["completed"], stats["failed"], stats["retried"]) == (1, 1, 3)
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_instead_of_blocking() -> None:
+    queue = _queue(workers=1, maxsize=1)
+    gate = asyncio.Event()
+
+    async def blocked() -> None:
+        await gate.wait()
+
+    assert queue.submit("a", blocked)
+    await asyncio.sleep(0)  # el worker toma el primero
+    assert queue.submit("b", blocked)
+    assert not queue.submit("c", blocked)
+
+    gate.set()
+    await queue.drain(timeout=1)
+    assert queue.stats()["dropped"] == 1
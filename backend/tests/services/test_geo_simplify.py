@@ -0,0 +1,72 @@
+"""Pruebas de la simplificación de catálogos GeoJSON con topología compartida."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from app.services import geo_simplify
+from app.services.geo_simplify import Nivel
+
+
+def _neighbours(wiggle: float = 0.0) -> dict[str, Any]:
+    """Dos cuadrados 1×1 que comparten la frontera x=1 (con ruido opcional)."""
+    border = [(1 + (wiggle if 0 < i < 10 and i % 2 else 0), i / 10) for i in range(11)]
+    left = [(0.0, 0.0), *border, (0.0, 1.0), (0.0, 0.0)]
+    right = [(1.0, 0.0), (2.0, 0.0), (2.0, 1.0), *border[::-1]]
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"id": key, "extra": 1},
+                "geometry": {"type": "Polygon", "coordinates": [[list(p) for p in ring]]},
+            }
+            for key, ring in (("a", left), ("b", right))
+        ],
+    }
+
+
+def _shared_border(feature: dict[str, Any], x: float) -> set[tuple[float, float]]:
+    ring = feature["geometry"]["coordinates"][0]
+    return {tuple(p) for p in ring if abs(p[0] - x) < 0.01}
+
+
+def test_visvalingam_keeps_endpoints_and_relevant_vertices() -> None:
+    line = [(0.0, 0.0), (1.0, 0.0001), (2.0, 0.0), (3.0, 5.0), (4.0, 0.0)]
+
+    simplified = geo_simplify.visvalingam(line, min_area=0.01)
+
+    assert simplified == [(0.0, 0.0), (2.0, 0.0), (3.0, 5.0), (4.0, 0.0)]
+
+
+def test_shared_borders_stay_identical_between_neighbours() -> None:
+    collection = _neighbours(wiggle=0.001)
+
+    out = geo_simplify.simplify_geojson(collection, Nivel(area=0.01, digits=3, quantization=1000))
+
+    a, b = out["features"]
+    assert _shared_border(a, 1.0) == _shared_border(b, 1.0)
+    assert geo_simplify.vertex_count(out) < geo_simplify.vertex_count(collection)
+    for feature in out["features"]:
+        ring = feature["geometry"]["coordinates"][0]
+        assert ring[0] == ring[-1] and len(ring) >= 4
+
+    only_id = geo_simplify.simplify_geojson(
+        collection, Nivel(area=0.01, digits=3, quantization=1000), properties=["id"]
+    )
+    assert only_id["features"][1]["properties"] == {"id": "b"}
+
+
+def test_topojson_quantizes_and_shares_arcs() -> None:
+    collection = _neighbours()
+
+    topo = geo_simplify.to_topojson(
+        collection, Nivel(area=0.0, digits=3, quantization=1000), name="estados"
+    )
+
+    geometries = topo["objects"]["estados"]["geometries"]
+    refs_a = {r if r >= 0 else ~r for r in geometries[0]["arcs"][0]}
+    refs_b = {r if r >= 0 else ~r for r in geometries[1]["arcs"][0]}
+    assert refs_a & refs_b  # la frontera x=1 es un solo arco
+    assert all(isinstance(v, int) for arc in topo["arcs"] for point in arc for v in point)
+    assert topo["transform"]["translate"] == [0.0, 0.0]
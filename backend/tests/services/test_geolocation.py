@@ -0,0 +1,80 @@
+"""Pruebas del caché y la coalescencia de geolocalización por IP."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import httpx
+import pytest
+
+from app.core.cache import SingleFlight, TTLCache
+from app.core.config import settings
+from app.services import geolocation
+
+
+@pytest.fixture
+def geo(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    calls: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        await asyncio.sleep(0.01)
+        if "0.0.0.0" in request.url.path:
+            return httpx.Response(429)
+        return httpx.Response(200, json={"city": "Monterrey", "country_name": "Mexico"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(geolocation, "_CLIENT", client)
+    monkeypatch.setattr(geolocation, "_CACHE", TTLCache(ttl=60, maxsize=2))
+    monkeypatch.setattr(geolocation, "_INFLIGHT", SingleFlight())
+    monkeypatch.setattr(settings, "geolocation_api_url", "https://geo.test/{ip}")
+    monkeypatch.setattr(settings, "geolocation_cache_ttl_seconds", 3600)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_request(geo: list[str]) -> None:
+    results = await asyncio.gather(*(geolocation.lookup_ip("8.8.8.8") for _ in range(5)))
+
+    assert geo == ["/8.8.8.8"]
+    assert all(r == {"ip": "8.8.8.8", "city": "Monterrey", "country": "Mexico"} for r in results)
+    assert geolocation.stats()["coalesced"] == 4
+
+    await geolocation.lookup_ip("8.8.8.8")
+    assert geo == ["/8.8.8.8"]
+    assert geolocation.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failures_are_cached_and_lru_is_bounded(geo: list[str]) -> None:
+    assert await geolocation.lookup_ip("0.0.0.0") is None
+    assert await geolocation.lookup_ip("0.0.0.0") is None
+    assert geo == ["/0.0.0.0"]
+
+    await geolocation.lookup_ip("1.1.1.1")
+    await geolocation.lookup_ip("9.9.9.9")
+
+    stats: dict[str, Any] = geolocation.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert stats["upstream_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_leader_cancellation() -> None:
+    flight: SingleFlight[str, int] = SingleFlight()
+    gate = asyncio.Event()
+
+    async def load() -> int:
+        await gate.wait()
+        return 7
+
+    leader = asyncio.create_task(flight.run("k", load))
+    follower = asyncio.create_task(flight.run("k", load))
+    await asyncio.sleep(0)
+    leader.cancel()
+    gate.set()
+
+    assert await follower == 7
+    assert len(flight) == 0
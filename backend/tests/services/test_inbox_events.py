@@ -0,0 +1,150 @@
+"""Pruebas del hub de eventos del inbox y su change feed."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from app.api.routes import panel
+from app.services import inbox_events
+from app.services.inbox_events import InboxHub, PollingChangeFeed
+
+
+@pytest.mark.asyncio
+async def test_hub_fans_out_and_resyncs_slow_subscribers() -> None:
+    hub = InboxHub(queue_size=2)
+    async with hub.subscribe() as fast, hub.subscribe() as slow:
+        hub.publish({"type": "message", "conversation_id": "c1"})
+        assert fast.get_nowait()["conversation_id"] == "c1"
+        hub.publish({"type": "message", "conversation_id": "c2"})
+        hub.publish({"type": "message", "conversation_id": "c3"})
+
+        assert fast.qsize() == 2
+        assert [slow.get_nowait()["type"]] == ["resync"]
+        assert hub.stats()["resyncs"] == 1
+    assert len(hub) == 0
+
+
+@pytest.mark.asyncio
+async def test_polling_feed_publishes_changes_and_advances_cursor() -> None:
+    cursors: list[str] = []
+
+    async def fake_fetch(cursor: str) -> list[dict[str, Any]]:
+        cursors.append(cursor)
+        return [
+            {
+                "id": "c1",
+                "canal": "whatsapp",
+                "estado": "abierta",
+                "no_leidos": 2,
+                "ultimo_mensaje_en": "2999-01-01T00:00:00+00:00",
+            }
+        ]
+
+    feed = PollingChangeFeed(InboxHub(), interval=1.0, fetch=fake_fetch)
+    published: list[dict[str, Any]] = []
+
+    await feed.poll(published.append)
+    await feed.poll(published.append)
+
+    assert published[0]["conversation_id"] == "c1"
+    assert published[0]["no_leidos"] == 2
+    assert cursors[1] == "2999-01-01T00:00:00+00:00"
+
+
+def _visibility(*visible: str) -> tuple[inbox_events.VisibilityFilter, list[str]]:
+    checked: list[str] = []
+
+    async def fake_fetch(token: str, ids: Any) -> set[str]:
+        checked.extend(ids)
+        return {conversation_id for conversation_id in ids if conversation_id in visible}
+
+    return inbox_events.VisibilityFilter("user-jwt", ttl=60, fetch=fake_fetch), checked
+
+
+@pytest.mark.asyncio
+async def test_storage_writes_reach_inbox_stream(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_request(*args: Any, **kwargs: Any) -> None:
+        return None
+
+    monkeypatch.setattr(panel.storage, "_request", fake_request)
+    stream = panel._inbox_event_stream("webchat", _visibility("c1")[0], heartbeat=0.01)
+
+    assert await anext(stream) == "retry: 3000\n\n"
+    next_event = asyncio.ensure_future(anext(stream))
+    await asyncio.sleep(0)
+    inbox_events.publish({"type": "message", "conversation_id": "c0", "canal": "whatsapp"})
+    await panel.storage.set_manual_override("c1", True)
+
+    event = await next_event
+    await stream.aclose()
+
+    assert event.startswith("event: manual\n")
+    assert '"conversation_id": "c1"' in event
+    assert len(inbox_events.hub) == 0
+
+
+@pytest.mark.asyncio
+async def test_inbox_stream_only_delivers_visible_conversations() -> None:
+    visibility, checked = _visibility("mine")
+    stream = panel._inbox_event_stream(None, visibility, heartbeat=0.01)
+    assert await anext(stream) == "retry: 3000\n\n"
+    next_event = asyncio.ensure_future(anext(stream))
+    await asyncio.sleep(0)
+
+    for conversation_id in ("ajena", "ajena", "mine"):
+        inbox_events.publish(
+            {"type": "message", "conversation_id": conversation_id, "preview": "secreto"}
+        )
+
+    event = await next_event
+    await stream.aclose()
+
+    assert '"conversation_id": "mine"' in event
+    # La segunda "ajena" sale del caché de visibilidad sin otra consulta.
+    assert checked == ["ajena", "mine"]
+
+
+@pytest.mark.asyncio
+async def test_inbox_stream_ends_when_token_is_rejected() -> None:
+    async def expired(token: str, ids: Any) -> set[str]:
+        raise inbox_events.VisibilityExpired()
+
+    visibility = inbox_events.VisibilityFilter("user-jwt", ttl=60, fetch=expired)
+    stream = panel._inbox_event_stream(None, visibility, heartbeat=0.01)
+    assert await anext(stream) == "retry: 3000\n\n"
+    next_event = asyncio.ensure_future(anext(stream))
+    await asyncio.sleep(0)
+    inbox_events.publish({"type": "message", "conversation_id": "c1"})
+
+    with pytest.raises(StopAsyncIteration):
+        await next_event
+
+
+@pytest.mark.asyncio
+async def test_inbox_stream_requires_header_or_ticket(async_client: AsyncClient) -> None:
+    response = await async_client.get("/inbox/stream", params={"access_token": "no-es-jwt"})
+    assert response.status_code == 401
+
+    response = await async_client.get("/inbox/stream", params={"ticket": "inventado"})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_stream_tickets_are_single_use(
+    monkeypatch: pytest.MonkeyPatch, async_client: AsyncClient
+) -> None:
+    monkeypatch.setattr(panel, "_jwt_verify_and_claims", lambda token: {"sub": "agente-1"})
+
+    issued = await async_client.post(
+        "/inbox/stream/ticket", headers={"Authorization": "Bearer user-jwt"}
+    )
+    ticket = issued.json()["ticket"]
+
+    grant = inbox_events.tickets.redeem(ticket)
+    assert grant is not None
+    assert (grant.user_id, grant.token) == ("agente-1", "user-jwt")
+    assert inbox_events.tickets.redeem(ticket) is None
@@ -0,0 +1,72 @@
+"""Pruebas de la base local de rangos IP."""
+
+from __future__ import annotations
+
+import gzip
+from pathlib import Path
+
+import pytest
+
+from app.core.config import settings
+from app.services import geolocation, ip_database
+
+CSV = """network,start_ip,end_ip,city,region,country,latitude,longitude,timezone,asn
+187.188.0.0/16,,,Monterrey,Nuevo León,MX,25.67,-100.31,America/Monterrey,AS8151
+,200.0.0.0,200.0.0.255,Guadalajara,Jalisco,MX,20.67,-103.35,America/Mexico_City,
+,3355443200,3355443455,Guadalajara,Jalisco,MX,20.67,-103.35,America/Mexico_City,
+2001:db8::/32,,,Madrid,Madrid,ES,40.41,-3.70,Europe/Madrid,AS3352
+no-es-red,,,X,X,X,,,,
+"""
+
+
+@pytest.fixture
+def db_file(tmp_path: Path) -> Path:
+    path = tmp_path / "ip_ranges.csv"
+    path.write_text(CSV, encoding="utf-8")
+    return path
+
+
+def test_lookup_resolves_ranges_by_binary_search(db_file: Path) -> None:
+    database = ip_database.IPRangeDatabase(ip_database._iter_csv(db_file))
+
+    assert len(database) == 4
+    assert database.skipped == 1
+    # Las dos filas de Guadalajara comparten un solo registro.
+    assert len(database.records) == 3
+
+    assert database.lookup("187.188.10.20")["city"] == "Monterrey"
+    assert database.lookup("200.0.0.255")["region"] == "Jalisco"
+    assert database.lookup("200.0.1.0") is None
+    assert database.lookup("2001:db8::1")["country"] == "ES"
+    assert database.lookup("::ffff:187.188.0.1")["city"] == "Monterrey"
+    assert database.lookup("basura") is None
+
+
+def test_gzip_dump_is_supported(tmp_path: Path) -> None:
+    path = tmp_path / "ip_ranges.csv.gz"
+    path.write_bytes(gzip.compress(CSV.encode()))
+    database = ip_database.IPRangeDatabase(ip_database._iter_csv(path))
+    assert database.lookup("187.188.0.1")["city"] == "Monterrey"
+
+
+@pytest.mark.asyncio
+async def test_local_provider_returns_normalized_dict(
+    db_file: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "geolocation_provider", "local")
+    monkeypatch.setattr(settings, "geolocation_db_path", str(db_file))
+    monkeypatch.setattr(geolocation, "_get_client", lambda: pytest.fail("no debe usar red"))
+
+    result = await geolocation.lookup_ip("187.188.1.1")
+
+    assert result == {
+        "ip": "187.188.1.1",
+        "city": "Monterrey",
+        "region": "Nuevo León",
+        "country": "MX",
+        "latitude": 25.67,
+        "longitude": -100.31,
+        "timezone": "America/Monterrey",
+        "asn": "AS8151",
+    }
+    assert await geolocation.lookup_ip("10.0.0.1") is None
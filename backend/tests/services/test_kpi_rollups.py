@@ -0,0 +1,70 @@
+"""Verificación del scheduler de los rollups de tiempos de respuesta."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+
+import pytest
+
+from app.services import kpi_rollups
+from tests.helpers import DummyResponse
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        kpi_rollups, "_STATS", {"scheduler": "desconocido", "corridas": 0, "dias_procesados": 0}
+    )
+
+
+@pytest.mark.asyncio
+async def test_scheduled_job_is_left_to_pg_cron(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[str] = []
+
+    async def fake_rpc(name: str, payload: Any = None, **_: Any) -> DummyResponse:
+        calls.append(name)
+        return DummyResponse(200, {"pg_cron": True, "pendientes": 0})
+
+    monkeypatch.setattr(kpi_rollups.postgrest, "rpc", fake_rpc)
+
+    await kpi_rollups._supervise(interval=0.001)
+
+    assert calls == ["kpi_rollups_estado"]
+    assert kpi_rollups.stats()["scheduler"] == "pg_cron"
+
+
+@pytest.mark.asyncio
+async def test_missing_scheduler_is_logged_and_run_in_process(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    batches = [31, 4, 0]
+    calls: list[str] = []
+
+    async def fake_rpc(name: str, payload: Any = None, **_: Any) -> DummyResponse:
+        calls.append(name)
+        if name == "kpi_rollups_estado":
+            return DummyResponse(
+                200, {"pg_cron": False, "pendientes": 35, "pendiente_mas_antiguo": "2025-10-01"}
+            )
+        return DummyResponse(200, batches.pop(0) if batches else 0)
+
+    monkeypatch.setattr(kpi_rollups.postgrest, "rpc", fake_rpc)
+
+    with caplog.at_level(logging.ERROR):
+        task = asyncio.create_task(kpi_rollups._supervise(interval=0.001))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert any(record.getMessage() == "kpi.rollups_sin_scheduler" for record in caplog.records)
+    assert calls[:4] == [
+        "kpi_rollups_estado",
+        "kpi_procesar_pendientes",
+        "kpi_procesar_pendientes",
+        "kpi_procesar_pendientes",
+    ]
+    stats = kpi_rollups.stats()
+    assert stats["scheduler"] == "proceso"
+    assert stats["dias_procesados"] == 35
@@ -0,0 +1,121 @@
+"""Pruebas del gateway PostgREST compartido."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services import postgrest, storage, supabase
+
+
+@pytest.fixture
+def sb_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "supabase_url", "https://sb.test/")
+    monkeypatch.setattr(settings, "supabase_service_role", "service-key")
+    monkeypatch.setattr(settings, "supabase_anon", "anon-key")
+    monkeypatch.setattr(settings, "supabase_read_retries", 1)
+
+
+def _install(monkeypatch: pytest.MonkeyPatch, handler: Any) -> supabase.SupabaseClient:
+    client = supabase.SupabaseClient(
+        max_connections=4,
+        max_keepalive_connections=2,
+        keepalive_expiry=5.0,
+        timeout=5.0,
+        connect_timeout=1.0,
+        http2=False,
+        transport=httpx.MockTransport(handler),
+    )
+    monkeypatch.setattr(supabase, "_CLIENT", client)
+    return client
+
+
+def test_build_headers_modes(sb_env: None) -> None:
+    service = postgrest.build_headers(prefer="count=exact")
+    assert service["Authorization"] == "Bearer service-key"
+    assert service["apikey"] == "service-key"
+    assert service["Prefer"] == "count=exact"
+    assert "Content-Type" not in service
+
+    user = postgrest.build_headers(token="user-jwt", with_body=True)
+    assert user["Authorization"] == "Bearer user-jwt"
+    assert user["apikey"] == "anon-key"
+    assert user["Content-Type"] == "application/json"
+
+
+def test_build_headers_without_service_role(sb_env: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "supabase_service_role", None)
+    with pytest.raises(postgrest.PostgrestConfigError):
+        postgrest.build_headers()
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [("0-24/120", 120), ("*/0", 0), ("0-9/*", None), (None, None), ("basura", None)],
+)
+def test_content_range_total(header: str | None, expected: int | None) -> None:
+    assert postgrest.content_range_total(header) == expected
+
+
+def test_response_error_parsing() -> None:
+    resp = httpx.Response(409, json={"message": "duplicado", "code": "23505", "hint": "x"})
+    err = postgrest.PostgrestResponseError.from_response(resp, "fallback")
+    assert (err.http_status, err.message, err.code) == (409, "duplicado", "23505")
+
+    odd = httpx.Response(200, text="")
+    err = postgrest.PostgrestResponseError.from_response(odd, "fallback")
+    assert (err.http_status, err.message) == (502, "fallback")
+
+
+@pytest.mark.asyncio
+async def test_get_is_retried_on_network_error(
+    sb_env: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.method)
+        if len(calls) == 1:
+            raise httpx.ConnectError("boom", request=request)
+        return httpx.Response(200, json=[{"id": 1}])
+
+    client = _install(monkeypatch, handler)
+    resp = await postgrest.get("/rest/v1/roles", params={"select": "id"})
+    await client.aclose()
+
+    assert resp.json() == [{"id": 1}]
+    assert calls == ["GET", "GET"]
+
+
+@pytest.mark.asyncio
+async def test_writes_are_not_retried(sb_env: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.method)
+        raise httpx.ConnectError("boom", request=request)
+
+    client = _install(monkeypatch, handler)
+    with pytest.raises(storage.StorageError, match="Error de red al"):
+        await storage.record_webchat_session_closure("sess-1")
+    await client.aclose()
+
+    assert calls == ["POST"]
+
+
+@pytest.mark.asyncio
+async def test_storage_error_message_on_http_error(
+    sb_env: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["Prefer"] == "return=representation"
+        assert request.url.params["id"] == "eq.c-1"
+        return httpx.Response(500, text="fallo")
+
+    client = _install(monkeypatch, handler)
+    with pytest.raises(storage.StorageError, match="respondió error al actualizar conversación"):
+        await storage.update_conversation("c-1", {"estado": "cerrada"})
+    await client.aclose()
@@ -0,0 +1,76 @@
+"""Pruebas del cliente HTTP compartido de Supabase."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services import storage, supabase
+
+
+def _client_with(handler: Any) -> supabase.SupabaseClient:
+    return supabase.SupabaseClient(
+        max_connections=4,
+        max_keepalive_connections=2,
+        keepalive_expiry=5.0,
+        timeout=10.0,
+        connect_timeout=2.0,
+        http2=False,
+        transport=httpx.MockTransport(handler),
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_client_is_reused_until_shutdown() -> None:
+    await supabase.shutdown()
+    first = supabase.get_client()
+    assert supabase.get_client() is first
+
+    await supabase.shutdown()
+    assert first.is_closed
+    assert supabase.get_client() is not first
+    await supabase.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_storage_calls_share_pooled_client(monkeypatch: pytest.MonkeyPatch) -> None:
+    seen: list[tuple[str, str, Any]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.method, request.url.path, request.extensions.get("timeout")))
+        return httpx.Response(200, json=[{"conversacion_id": "c-1", "mensaje_id": "m-1"}])
+
+    client = _client_with(handler)
+    monkeypatch.setattr(supabase, "_CLIENT", client)
+    monkeypatch.setattr(settings, "supabase_url", "https://sb.test")
+    monkeypatch.setattr(settings, "supabase_service_role", "service-key")
+
+    for _ in range(3):
+        result = await storage.register_webchat_message(
+            session_id="sess-1", author="user", content="hola"
+        )
+        assert result["conversation_id"] == "c-1"
+
+    assert [path for _, path, _ in seen] == ["/rest/v1/rpc/registrar_mensaje_webchat"] * 3
+    assert seen[0][2]["connect"] == 2.0
+    assert not client.is_closed
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_per_operation_timeout_overrides_default() -> None:
+    captured: dict[str, Any] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        captured.update(request.extensions.get("timeout") or {})
+        return httpx.Response(200, json=[])
+
+    client = _client_with(handler)
+    await client.get("https://sb.test/rest/v1/x", timeout=1.5)
+    await client.aclose()
+
+    assert captured["read"] == 1.5
+    assert captured["connect"] == 2.0
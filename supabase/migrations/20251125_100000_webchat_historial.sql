@@ -0,0 +1,53 @@
+BEGIN;
+
+-- Historial del widget en una sola llamada: resuelve session_id → contacto →
+-- conversación webchat más reciente y devuelve sus últimos mensajes en orden
+-- cronológico. Con p_since sólo se devuelven mensajes posteriores al cursor.
+-- Retorna NULL cuando la sesión aún no tiene conversación.
+CREATE OR REPLACE FUNCTION public.webchat_historial(
+    p_session_id text,
+    p_limit integer DEFAULT 100,
+    p_since timestamptz DEFAULT NULL
+) RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH conv AS (
+        SELECT c.id,
+               COALESCE(cc.manual_override, false) AS manual_override
+          FROM public.identidades_canal AS ic
+          JOIN public.conversaciones AS c
+            ON c.contacto_id = ic.contacto_id
+           AND c.canal = 'webchat'
+          LEFT JOIN public.conversaciones_controles AS cc
+            ON cc.conversacion_id = c.id
+         WHERE ic.canal = 'webchat'
+           AND ic.id_externo = p_session_id
+         ORDER BY c.iniciada_en DESC
+         LIMIT 1
+    ),
+    recientes AS (
+        SELECT m.id, m.direccion, m.texto, m.creado_en, m.datos
+          FROM public.mensajes AS m
+          JOIN conv ON m.conversacion_id = conv.id
+         WHERE p_since IS NULL OR m.creado_en > p_since
+         ORDER BY m.creado_en DESC
+         LIMIT GREATEST(COALESCE(p_limit, 100), 1)
+    )
+    SELECT jsonb_build_object(
+               'conversacion_id', conv.id,
+               'manual_override', conv.manual_override,
+               'mensajes', COALESCE(
+                   (SELECT jsonb_agg(to_jsonb(r) ORDER BY r.creado_en ASC) FROM recientes AS r),
+                   '[]'::jsonb
+               )
+           )
+      FROM conv;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.webchat_historial(text, integer, timestamptz)
+    TO postgres, service_role;
+
+COMMIT;
@@ -0,0 +1,22 @@
+BEGIN;
+
+-- Índices para la paginación por cursor (keyset) de GET /leads: cada orden
+-- soportado se recorre como (columna, id) sin escanear ni saltar filas previas.
+-- `creado_en` y `actualizado_en` son NOT NULL, así que el backend ordena sin
+-- `NULLS LAST` y un mismo índice sirve ambos sentidos (el ascendente lo recorre
+-- hacia atrás). `lead_score` admite nulos y se ordena con `NULLS LAST` en los
+-- dos sentidos; el recorrido inverso de un índice cambia también la posición de
+-- los nulos, por eso lleva un índice por sentido.
+CREATE INDEX IF NOT EXISTS lead_tarjetas_creado_id_idx
+    ON public.lead_tarjetas (creado_en DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS lead_tarjetas_actualizado_id_idx
+    ON public.lead_tarjetas (actualizado_en DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS lead_tarjetas_score_id_idx
+    ON public.lead_tarjetas (lead_score DESC NULLS LAST, id DESC);
+
+CREATE INDEX IF NOT EXISTS lead_tarjetas_score_asc_id_idx
+    ON public.lead_tarjetas (lead_score ASC NULLS LAST, id ASC);
+
+COMMIT;
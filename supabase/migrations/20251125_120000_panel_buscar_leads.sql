@@ -0,0 +1,159 @@
+BEGIN;
+
+-- Supabase instala las extensiones en el esquema `extensions`; si ya existen en
+-- otro esquema `CREATE EXTENSION IF NOT EXISTS` no las mueve, así que el esquema
+-- real se consulta en pg_extension en lugar de suponerlo. El search_path de la
+-- transacción lo incluye para `gin_trgm_ops` y `similarity()` más abajo.
+CREATE SCHEMA IF NOT EXISTS extensions;
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA extensions;
+CREATE EXTENSION IF NOT EXISTS unaccent WITH SCHEMA extensions;
+
+DO $$
+DECLARE
+    v_trgm text;
+    v_unaccent text;
+BEGIN
+    SELECT n.nspname INTO v_trgm
+      FROM pg_extension AS e
+      JOIN pg_namespace AS n ON n.oid = e.extnamespace
+     WHERE e.extname = 'pg_trgm';
+    SELECT n.nspname INTO v_unaccent
+      FROM pg_extension AS e
+      JOIN pg_namespace AS n ON n.oid = e.extnamespace
+     WHERE e.extname = 'unaccent';
+
+    PERFORM set_config('search_path', format('public, %I, %I', v_trgm, v_unaccent), true);
+
+    -- unaccent() es STABLE; este envoltorio fija el diccionario para poder indexarlo.
+    EXECUTE format(
+        $f$
+        CREATE OR REPLACE FUNCTION public.f_unaccent(p_text text)
+        RETURNS text
+        LANGUAGE sql
+        IMMUTABLE
+        PARALLEL SAFE
+        STRICT
+        AS $body$
+            SELECT %1$I.unaccent(%2$L::regdictionary, p_text);
+        $body$
+        $f$,
+        v_unaccent,
+        format('%I.unaccent', v_unaccent)
+    );
+END
+$$;
+
+-- Texto de búsqueda de un contacto: minúsculas y sin acentos ("José" → "jose").
+CREATE OR REPLACE FUNCTION public.contacto_busqueda_texto(
+    p_nombre text,
+    p_correo text,
+    p_empresa text
+) RETURNS text
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT lower(public.f_unaccent(
+        coalesce(p_nombre, '') || ' ' || coalesce(p_correo, '') || ' ' || coalesce(p_empresa, '')
+    ));
+$$;
+
+-- Sólo dígitos: "+52 (55) 1234-5678" → "525512345678".
+CREATE OR REPLACE FUNCTION public.solo_digitos(p_text text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT regexp_replace(coalesce(p_text, ''), '\D', '', 'g');
+$$;
+
+CREATE INDEX IF NOT EXISTS contactos_busqueda_trgm_idx
+    ON public.contactos
+    USING gin (public.contacto_busqueda_texto(nombre_completo, correo, company_name) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS contactos_busqueda_tsv_idx
+    ON public.contactos
+    USING gin (to_tsvector('simple', public.contacto_busqueda_texto(nombre_completo, correo, company_name)));
+
+CREATE INDEX IF NOT EXISTS contactos_telefono_digitos_trgm_idx
+    ON public.contactos
+    USING gin (public.solo_digitos(telefono_e164) gin_trgm_ops);
+
+-- Tarjetas cuyo contacto coincide con p_q, de la más a la menos relevante.
+-- SECURITY INVOKER y STABLE: respeta RLS y PostgREST permite embeber relaciones
+-- y aplicar filtros/limit sobre el resultado (GET /rpc/panel_buscar_leads?select=...).
+-- El search_path de la función se fija al final, con el esquema de pg_trgm.
+CREATE OR REPLACE FUNCTION public.panel_buscar_leads(p_q text)
+RETURNS SETOF public.lead_tarjetas
+LANGUAGE sql
+STABLE
+AS $$
+    WITH termino AS (
+        SELECT t.texto,
+               replace(replace(replace(t.texto, '\', '\\'), '%', '\%'), '_', '\_') AS patron,
+               public.solo_digitos(p_q) AS digitos
+          FROM (SELECT lower(public.f_unaccent(trim(coalesce(p_q, '')))) AS texto) AS t
+    ),
+    coincidencias AS (
+        SELECT c.id AS contacto_id,
+               GREATEST(
+                   similarity(
+                       public.contacto_busqueda_texto(c.nombre_completo, c.correo, c.company_name),
+                       t.texto
+                   ),
+                   ts_rank(
+                       to_tsvector(
+                           'simple',
+                           public.contacto_busqueda_texto(c.nombre_completo, c.correo, c.company_name)
+                       ),
+                       plainto_tsquery('simple', t.texto)
+                   ),
+                   CASE
+                       WHEN length(t.digitos) >= 3
+                        AND public.solo_digitos(c.telefono_e164) LIKE '%' || t.digitos || '%'
+                       THEN 1.0
+                       ELSE 0.0
+                   END
+               ) AS rango
+          FROM public.contactos AS c
+         CROSS JOIN termino AS t
+         WHERE length(t.texto) > 0
+           AND (
+                public.contacto_busqueda_texto(c.nombre_completo, c.correo, c.company_name)
+                    LIKE '%' || t.patron || '%'
+             OR to_tsvector(
+                    'simple',
+                    public.contacto_busqueda_texto(c.nombre_completo, c.correo, c.company_name)
+                ) @@ plainto_tsquery('simple', t.texto)
+             OR (
+                    length(t.digitos) >= 3
+                AND public.solo_digitos(c.telefono_e164) LIKE '%' || t.digitos || '%'
+                )
+           )
+    )
+    SELECT lt.*
+      FROM public.lead_tarjetas AS lt
+      JOIN coincidencias AS co ON co.contacto_id = lt.contacto_id
+     ORDER BY co.rango DESC, lt.actualizado_en DESC, lt.id DESC;
+$$;
+
+DO $$
+BEGIN
+    EXECUTE format(
+        'ALTER FUNCTION public.panel_buscar_leads(text) SET search_path = public, %I',
+        (SELECT n.nspname
+           FROM pg_extension AS e
+           JOIN pg_namespace AS n ON n.oid = e.extnamespace
+          WHERE e.extname = 'pg_trgm')
+    );
+END
+$$;
+
+GRANT EXECUTE ON FUNCTION public.panel_buscar_leads(text) TO postgres, service_role, authenticated;
+GRANT EXECUTE ON FUNCTION public.f_unaccent(text) TO postgres, service_role, authenticated;
+GRANT EXECUTE ON FUNCTION public.contacto_busqueda_texto(text, text, text)
+    TO postgres, service_role, authenticated;
+GRANT EXECUTE ON FUNCTION public.solo_digitos(text) TO postgres, service_role, authenticated;
+
+COMMIT;
@@ -0,0 +1,717 @@
+BEGIN;
+
+-- Rollups diarios (días UTC, igual que los rangos del panel) para dashboard_kpis.
+--
+-- * kpi_conversaciones_diarias / kpi_contactos_diarios: contadores por día de
+--   creación y dimensiones del KPI, ajustados por triggers (+1/-1) al insertar,
+--   borrar o cambiar estado/canal/origen. Siempre están al día, incluido hoy.
+-- * kpi_respuestas_diarias: latencia de primera respuesta por mensaje entrante,
+--   agregada por día del entrante y en buckets. Un saliente puede cerrar
+--   entrantes de días previos, así que el trigger de mensajes sólo marca los días
+--   afectados en kpi_respuestas_pendientes y kpi_procesar_pendientes() los
+--   recalcula (pg_cron cuando está disponible; si no, el backend). Hoy y los días pendientes se
+--   leen siempre en crudo, por lo que el resultado es correcto aunque el job vaya
+--   atrasado.
+--
+-- dashboard_kpis lee los rollups para los días completos del rango y sólo
+-- escanea filas crudas en los días parciales de los extremos.
+
+CREATE TABLE IF NOT EXISTS public.kpi_conversaciones_diarias (
+    dia date NOT NULL,
+    canal text NOT NULL,
+    estado text NOT NULL,
+    total bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, canal, estado)
+);
+
+CREATE TABLE IF NOT EXISTS public.kpi_contactos_diarios (
+    dia date NOT NULL,
+    estado text NOT NULL,
+    captura_estado text NOT NULL,
+    origen text NOT NULL,
+    total bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, estado, captura_estado, origen)
+);
+
+CREATE TABLE IF NOT EXISTS public.kpi_respuestas_diarias (
+    dia date NOT NULL,
+    bucket text NOT NULL,
+    respondidos bigint NOT NULL,
+    suma_segundos double precision NOT NULL,
+    maximo_segundos double precision NOT NULL,
+    PRIMARY KEY (dia, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS public.kpi_respuestas_pendientes (
+    dia date PRIMARY KEY,
+    marcado_en timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.kpi_conversaciones_diarias ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.kpi_contactos_diarios ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.kpi_respuestas_diarias ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.kpi_respuestas_pendientes ENABLE ROW LEVEL SECURITY;
+
+-- Rangos crudos de los extremos y búsqueda de la primera respuesta por conversación.
+CREATE INDEX IF NOT EXISTS conversaciones_iniciada_en_idx
+    ON public.conversaciones (iniciada_en);
+
+CREATE INDEX IF NOT EXISTS contactos_creado_en_idx
+    ON public.contactos (creado_en);
+
+CREATE INDEX IF NOT EXISTS mensajes_entrantes_creado_idx
+    ON public.mensajes (creado_en)
+    WHERE direccion = 'entrante';
+
+CREATE INDEX IF NOT EXISTS mensajes_conversacion_direccion_creado_idx
+    ON public.mensajes (conversacion_id, direccion, creado_en);
+
+CREATE OR REPLACE FUNCTION public._kpi_dia(p_ts timestamptz)
+RETURNS date
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT (p_ts AT TIME ZONE 'UTC')::date;
+$$;
+
+CREATE OR REPLACE FUNCTION public._kpi_inicio_dia(p_dia date)
+RETURNS timestamptz
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT p_dia::timestamp AT TIME ZONE 'UTC';
+$$;
+
+CREATE OR REPLACE FUNCTION public._kpi_bucket_respuesta(p_segundos double precision)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN p_segundos < 60 THEN 'hasta_1m'
+        WHEN p_segundos < 300 THEN 'hasta_5m'
+        WHEN p_segundos < 900 THEN 'hasta_15m'
+        WHEN p_segundos < 3600 THEN 'hasta_1h'
+        WHEN p_segundos < 14400 THEN 'hasta_4h'
+        WHEN p_segundos < 86400 THEN 'hasta_24h'
+        ELSE 'mas_24h'
+    END;
+$$;
+
+-- Latencia de primera respuesta de cada entrante creado en [p_desde, p_hasta]:
+-- primer saliente de la misma conversación en o después del entrante. Sin
+-- SECURITY DEFINER ni SET para que el planner pueda inlinearla.
+CREATE OR REPLACE FUNCTION public._kpi_respuestas(p_desde timestamptz, p_hasta timestamptz)
+RETURNS TABLE (entrante_en timestamptz, segundos double precision)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT i.creado_en,
+           EXTRACT(EPOCH FROM (r.respuesta_en - i.creado_en))::double precision
+      FROM public.mensajes AS i
+      CROSS JOIN LATERAL (
+          SELECT MIN(o.creado_en) AS respuesta_en
+            FROM public.mensajes AS o
+           WHERE o.conversacion_id = i.conversacion_id
+             AND o.direccion = 'saliente'
+             AND o.creado_en >= i.creado_en
+      ) AS r
+     WHERE i.direccion = 'entrante'
+       AND i.creado_en >= p_desde
+       AND i.creado_en <= p_hasta
+       AND r.respuesta_en > i.creado_en;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- Conversaciones
+-- ---------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public._kpi_conversaciones_sumar(
+    p_iniciada_en timestamptz,
+    p_canal text,
+    p_estado text,
+    p_delta integer
+) RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    INSERT INTO public.kpi_conversaciones_diarias AS k (dia, canal, estado, total)
+    VALUES (
+        public._kpi_dia(p_iniciada_en),
+        COALESCE(lower(NULLIF(p_canal, '')), ''),
+        COALESCE(NULLIF(lower(p_estado), ''), 'desconocido'),
+        p_delta
+    )
+    ON CONFLICT (dia, canal, estado)
+    DO UPDATE SET total = k.total + EXCLUDED.total;
+$$;
+
+CREATE OR REPLACE FUNCTION public.tg_conversaciones_kpi_diario()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM public._kpi_conversaciones_sumar(OLD.iniciada_en, OLD.canal, OLD.estado, -1);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM public._kpi_conversaciones_sumar(NEW.iniciada_en, NEW.canal, NEW.estado, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+COMMENT ON FUNCTION public.tg_conversaciones_kpi_diario()
+    IS 'Mantiene kpi_conversaciones_diarias al crear, borrar o cambiar de estado/canal.';
+
+DROP TRIGGER IF EXISTS conversaciones_kpi_diario ON public.conversaciones;
+CREATE TRIGGER conversaciones_kpi_diario
+    AFTER INSERT OR DELETE
+    ON public.conversaciones
+    FOR EACH ROW
+    EXECUTE FUNCTION public.tg_conversaciones_kpi_diario();
+
+DROP TRIGGER IF EXISTS conversaciones_kpi_diario_update ON public.conversaciones;
+CREATE TRIGGER conversaciones_kpi_diario_update
+    AFTER UPDATE
+    ON public.conversaciones
+    FOR EACH ROW
+    WHEN (
+        OLD.iniciada_en IS DISTINCT FROM NEW.iniciada_en
+        OR OLD.canal IS DISTINCT FROM NEW.canal
+        OR OLD.estado IS DISTINCT FROM NEW.estado
+    )
+    EXECUTE FUNCTION public.tg_conversaciones_kpi_diario();
+
+-- ---------------------------------------------------------------------------
+-- Contactos
+-- ---------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public._kpi_contactos_sumar(
+    p_creado_en timestamptz,
+    p_estado text,
+    p_captura_estado text,
+    p_origen text,
+    p_delta integer
+) RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    INSERT INTO public.kpi_contactos_diarios AS k (dia, estado, captura_estado, origen, total)
+    VALUES (
+        public._kpi_dia(p_creado_en),
+        COALESCE(NULLIF(lower(p_estado), ''), 'desconocido'),
+        COALESCE(NULLIF(lower(p_captura_estado), ''), 'incompleto'),
+        COALESCE(NULLIF(lower(p_origen), ''), 'desconocido'),
+        p_delta
+    )
+    ON CONFLICT (dia, estado, captura_estado, origen)
+    DO UPDATE SET total = k.total + EXCLUDED.total;
+$$;
+
+CREATE OR REPLACE FUNCTION public.tg_contactos_kpi_diario()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM public._kpi_contactos_sumar(
+            OLD.creado_en, OLD.estado, OLD.captura_estado, OLD.origen, -1
+        );
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM public._kpi_contactos_sumar(
+            NEW.creado_en, NEW.estado, NEW.captura_estado, NEW.origen, 1
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+COMMENT ON FUNCTION public.tg_contactos_kpi_diario()
+    IS 'Mantiene kpi_contactos_diarios al crear, borrar o cambiar estado/captura/origen.';
+
+-- captura_estado lo recalcula un trigger BEFORE, así que el de UPDATE compara
+-- la fila final en lugar de filtrar por columnas del SET.
+DROP TRIGGER IF EXISTS contactos_kpi_diario ON public.contactos;
+CREATE TRIGGER contactos_kpi_diario
+    AFTER INSERT OR DELETE
+    ON public.contactos
+    FOR EACH ROW
+    EXECUTE FUNCTION public.tg_contactos_kpi_diario();
+
+DROP TRIGGER IF EXISTS contactos_kpi_diario_update ON public.contactos;
+CREATE TRIGGER contactos_kpi_diario_update
+    AFTER UPDATE
+    ON public.contactos
+    FOR EACH ROW
+    WHEN (
+        OLD.creado_en IS DISTINCT FROM NEW.creado_en
+        OR OLD.estado IS DISTINCT FROM NEW.estado
+        OR OLD.captura_estado IS DISTINCT FROM NEW.captura_estado
+        OR OLD.origen IS DISTINCT FROM NEW.origen
+    )
+    EXECUTE FUNCTION public.tg_contactos_kpi_diario();
+
+-- ---------------------------------------------------------------------------
+-- Tiempos de respuesta
+-- ---------------------------------------------------------------------------
+
+-- Marca los días cuyo rollup cambia por un mensaje. Un entrante sólo afecta su
+-- día; un saliente responde a los entrantes posteriores al saliente anterior de
+-- la conversación, que pueden venir de días previos.
+CREATE OR REPLACE FUNCTION public._kpi_marcar_respuestas(
+    p_conversacion_id uuid,
+    p_direccion text,
+    p_creado_en timestamptz
+) RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_desde timestamptz := p_creado_en;
+BEGIN
+    IF p_direccion = 'saliente' THEN
+        SELECT COALESCE(MIN(i.creado_en), p_creado_en)
+          INTO v_desde
+          FROM public.mensajes AS i
+         WHERE i.conversacion_id = p_conversacion_id
+           AND i.direccion = 'entrante'
+           AND i.creado_en <= p_creado_en
+           AND i.creado_en > COALESCE((
+                SELECT MAX(o.creado_en)
+                  FROM public.mensajes AS o
+                 WHERE o.conversacion_id = p_conversacion_id
+                   AND o.direccion = 'saliente'
+                   AND o.creado_en < p_creado_en
+           ), '-infinity'::timestamptz);
+    END IF;
+
+    INSERT INTO public.kpi_respuestas_pendientes (dia)
+    SELECT gs::date
+      FROM generate_series(
+          public._kpi_dia(v_desde)::timestamp,
+          public._kpi_dia(p_creado_en)::timestamp,
+          interval '1 day'
+      ) AS gs
+    ON CONFLICT (dia) DO NOTHING;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.tg_mensajes_kpi_respuestas()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM public._kpi_marcar_respuestas(OLD.conversacion_id, OLD.direccion, OLD.creado_en);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM public._kpi_marcar_respuestas(NEW.conversacion_id, NEW.direccion, NEW.creado_en);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+COMMENT ON FUNCTION public.tg_mensajes_kpi_respuestas()
+    IS 'Marca en kpi_respuestas_pendientes los días cuyo tiempo de respuesta cambió.';
+
+DROP TRIGGER IF EXISTS mensajes_kpi_respuestas ON public.mensajes;
+CREATE TRIGGER mensajes_kpi_respuestas
+    AFTER INSERT OR DELETE OR UPDATE OF conversacion_id, direccion, creado_en
+    ON public.mensajes
+    FOR EACH ROW
+    EXECUTE FUNCTION public.tg_mensajes_kpi_respuestas();
+
+CREATE OR REPLACE FUNCTION public.kpi_recalcular_respuestas(p_dia date)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_desde timestamptz := public._kpi_inicio_dia(p_dia);
+BEGIN
+    -- Se desmarca antes de recalcular: un mensaje que llegue durante el cálculo
+    -- vuelve a marcar el día y se procesa en la siguiente corrida.
+    DELETE FROM public.kpi_respuestas_pendientes WHERE dia = p_dia;
+    DELETE FROM public.kpi_respuestas_diarias WHERE dia = p_dia;
+
+    INSERT INTO public.kpi_respuestas_diarias (
+        dia, bucket, respondidos, suma_segundos, maximo_segundos
+    )
+    SELECT p_dia,
+           public._kpi_bucket_respuesta(r.segundos),
+           COUNT(*),
+           SUM(r.segundos),
+           MAX(r.segundos)
+      FROM public._kpi_respuestas(v_desde, v_desde + interval '1 day' - interval '1 microsecond') AS r
+     GROUP BY 2;
+END;
+$$;
+
+COMMENT ON FUNCTION public.kpi_recalcular_respuestas(date)
+    IS 'Recalcula el rollup de tiempos de respuesta de un día (UTC) desde mensajes.';
+
+CREATE OR REPLACE FUNCTION public.kpi_procesar_pendientes(p_limite integer DEFAULT 31)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_dia date;
+    v_total integer := 0;
+BEGIN
+    -- El día en curso se lee siempre en crudo; se consolida cuando termina.
+    FOR v_dia IN
+        SELECT dia
+          FROM public.kpi_respuestas_pendientes
+         WHERE dia < public._kpi_dia(now())
+         ORDER BY dia
+         LIMIT GREATEST(p_limite, 1)
+           FOR UPDATE SKIP LOCKED
+    LOOP
+        PERFORM public.kpi_recalcular_respuestas(v_dia);
+        v_total := v_total + 1;
+    END LOOP;
+    RETURN v_total;
+END;
+$$;
+
+COMMENT ON FUNCTION public.kpi_procesar_pendientes(integer)
+    IS 'Consolida hasta p_limite días pendientes del rollup de tiempos de respuesta.';
+
+REVOKE ALL ON FUNCTION public.kpi_recalcular_respuestas(date) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.kpi_procesar_pendientes(integer) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.kpi_recalcular_respuestas(date) TO postgres, service_role;
+GRANT EXECUTE ON FUNCTION public.kpi_procesar_pendientes(integer) TO postgres, service_role;
+
+-- ---------------------------------------------------------------------------
+-- Carga inicial (los triggers ya bloquean escrituras concurrentes hasta COMMIT)
+-- ---------------------------------------------------------------------------
+
+DELETE FROM public.kpi_conversaciones_diarias;
+INSERT INTO public.kpi_conversaciones_diarias (dia, canal, estado, total)
+SELECT public._kpi_dia(iniciada_en),
+       COALESCE(lower(NULLIF(canal, '')), ''),
+       COALESCE(NULLIF(lower(estado), ''), 'desconocido'),
+       COUNT(*)
+  FROM public.conversaciones
+ GROUP BY 1, 2, 3;
+
+DELETE FROM public.kpi_contactos_diarios;
+INSERT INTO public.kpi_contactos_diarios (dia, estado, captura_estado, origen, total)
+SELECT public._kpi_dia(creado_en),
+       COALESCE(NULLIF(lower(estado), ''), 'desconocido'),
+       COALESCE(NULLIF(lower(captura_estado), ''), 'incompleto'),
+       COALESCE(NULLIF(lower(origen), ''), 'desconocido'),
+       COUNT(*)
+  FROM public.contactos
+ GROUP BY 1, 2, 3, 4;
+
+-- Días completos (antes de hoy) en una sola pasada; hoy se lee siempre en crudo.
+DELETE FROM public.kpi_respuestas_pendientes;
+DELETE FROM public.kpi_respuestas_diarias;
+INSERT INTO public.kpi_respuestas_diarias (dia, bucket, respondidos, suma_segundos, maximo_segundos)
+SELECT public._kpi_dia(r.entrante_en),
+       public._kpi_bucket_respuesta(r.segundos),
+       COUNT(*),
+       SUM(r.segundos),
+       MAX(r.segundos)
+  FROM public._kpi_respuestas(
+      '-infinity'::timestamptz,
+      public._kpi_inicio_dia(public._kpi_dia(now())) - interval '1 microsecond'
+  ) AS r
+ GROUP BY 1, 2;
+
+-- Estado del scheduler de kpi_procesar_pendientes. El backend lo consulta al
+-- arrancar: si no hay job de pg_cron lo reporta como error y consolida los días
+-- pendientes desde el proceso (app/services/kpi_rollups.py).
+CREATE OR REPLACE FUNCTION public.kpi_rollups_estado()
+RETURNS jsonb
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_programado boolean := false;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        EXECUTE 'SELECT EXISTS (SELECT 1 FROM cron.job WHERE jobname = $1 AND active)'
+           INTO v_programado
+          USING 'kpi_procesar_pendientes';
+    END IF;
+    RETURN (
+        SELECT jsonb_build_object(
+            'pg_cron', v_programado,
+            'pendientes', COUNT(*),
+            'pendiente_mas_antiguo', MIN(p.dia)
+        )
+          FROM public.kpi_respuestas_pendientes AS p
+         WHERE p.dia < public._kpi_dia(now())
+    );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.kpi_rollups_estado() FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.kpi_rollups_estado() TO postgres, service_role;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'kpi_procesar_pendientes',
+            '*/10 * * * *',
+            'SELECT public.kpi_procesar_pendientes()'
+        );
+    ELSE
+        RAISE WARNING 'pg_cron no disponible: kpi_procesar_pendientes() sin job programado'
+            USING HINT = 'El backend lo ejecuta cada TALIA_KPI_ROLLUP_INTERVAL_SECONDS; '
+                         || 'con varios procesos, programarlo en un scheduler externo.';
+    END IF;
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- dashboard_kpis sobre rollups
+-- ---------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public.dashboard_kpis(
+    p_from timestamptz DEFAULT NULL,
+    p_to timestamptz DEFAULT NULL
+) RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH limites AS (
+        SELECT
+            COALESCE(p_from, '-infinity'::timestamptz) AS lo,
+            COALESCE(p_to, 'infinity'::timestamptz) AS hi,
+            -- Primer y último día UTC contenidos por completo en [p_from, p_to].
+            CASE
+                WHEN p_from IS NULL THEN '-infinity'::date
+                ELSE public._kpi_dia(p_from - interval '1 microsecond') + 1
+            END AS d_from,
+            CASE
+                WHEN p_to IS NULL THEN 'infinity'::date
+                ELSE public._kpi_dia(p_to + interval '1 microsecond') - 1
+            END AS d_to,
+            public._kpi_dia(now()) AS hoy
+    ),
+    dias AS (
+        SELECT
+            l.*,
+            l.d_from <= l.d_to AS con_dias,
+            LEAST(l.d_to, l.hoy - 1) AS r_d_to,
+            l.d_from <= LEAST(l.d_to, l.hoy - 1) AS r_con_dias
+        FROM limites AS l
+    ),
+    -- Tramos parciales de los extremos que se leen de las tablas crudas.
+    ventanas AS (
+        SELECT d.lo AS desde,
+               CASE
+                   WHEN d.con_dias
+                       THEN LEAST(d.hi, public._kpi_inicio_dia(d.d_from) - interval '1 microsecond')
+                   ELSE d.hi
+               END AS hasta
+          FROM dias AS d
+        UNION ALL
+        SELECT public._kpi_inicio_dia(d.d_to + 1), d.hi
+          FROM dias AS d
+         WHERE d.con_dias
+    ),
+    -- Para tiempos de respuesta además se leen en crudo hoy y los días pendientes.
+    ventanas_respuesta AS (
+        SELECT d.lo AS desde,
+               CASE
+                   WHEN d.r_con_dias
+                       THEN LEAST(d.hi, public._kpi_inicio_dia(d.d_from) - interval '1 microsecond')
+                   ELSE d.hi
+               END AS hasta
+          FROM dias AS d
+        UNION ALL
+        SELECT public._kpi_inicio_dia(d.r_d_to + 1), d.hi
+          FROM dias AS d
+         WHERE d.r_con_dias
+        UNION ALL
+        SELECT public._kpi_inicio_dia(p.dia),
+               public._kpi_inicio_dia(p.dia + 1) - interval '1 microsecond'
+          FROM dias AS d
+          JOIN public.kpi_respuestas_pendientes AS p
+            ON p.dia BETWEEN d.d_from AND d.r_d_to
+         WHERE d.r_con_dias
+    ),
+    conv_rows AS (
+        SELECT k.estado, k.canal, k.total
+          FROM dias AS d
+          JOIN public.kpi_conversaciones_diarias AS k
+            ON k.dia BETWEEN d.d_from AND d.d_to
+         WHERE d.con_dias
+        UNION ALL
+        SELECT COALESCE(NULLIF(lower(c.estado), ''), 'desconocido'),
+               COALESCE(lower(NULLIF(c.canal, '')), ''),
+               1
+          FROM ventanas AS v
+          JOIN public.conversaciones AS c
+            ON c.iniciada_en >= v.desde
+           AND c.iniciada_en <= v.hasta
+    ),
+    conv_totals AS (
+        SELECT
+            COALESCE(SUM(total), 0) AS total,
+            COALESCE(SUM(total) FILTER (WHERE canal = 'webchat'), 0) AS webchat_total,
+            COUNT(DISTINCT canal) FILTER (WHERE canal <> '' AND total > 0) AS canales_activos
+        FROM conv_rows
+    ),
+    conv_by_state AS (
+        SELECT estado, SUM(total) AS total
+        FROM conv_rows
+        GROUP BY estado
+        HAVING SUM(total) > 0
+    ),
+    contactos_rows AS (
+        SELECT k.estado, k.captura_estado, k.origen, k.total
+          FROM dias AS d
+          JOIN public.kpi_contactos_diarios AS k
+            ON k.dia BETWEEN d.d_from AND d.d_to
+         WHERE d.con_dias
+        UNION ALL
+        SELECT COALESCE(NULLIF(lower(c.estado), ''), 'desconocido'),
+               COALESCE(NULLIF(lower(c.captura_estado), ''), 'incompleto'),
+               COALESCE(NULLIF(lower(c.origen), ''), 'desconocido'),
+               1
+          FROM ventanas AS v
+          JOIN public.contactos AS c
+            ON c.creado_en >= v.desde
+           AND c.creado_en <= v.hasta
+    ),
+    contactos_totals AS (
+        SELECT
+            COALESCE(SUM(total) FILTER (WHERE captura_estado = 'completo'), 0) AS total,
+            COALESCE(
+                SUM(total) FILTER (WHERE captura_estado = 'completo' AND origen = 'webchat'),
+                0
+            ) AS webchat_completos
+        FROM contactos_rows
+    ),
+    contactos_by_state AS (
+        SELECT estado, SUM(total) AS total
+        FROM contactos_rows
+        GROUP BY estado
+        HAVING SUM(total) > 0
+    ),
+    captura_by_state AS (
+        SELECT captura_estado, SUM(total) AS total
+        FROM contactos_rows
+        GROUP BY captura_estado
+        HAVING SUM(total) > 0
+    ),
+    visitantes AS (
+        SELECT COALESCE(total, 0) AS total
+        FROM public.embudo_visitantes_contador(p_from, p_to)
+    ),
+    webchat_visitas AS (
+        SELECT
+            COALESCE((SELECT total FROM visitantes), 0) AS visitas_sin_chat,
+            COALESCE((SELECT webchat_total FROM conv_totals), 0) AS conversaciones
+    ),
+    lead_visitas AS (
+        SELECT COUNT(*)::bigint AS total
+        FROM public.panel_leads_geo_base(NULL, p_from, p_to)
+    ),
+    total_visitas AS (
+        SELECT
+            COALESCE((SELECT total FROM visitantes), 0)
+            + COALESCE((SELECT total FROM lead_visitas), 0) AS total
+    ),
+    respuestas AS (
+        SELECT k.bucket, k.respondidos, k.suma_segundos, k.maximo_segundos
+          FROM dias AS d
+          JOIN public.kpi_respuestas_diarias AS k
+            ON k.dia BETWEEN d.d_from AND d.r_d_to
+         WHERE d.r_con_dias
+           AND NOT EXISTS (
+               SELECT 1 FROM public.kpi_respuestas_pendientes AS p WHERE p.dia = k.dia
+           )
+        UNION ALL
+        SELECT public._kpi_bucket_respuesta(r.segundos), 1, r.segundos, r.segundos
+          FROM ventanas_respuesta AS v
+          CROSS JOIN LATERAL public._kpi_respuestas(v.desde, v.hasta) AS r
+         WHERE v.desde <= v.hasta
+    ),
+    response_summary AS (
+        SELECT
+            SUM(suma_segundos) / NULLIF(SUM(respondidos), 0) AS promedio_segundos,
+            MAX(maximo_segundos) AS maximo_segundos,
+            COALESCE(SUM(respondidos), 0) AS respondidos
+        FROM respuestas
+    ),
+    response_buckets AS (
+        SELECT bucket, SUM(respondidos) AS total
+        FROM respuestas
+        GROUP BY bucket
+    )
+    SELECT jsonb_build_object(
+        'conversaciones', jsonb_build_object(
+            'total', (SELECT total FROM conv_totals),
+            'por_estado', COALESCE((
+                SELECT jsonb_object_agg(estado, total ORDER BY estado)
+                FROM conv_by_state
+            ), '{}'::jsonb),
+            'webchat_total', (SELECT webchat_total FROM conv_totals),
+            'canales_activos', (SELECT canales_activos FROM conv_totals)
+        ),
+        'contactos', jsonb_build_object(
+            'total', (SELECT total FROM contactos_totals),
+            'por_estado', COALESCE((
+                SELECT jsonb_object_agg(estado, total ORDER BY estado)
+                FROM contactos_by_state
+            ), '{}'::jsonb),
+            'captura', COALESCE((
+                SELECT jsonb_object_agg(captura_estado, total ORDER BY captura_estado)
+                FROM captura_by_state
+            ), '{}'::jsonb)
+        ),
+        'visitantes', COALESCE((SELECT total FROM visitantes), 0),
+        'visitas_totales', COALESCE((SELECT total FROM total_visitas), 0),
+        'tiempos_respuesta', (
+            SELECT jsonb_build_object(
+                'promedio', promedio_segundos,
+                'maximo', maximo_segundos,
+                'respondidos', respondidos,
+                'distribucion', COALESCE((
+                    SELECT jsonb_object_agg(bucket, total ORDER BY bucket)
+                    FROM response_buckets
+                ), '{}'::jsonb)
+            )
+            FROM response_summary
+        ),
+        'webchat', (
+            SELECT jsonb_build_object(
+                'visitas_sin_chat', visitas_sin_chat,
+                'conversaciones', conversaciones,
+                'visitas_totales', visitas_sin_chat + conversaciones,
+                'contactos_completos', (SELECT webchat_completos FROM contactos_totals)
+            )
+            FROM webchat_visitas
+        )
+    );
+$$;
+
+GRANT EXECUTE ON FUNCTION public.dashboard_kpis(timestamptz, timestamptz)
+    TO postgres, service_role, authenticated;
+
+COMMIT;
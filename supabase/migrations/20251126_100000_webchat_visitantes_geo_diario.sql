@@ -0,0 +1,844 @@
+BEGIN;
+
+-- Rollups diarios (días UTC, igual que dashboard_kpis) para los mapas de
+-- visitantes y el embudo, de modo que no agreguen filas crudas en cada consulta.
+--
+-- * webchat_visitantes_geo_diario: sesiones del landing por día de último evento
+--   (ultimo_evento_en) y geografía, como el mapa mundial. Un trigger sobre
+--   webchat_visitantes mueve la sesión de bucket (-1/+1) sólo si cambió el día o
+--   la geografía.
+-- * webchat_cierres_sin_chat_diario: cierres de webchat_session_closures cuya
+--   sesión no tiene mensajes entrantes, por día de closed_at y geografía del
+--   visitante. Es la definición de "visitantes sin chat" de
+--   embudo_visitantes_contador y de los mapas sin chat (20251103_120000). Se
+--   ajusta al registrar o borrar un cierre, al llegar (o borrarse) el primer
+--   entrante de la sesión y al cambiar la geografía del visitante.
+--
+-- Los RPC suman el rollup para los días completos del rango y leen filas crudas
+-- sólo en los días parciales de los extremos.
+
+CREATE INDEX IF NOT EXISTS mensajes_webchat_session_entrante_idx
+    ON public.mensajes ((datos ->> 'session_id'))
+    WHERE direccion = 'entrante';
+
+CREATE INDEX IF NOT EXISTS webchat_visitantes_ultimo_evento_idx
+    ON public.webchat_visitantes (ultimo_evento_en);
+
+CREATE TABLE IF NOT EXISTS public.webchat_visitantes_geo_diario (
+    dia date NOT NULL,
+    country_code text NOT NULL,
+    cve_ent text NOT NULL,
+    cvegeo text NOT NULL,
+    total bigint NOT NULL DEFAULT 0,
+    con_coordenadas bigint NOT NULL DEFAULT 0,
+    suma_lat double precision NOT NULL DEFAULT 0,
+    suma_lng double precision NOT NULL DEFAULT 0,
+    country_name text,
+    nom_ent text,
+    nom_mun text,
+    PRIMARY KEY (dia, country_code, cve_ent, cvegeo)
+);
+
+COMMENT ON TABLE public.webchat_visitantes_geo_diario
+    IS 'Visitantes por día UTC de último evento y geografía ('''' = sin estado/municipio).';
+
+CREATE TABLE IF NOT EXISTS public.webchat_cierres_sin_chat_diario (
+    dia date NOT NULL,
+    country_code text NOT NULL,
+    cve_ent text NOT NULL,
+    cvegeo text NOT NULL,
+    total bigint NOT NULL DEFAULT 0,
+    country_name text,
+    nom_ent text,
+    nom_mun text,
+    PRIMARY KEY (dia, country_code, cve_ent, cvegeo)
+);
+
+COMMENT ON TABLE public.webchat_cierres_sin_chat_diario
+    IS 'Cierres de sesión sin mensajes entrantes por día UTC de closed_at y geografía del visitante.';
+
+ALTER TABLE public.webchat_visitantes_geo_diario ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.webchat_cierres_sin_chat_diario ENABLE ROW LEVEL SECURITY;
+
+-- ---------------------------------------------------------------------------
+-- Utilidades de rango compartidas con dashboard_kpis (días UTC)
+-- ---------------------------------------------------------------------------
+
+-- Primer y último día contenidos por completo en [p_from, p_to].
+CREATE OR REPLACE FUNCTION public._kpi_rango_dias(p_from timestamptz, p_to timestamptz)
+RETURNS TABLE (d_from date, d_to date, con_dias boolean)
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT x.d_from, x.d_to, x.d_from <= x.d_to
+      FROM (
+          SELECT
+              CASE
+                  WHEN p_from IS NULL THEN '-infinity'::date
+                  ELSE public._kpi_dia(p_from - interval '1 microsecond') + 1
+              END AS d_from,
+              CASE
+                  WHEN p_to IS NULL THEN 'infinity'::date
+                  ELSE public._kpi_dia(p_to + interval '1 microsecond') - 1
+              END AS d_to
+      ) AS x;
+$$;
+
+-- Tramos de [p_from, p_to] fuera de los días completos (inclusive en ambos extremos).
+CREATE OR REPLACE FUNCTION public._kpi_tramos_crudos(p_from timestamptz, p_to timestamptz)
+RETURNS TABLE (desde timestamptz, hasta timestamptz)
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT COALESCE(p_from, '-infinity'::timestamptz),
+           CASE
+               WHEN r.con_dias
+                   THEN LEAST(
+                       COALESCE(p_to, 'infinity'::timestamptz),
+                       public._kpi_inicio_dia(r.d_from) - interval '1 microsecond'
+                   )
+               ELSE COALESCE(p_to, 'infinity'::timestamptz)
+           END
+      FROM public._kpi_rango_dias(p_from, p_to) AS r
+    UNION ALL
+    SELECT public._kpi_inicio_dia(r.d_to + 1), COALESCE(p_to, 'infinity'::timestamptz)
+      FROM public._kpi_rango_dias(p_from, p_to) AS r
+     WHERE r.con_dias;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- Geografía normalizada de un visitante
+-- ---------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public._webchat_visitante_geo(p_visitante public.webchat_visitantes)
+RETURNS TABLE (
+    country_code text,
+    country_name text,
+    cve_ent text,
+    nom_ent text,
+    cvegeo text,
+    nom_mun text,
+    lat double precision,
+    lng double precision
+)
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    WITH raw AS (
+        SELECT
+            COALESCE(
+                NULLIF(g -> 'ip_lookup' ->> 'country_code', ''),
+                NULLIF(g -> 'ip_lookup' ->> 'country', ''),
+                NULLIF((g -> 'client') ->> 'country_code', ''),
+                NULLIF((g -> 'client') ->> 'country', ''),
+                NULLIF(g ->> 'country_code', ''),
+                NULLIF(g ->> 'country', '')
+            ) AS country,
+            COALESCE(
+                NULLIF(g -> 'ip_lookup' ->> 'country_name', ''),
+                NULLIF((g -> 'client') ->> 'country_name', ''),
+                NULLIF(g -> 'ip_lookup' ->> 'country', ''),
+                NULLIF((g -> 'client') ->> 'country', '')
+            ) AS country_name,
+            COALESCE(
+                NULLIF(g -> 'ip_lookup' ->> 'latitude', ''),
+                NULLIF(g -> 'ip_lookup' ->> 'lat', ''),
+                NULLIF((g -> 'client') ->> 'latitude', ''),
+                NULLIF((g -> 'client') ->> 'lat', ''),
+                NULLIF(g ->> 'latitude', ''),
+                NULLIF(g ->> 'lat', '')
+            ) AS lat,
+            COALESCE(
+                NULLIF(g -> 'ip_lookup' ->> 'longitude', ''),
+                NULLIF(g -> 'ip_lookup' ->> 'lon', ''),
+                NULLIF(g -> 'ip_lookup' ->> 'lng', ''),
+                NULLIF((g -> 'client') ->> 'longitude', ''),
+                NULLIF((g -> 'client') ->> 'lon', ''),
+                NULLIF((g -> 'client') ->> 'lng', ''),
+                NULLIF(g ->> 'longitude', ''),
+                NULLIF(g ->> 'lon', ''),
+                NULLIF(g ->> 'lng', '')
+            ) AS lng,
+            NULLIF((p_visitante).cve_ent, '') AS cve_ent,
+            NULLIF((p_visitante).cve_mun, '') AS cve_mun,
+            NULLIF((p_visitante).cvegeo, '') AS cvegeo,
+            NULLIF(REGEXP_REPLACE(COALESCE((p_visitante).cvegeo, ''), '\D', '', 'g'), '') AS digits
+        FROM (SELECT (p_visitante).geo AS g) AS src
+    )
+    SELECT
+        CASE
+            WHEN country IS NULL THEN 'UNK'
+            WHEN length(country) = 2 THEN upper(country)
+            WHEN length(country) = 3 AND country ~ '^[A-Za-z]{3}$' THEN upper(country)
+            ELSE upper(substr(country, 1, 2))
+        END,
+        country_name,
+        COALESCE(
+            cve_ent,
+            CASE WHEN length(digits) >= 2 THEN substr(digits, 1, 2) END
+        ),
+        NULLIF((p_visitante).nom_ent, ''),
+        COALESCE(
+            cvegeo,
+            CASE WHEN length(digits) >= 5 THEN substr(digits, 1, 5) END,
+            CASE WHEN cve_ent IS NOT NULL AND cve_mun IS NOT NULL THEN cve_ent || cve_mun END
+        ),
+        NULLIF((p_visitante).nom_mun, ''),
+        CASE WHEN lat ~ '^[+-]?[0-9]+([.][0-9]+)?$' THEN lat::double precision END,
+        CASE WHEN lng ~ '^[+-]?[0-9]+([.][0-9]+)?$' THEN lng::double precision END
+    FROM raw;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- Mantenimiento incremental: visitantes por último evento
+-- ---------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public._webchat_geo_diario_sumar(
+    p_visitante public.webchat_visitantes,
+    p_delta integer
+) RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    INSERT INTO public.webchat_visitantes_geo_diario AS d (
+        dia,
+        country_code,
+        cve_ent,
+        cvegeo,
+        total,
+        con_coordenadas,
+        suma_lat,
+        suma_lng,
+        country_name,
+        nom_ent,
+        nom_mun
+    )
+    SELECT
+        public._kpi_dia((p_visitante).ultimo_evento_en),
+        g.country_code,
+        COALESCE(g.cve_ent, ''),
+        COALESCE(g.cvegeo, ''),
+        p_delta,
+        CASE WHEN g.lat IS NOT NULL AND g.lng IS NOT NULL THEN p_delta ELSE 0 END,
+        CASE WHEN g.lat IS NOT NULL AND g.lng IS NOT NULL THEN g.lat * p_delta ELSE 0 END,
+        CASE WHEN g.lat IS NOT NULL AND g.lng IS NOT NULL THEN g.lng * p_delta ELSE 0 END,
+        g.country_name,
+        g.nom_ent,
+        g.nom_mun
+    FROM public._webchat_visitante_geo(p_visitante) AS g
+    ON CONFLICT (dia, country_code, cve_ent, cvegeo) DO UPDATE
+      SET total = d.total + EXCLUDED.total,
+          con_coordenadas = d.con_coordenadas + EXCLUDED.con_coordenadas,
+          suma_lat = d.suma_lat + EXCLUDED.suma_lat,
+          suma_lng = d.suma_lng + EXCLUDED.suma_lng,
+          country_name = COALESCE(EXCLUDED.country_name, d.country_name),
+          nom_ent = COALESCE(EXCLUDED.nom_ent, d.nom_ent),
+          nom_mun = COALESCE(EXCLUDED.nom_mun, d.nom_mun);
+$$;
+
+-- ---------------------------------------------------------------------------
+-- Mantenimiento incremental: cierres sin chat
+-- ---------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public._webchat_sesion_con_chat(p_session_id text)
+RETURNS boolean
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+    SELECT EXISTS (
+        SELECT 1
+          FROM public.mensajes AS m
+         WHERE m.datos ->> 'session_id' = p_session_id
+           AND m.direccion = 'entrante'
+    );
+$$;
+
+CREATE OR REPLACE FUNCTION public._webchat_visitante(p_session_id text)
+RETURNS public.webchat_visitantes
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+    SELECT w FROM public.webchat_visitantes AS w WHERE w.session_id = p_session_id;
+$$;
+
+-- Suma p_delta al bucket del cierre; sin fila de visitante la geografía queda 'UNK'.
+CREATE OR REPLACE FUNCTION public._webchat_cierre_sumar(
+    p_closed_at timestamptz,
+    p_visitante public.webchat_visitantes,
+    p_delta integer
+) RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    INSERT INTO public.webchat_cierres_sin_chat_diario AS d (
+        dia,
+        country_code,
+        cve_ent,
+        cvegeo,
+        total,
+        country_name,
+        nom_ent,
+        nom_mun
+    )
+    SELECT
+        public._kpi_dia(p_closed_at),
+        g.country_code,
+        COALESCE(g.cve_ent, ''),
+        COALESCE(g.cvegeo, ''),
+        p_delta,
+        g.country_name,
+        g.nom_ent,
+        g.nom_mun
+    FROM public._webchat_visitante_geo(p_visitante) AS g
+    ON CONFLICT (dia, country_code, cve_ent, cvegeo) DO UPDATE
+      SET total = d.total + EXCLUDED.total,
+          country_name = COALESCE(EXCLUDED.country_name, d.country_name),
+          nom_ent = COALESCE(EXCLUDED.nom_ent, d.nom_ent),
+          nom_mun = COALESCE(EXCLUDED.nom_mun, d.nom_mun);
+$$;
+
+-- Ajusta el cierre de la sesión (si existe) con la geografía de p_visitante.
+CREATE OR REPLACE FUNCTION public._webchat_cierre_ajustar(
+    p_session_id text,
+    p_visitante public.webchat_visitantes,
+    p_delta integer
+) RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_closed_at timestamptz;
+BEGIN
+    SELECT sc.closed_at
+      INTO v_closed_at
+      FROM public.webchat_session_closures AS sc
+     WHERE sc.session_id = p_session_id;
+    IF FOUND THEN
+        PERFORM public._webchat_cierre_sumar(v_closed_at, p_visitante, p_delta);
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.tg_webchat_visitantes_geo_diario()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_misma_geo boolean := false;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        v_misma_geo := OLD.session_id = NEW.session_id
+            AND OLD.geo IS NOT DISTINCT FROM NEW.geo
+            AND OLD.cve_ent IS NOT DISTINCT FROM NEW.cve_ent
+            AND OLD.nom_ent IS NOT DISTINCT FROM NEW.nom_ent
+            AND OLD.cve_mun IS NOT DISTINCT FROM NEW.cve_mun
+            AND OLD.nom_mun IS NOT DISTINCT FROM NEW.nom_mun
+            AND OLD.cvegeo IS NOT DISTINCT FROM NEW.cvegeo;
+        IF v_misma_geo
+           AND public._kpi_dia(OLD.ultimo_evento_en) = public._kpi_dia(NEW.ultimo_evento_en) THEN
+            -- Visita repetida el mismo día: la sesión sigue en el mismo bucket.
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM public._webchat_geo_diario_sumar(OLD, -1);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM public._webchat_geo_diario_sumar(NEW, 1);
+    END IF;
+
+    -- El cierre sin chat toma la geografía del visitante y se mueve con ella; la
+    -- visita puede registrarse después del cierre (antes contaba como 'UNK').
+    IF NOT v_misma_geo THEN
+        IF TG_OP <> 'INSERT' AND NOT public._webchat_sesion_con_chat(OLD.session_id) THEN
+            PERFORM public._webchat_cierre_ajustar(OLD.session_id, OLD, -1);
+            IF TG_OP = 'DELETE' THEN
+                PERFORM public._webchat_cierre_ajustar(OLD.session_id, NULL, 1);
+            END IF;
+        END IF;
+        IF TG_OP <> 'DELETE' AND NOT public._webchat_sesion_con_chat(NEW.session_id) THEN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM public._webchat_cierre_ajustar(NEW.session_id, NULL, -1);
+            END IF;
+            PERFORM public._webchat_cierre_ajustar(NEW.session_id, NEW, 1);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+COMMENT ON FUNCTION public.tg_webchat_visitantes_geo_diario()
+    IS 'Mueve la sesión de bucket en los rollups de visitantes cuando cambia día o geografía.';
+
+CREATE OR REPLACE FUNCTION public.tg_webchat_session_closures_sin_chat()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' AND NOT public._webchat_sesion_con_chat(OLD.session_id) THEN
+        PERFORM public._webchat_cierre_sumar(
+            OLD.closed_at, public._webchat_visitante(OLD.session_id), -1
+        );
+    END IF;
+    IF TG_OP <> 'DELETE' AND NOT public._webchat_sesion_con_chat(NEW.session_id) THEN
+        PERFORM public._webchat_cierre_sumar(
+            NEW.closed_at, public._webchat_visitante(NEW.session_id), 1
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+COMMENT ON FUNCTION public.tg_webchat_session_closures_sin_chat()
+    IS 'Mantiene webchat_cierres_sin_chat_diario al registrar, mover o borrar un cierre.';
+
+CREATE OR REPLACE FUNCTION public.tg_mensajes_webchat_sin_chat()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_session_id text;
+    v_id uuid;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        v_session_id := NEW.datos ->> 'session_id';
+        v_id := NEW.id;
+    ELSE
+        v_session_id := OLD.datos ->> 'session_id';
+        v_id := OLD.id;
+    END IF;
+
+    -- Sólo el primer entrante (o el último, al borrarlo) cambia si la sesión tuvo chat.
+    IF EXISTS (
+        SELECT 1
+          FROM public.mensajes AS m
+         WHERE m.datos ->> 'session_id' = v_session_id
+           AND m.direccion = 'entrante'
+           AND m.id <> v_id
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    PERFORM public._webchat_cierre_ajustar(
+        v_session_id,
+        public._webchat_visitante(v_session_id),
+        CASE WHEN TG_OP = 'INSERT' THEN -1 ELSE 1 END
+    );
+    RETURN NULL;
+END;
+$$;
+
+COMMENT ON FUNCTION public.tg_mensajes_webchat_sin_chat()
+    IS 'Saca (o devuelve) el cierre de la sesión de los visitantes sin chat con su primer entrante.';
+
+DROP TRIGGER IF EXISTS webchat_visitantes_geo_diario ON public.webchat_visitantes;
+CREATE TRIGGER webchat_visitantes_geo_diario
+    AFTER INSERT OR UPDATE OR DELETE
+    ON public.webchat_visitantes
+    FOR EACH ROW
+    EXECUTE FUNCTION public.tg_webchat_visitantes_geo_diario();
+
+-- record_webchat_session_closure hace upsert: el UPDATE de un cierre repetido no
+-- cambia closed_at y no debe mover el bucket.
+DROP TRIGGER IF EXISTS webchat_session_closures_sin_chat ON public.webchat_session_closures;
+CREATE TRIGGER webchat_session_closures_sin_chat
+    AFTER INSERT OR DELETE
+    ON public.webchat_session_closures
+    FOR EACH ROW
+    EXECUTE FUNCTION public.tg_webchat_session_closures_sin_chat();
+
+DROP TRIGGER IF EXISTS webchat_session_closures_sin_chat_update ON public.webchat_session_closures;
+CREATE TRIGGER webchat_session_closures_sin_chat_update
+    AFTER UPDATE
+    ON public.webchat_session_closures
+    FOR EACH ROW
+    WHEN (
+        OLD.session_id IS DISTINCT FROM NEW.session_id
+        OR OLD.closed_at IS DISTINCT FROM NEW.closed_at
+    )
+    EXECUTE FUNCTION public.tg_webchat_session_closures_sin_chat();
+
+DROP TRIGGER IF EXISTS mensajes_webchat_sin_chat ON public.mensajes;
+CREATE TRIGGER mensajes_webchat_sin_chat
+    AFTER INSERT
+    ON public.mensajes
+    FOR EACH ROW
+    WHEN (NEW.direccion = 'entrante' AND NEW.datos ? 'session_id')
+    EXECUTE FUNCTION public.tg_mensajes_webchat_sin_chat();
+
+DROP TRIGGER IF EXISTS mensajes_webchat_sin_chat_delete ON public.mensajes;
+CREATE TRIGGER mensajes_webchat_sin_chat_delete
+    AFTER DELETE
+    ON public.mensajes
+    FOR EACH ROW
+    WHEN (OLD.direccion = 'entrante' AND OLD.datos ? 'session_id')
+    EXECUTE FUNCTION public.tg_mensajes_webchat_sin_chat();
+
+-- Carga inicial (los CREATE TRIGGER bloquean escrituras en esas tablas hasta COMMIT).
+DELETE FROM public.webchat_visitantes_geo_diario;
+INSERT INTO public.webchat_visitantes_geo_diario (
+    dia,
+    country_code,
+    cve_ent,
+    cvegeo,
+    total,
+    con_coordenadas,
+    suma_lat,
+    suma_lng,
+    country_name,
+    nom_ent,
+    nom_mun
+)
+SELECT
+    public._kpi_dia(w.ultimo_evento_en),
+    g.country_code,
+    COALESCE(g.cve_ent, ''),
+    COALESCE(g.cvegeo, ''),
+    COUNT(*),
+    COUNT(*) FILTER (WHERE g.lat IS NOT NULL AND g.lng IS NOT NULL),
+    COALESCE(SUM(g.lat) FILTER (WHERE g.lat IS NOT NULL AND g.lng IS NOT NULL), 0),
+    COALESCE(SUM(g.lng) FILTER (WHERE g.lat IS NOT NULL AND g.lng IS NOT NULL), 0),
+    MAX(g.country_name),
+    MAX(g.nom_ent),
+    MAX(g.nom_mun)
+FROM public.webchat_visitantes AS w
+CROSS JOIN LATERAL public._webchat_visitante_geo(w) AS g
+GROUP BY 1, 2, 3, 4;
+
+DELETE FROM public.webchat_cierres_sin_chat_diario;
+INSERT INTO public.webchat_cierres_sin_chat_diario (
+    dia,
+    country_code,
+    cve_ent,
+    cvegeo,
+    total,
+    country_name,
+    nom_ent,
+    nom_mun
+)
+SELECT
+    public._kpi_dia(sc.closed_at),
+    g.country_code,
+    COALESCE(g.cve_ent, ''),
+    COALESCE(g.cvegeo, ''),
+    COUNT(*),
+    MAX(g.country_name),
+    MAX(g.nom_ent),
+    MAX(g.nom_mun)
+FROM public.webchat_session_closures AS sc
+LEFT JOIN public.webchat_visitantes AS w ON w.session_id = sc.session_id
+CROSS JOIN LATERAL public._webchat_visitante_geo(w) AS g
+WHERE NOT public._webchat_sesion_con_chat(sc.session_id)
+GROUP BY 1, 2, 3, 4;
+
+-- ---------------------------------------------------------------------------
+-- Lectura: rollup para días completos + filas crudas en los extremos
+-- ---------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public._webchat_visitantes_geo_rango(
+    p_from timestamptz,
+    p_to timestamptz
+) RETURNS TABLE (
+    country_code text,
+    country_name text,
+    cve_ent text,
+    nom_ent text,
+    cvegeo text,
+    nom_mun text,
+    total bigint,
+    con_coordenadas bigint,
+    suma_lat double precision,
+    suma_lng double precision
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT d.country_code,
+           d.country_name,
+           NULLIF(d.cve_ent, ''),
+           d.nom_ent,
+           NULLIF(d.cvegeo, ''),
+           d.nom_mun,
+           d.total,
+           d.con_coordenadas,
+           d.suma_lat,
+           d.suma_lng
+      FROM public._kpi_rango_dias(p_from, p_to) AS r
+      JOIN public.webchat_visitantes_geo_diario AS d
+        ON d.dia BETWEEN r.d_from AND r.d_to
+     WHERE r.con_dias
+       AND d.total <> 0
+    UNION ALL
+    SELECT g.country_code,
+           g.country_name,
+           g.cve_ent,
+           g.nom_ent,
+           g.cvegeo,
+           g.nom_mun,
+           1::bigint,
+           CASE WHEN g.lat IS NOT NULL AND g.lng IS NOT NULL THEN 1 ELSE 0 END::bigint,
+           CASE WHEN g.lat IS NOT NULL AND g.lng IS NOT NULL THEN g.lat ELSE 0 END,
+           CASE WHEN g.lat IS NOT NULL AND g.lng IS NOT NULL THEN g.lng ELSE 0 END
+      FROM public._kpi_tramos_crudos(p_from, p_to) AS t
+      JOIN public.webchat_visitantes AS w
+        ON w.ultimo_evento_en >= t.desde
+       AND w.ultimo_evento_en <= t.hasta
+     CROSS JOIN LATERAL public._webchat_visitante_geo(w) AS g;
+$$;
+
+CREATE OR REPLACE FUNCTION public._webchat_cierres_sin_chat_rango(
+    p_from timestamptz,
+    p_to timestamptz
+) RETURNS TABLE (
+    country_code text,
+    country_name text,
+    cve_ent text,
+    nom_ent text,
+    cvegeo text,
+    nom_mun text,
+    total bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT d.country_code,
+           d.country_name,
+           NULLIF(d.cve_ent, ''),
+           d.nom_ent,
+           NULLIF(d.cvegeo, ''),
+           d.nom_mun,
+           d.total
+      FROM public._kpi_rango_dias(p_from, p_to) AS r
+      JOIN public.webchat_cierres_sin_chat_diario AS d
+        ON d.dia BETWEEN r.d_from AND r.d_to
+     WHERE r.con_dias
+       AND d.total <> 0
+    UNION ALL
+    SELECT g.country_code,
+           g.country_name,
+           g.cve_ent,
+           g.nom_ent,
+           g.cvegeo,
+           g.nom_mun,
+           1::bigint
+      FROM public._kpi_tramos_crudos(p_from, p_to) AS t
+      JOIN public.webchat_session_closures AS sc
+        ON sc.closed_at >= t.desde
+       AND sc.closed_at <= t.hasta
+      LEFT JOIN public.webchat_visitantes AS w ON w.session_id = sc.session_id
+     CROSS JOIN LATERAL public._webchat_visitante_geo(w) AS g
+     WHERE NOT public._webchat_sesion_con_chat(sc.session_id);
+$$;
+
+CREATE OR REPLACE FUNCTION public.embudo_visitantes_contador(
+    p_closed_after timestamptz DEFAULT (now() - interval '30 days'),
+    p_closed_before timestamptz DEFAULT NULL
+)
+RETURNS TABLE(total bigint)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path TO public
+AS $$
+    SELECT COALESCE(SUM(r.total), 0)::bigint AS total
+      FROM public._webchat_cierres_sin_chat_rango(p_closed_after, p_closed_before) AS r;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.embudo_visitantes_contador(timestamptz, timestamptz)
+    TO postgres, service_role, authenticated;
+
+CREATE OR REPLACE FUNCTION public.panel_visitantes_sin_chat_estados(
+    p_from timestamptz DEFAULT NULL,
+    p_to timestamptz DEFAULT NULL
+) RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH base AS (
+        SELECT * FROM public._webchat_cierres_sin_chat_rango(p_from, p_to)
+    ),
+    summary AS (
+        SELECT
+            COALESCE(SUM(total), 0) AS total,
+            COALESCE(SUM(total) FILTER (WHERE cve_ent IS NOT NULL), 0) AS ubicados,
+            COALESCE(SUM(total) FILTER (WHERE cve_ent IS NULL), 0) AS sin_ubicacion
+        FROM base
+    ),
+    grouped AS (
+        SELECT
+            cve_ent,
+            MAX(nom_ent) AS nombre,
+            SUM(total) AS total
+        FROM base
+        WHERE cve_ent IS NOT NULL
+        GROUP BY cve_ent
+        HAVING SUM(total) > 0
+    )
+    SELECT jsonb_build_object(
+        'totals', jsonb_build_object(
+            'total', summary.total,
+            'ubicados', summary.ubicados,
+            'sin_ubicacion', summary.sin_ubicacion
+        ),
+        'items', (
+            SELECT COALESCE(
+                jsonb_agg(
+                    jsonb_build_object(
+                        'cve_ent', grouped.cve_ent,
+                        'nombre', grouped.nombre,
+                        'total', grouped.total,
+                        'por_canal', jsonb_build_object('visitantes', grouped.total)
+                    )
+                    ORDER BY grouped.cve_ent
+                ),
+                '[]'::jsonb
+            )
+            FROM grouped
+        )
+    )
+    FROM summary;
+$$;
+
+CREATE OR REPLACE FUNCTION public.panel_visitantes_sin_chat_municipios(
+    p_estado text,
+    p_from timestamptz DEFAULT NULL,
+    p_to timestamptz DEFAULT NULL
+) RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH state_code AS (
+        SELECT LPAD(REGEXP_REPLACE(COALESCE(p_estado, ''), '\D', '', 'g'), 2, '0') AS code
+    ),
+    base AS (
+        SELECT b.*
+        FROM public._webchat_cierres_sin_chat_rango(p_from, p_to) AS b
+        JOIN state_code AS s ON b.cve_ent = s.code
+    ),
+    summary AS (
+        SELECT
+            COALESCE(SUM(total), 0) AS total,
+            COALESCE(SUM(total) FILTER (WHERE cvegeo IS NOT NULL), 0) AS ubicados,
+            COALESCE(SUM(total) FILTER (WHERE cvegeo IS NULL), 0) AS sin_ubicacion
+        FROM base
+    ),
+    grouped AS (
+        SELECT
+            cvegeo,
+            MAX(nom_mun) AS nombre,
+            SUM(total) AS total
+        FROM base
+        WHERE cvegeo IS NOT NULL
+        GROUP BY cvegeo
+        HAVING SUM(total) > 0
+    ),
+    estado_info AS (
+        SELECT MAX(cve_ent) AS cve_ent, MAX(nom_ent) AS nombre FROM base
+    )
+    SELECT jsonb_build_object(
+        'estado', jsonb_build_object(
+            'cve_ent', COALESCE((SELECT cve_ent FROM estado_info), (SELECT code FROM state_code)),
+            'nombre', (SELECT nombre FROM estado_info)
+        ),
+        'totals', jsonb_build_object(
+            'total', summary.total,
+            'ubicados', summary.ubicados,
+            'sin_ubicacion', summary.sin_ubicacion
+        ),
+        'items', (
+            SELECT COALESCE(
+                jsonb_agg(
+                    jsonb_build_object(
+                        'cvegeo', grouped.cvegeo,
+                        'nombre', grouped.nombre,
+                        'total', grouped.total,
+                        'por_canal', jsonb_build_object('visitantes', grouped.total)
+                    )
+                    ORDER BY grouped.cvegeo
+                ),
+                '[]'::jsonb
+            )
+            FROM grouped
+        )
+    )
+    FROM summary;
+$$;
+
+CREATE OR REPLACE FUNCTION public.panel_visitantes_world_paises(
+    p_from timestamp with time zone DEFAULT NULL::timestamp with time zone,
+    p_to timestamp with time zone DEFAULT NULL::timestamp with time zone
+) RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $$
+WITH aggregated AS (
+    SELECT
+        country_code,
+        COALESCE(
+            MAX(country_name) FILTER (WHERE country_name IS NOT NULL AND country_name <> ''),
+            country_code
+        ) AS nombre,
+        SUM(total) AS total,
+        SUM(con_coordenadas) AS with_coordinates,
+        SUM(suma_lat) / NULLIF(SUM(con_coordenadas), 0) AS avg_lat,
+        SUM(suma_lng) / NULLIF(SUM(con_coordenadas), 0) AS avg_lng
+    FROM public._webchat_visitantes_geo_rango(p_from, p_to)
+    GROUP BY country_code
+    HAVING SUM(total) > 0
+),
+summary AS (
+    SELECT
+        COALESCE(SUM(total), 0) AS total,
+        COALESCE(SUM(total) FILTER (WHERE country_code <> 'UNK'), 0) AS ubicados,
+        COALESCE(SUM(total) FILTER (WHERE country_code = 'UNK'), 0) AS sin_pais
+    FROM aggregated
+)
+SELECT jsonb_build_object(
+    'totals', jsonb_build_object(
+        'total', summary.total,
+        'ubicados', summary.ubicados,
+        'sin_pais', summary.sin_pais
+    ),
+    'items', COALESCE(
+        (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'country_code', agg.country_code,
+                    'nombre', agg.nombre,
+                    'total', agg.total,
+                    'avg_lat', agg.avg_lat,
+                    'avg_lng', agg.avg_lng,
+                    'with_coordinates', agg.with_coordinates
+                )
+                ORDER BY agg.total DESC, agg.country_code
+            )
+            FROM aggregated agg
+        ),
+        '[]'::jsonb
+    )
+)
+FROM summary;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.panel_visitantes_world_paises(timestamp with time zone, timestamp with time zone)
+    TO postgres, service_role;
+
+COMMIT;